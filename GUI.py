@@ -1,24 +1,26 @@
+import time
+STARTED = time.perf_counter() # Reference for the startup timings; keep this first
 import sys
 import os
-from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QPushButton, QLineEdit, QRadioButton, QLabel, QTextEdit, QHBoxLayout, QFrame, QFormLayout, QFileDialog)
-from PyQt6.QtCore import Qt, QObject, pyqtSignal, QThread
-from PyQt6.QtGui import QIcon, QPixmap
-from function_project import update_attachments_by_type
-from function_item import update_item_attachments
-
-# Custom stream class to redirect stdout (print statements) to the QTextEdit widget
-class Stream(QObject):
-    """
-    A custom stream class that redirects stdout to a signal.
-    This allows us to capture print statements and display them in the GUI.
-    """
-    text_written = pyqtSignal(str)
-
-    def write(self, text):
-        self.text_written.emit(str(text))
-    
-    def flush(self):
-        pass
+import multiprocessing
+import shutil
+import threading
+import importlib
+from PyQt6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QPushButton, QLineEdit, QRadioButton, QLabel, QPlainTextEdit, QHBoxLayout, QFrame, QFormLayout, QFileDialog, QCheckBox)
+from PyQt6.QtCore import Qt, QObject, pyqtSignal, QThread, QTimer
+from PyQt6.QtGui import QIcon, QPixmap, QTextCursor
+from log_sink import BufferedLogSink
+from progress_dashboard import ProgressDashboard
+import progress_events
+from backup_archive import BACKUP_DIR
+from temp_storage import TEMP_LOCATION
+from startup_probe import StartupProbe
+# The workflow modules (and requests, aiohttp, Pillow with them) are imported when Run is clicked,
+# or in the background once the window has painted, so they never delay the first paint
+
+LOG_FLUSH_INTERVAL_MS = 100 # How often buffered print output is pushed to the readout
+MAX_READOUT_LINES = 5000 # Lines kept in the readout; older lines are dropped (the log file keeps everything)
+PRELOAD_MODULES = ('function_item', 'function_project', 'async_engine', 'verify_run', 'dry_run')
 
 # Worker class to run the long-running functions in a separate thread
 class Worker(QObject):
@@ -28,7 +30,7 @@ class Worker(QObject):
     """
     finished = pyqtSignal()
     
-    def __init__(self, basic_oauth, jama_username, jama_password, project_api_id, custom_prefix, url, attachment_item_type_id, delete_downloads):
+    def __init__(self, basic_oauth, jama_username, jama_password, project_api_id, custom_prefix, url, attachment_item_type_id, delete_downloads, profile=False, tune=False, locations='', incremental=False, backup=False, async_engine=False, optimize_images=False, verify=False, temp_location='', temp_quota_mb='', dry_run=False, http2=False):
         super().__init__()
         self.basic_oauth = basic_oauth  # New parameter
         self.jama_username = jama_username
@@ -38,19 +40,63 @@ class Worker(QObject):
         self.url = url
         self.attachment_item_type_id = attachment_item_type_id
         self.delete_downloads = delete_downloads
+        self.profile = profile # Write a profile report next to the logs for each workflow
+        self.tune = tune # Calibrate page size, concurrency and chunk size before the run
+        self.locations = locations # Optional comma-separated folder/set IDs to limit the run to
+        self.incremental = incremental # Only look at items/attachments changed since the last successful run
+        self.backup = backup # Archive the downloaded originals before they are deleted
+        self.async_engine = async_engine # Run both workflows on one asyncio event loop (needs aiohttp)
+        self.optimize_images = optimize_images # Losslessly shrink images on a process pool before re-upload (needs Pillow)
+        self.verify = verify # Check every renamed attachment after the run (metadata, plus hashes of a sample)
+        self.temp_location = temp_location # Optional folder for the temporary downloads (blank = ~/AttachmentUpdater)
+        self.temp_quota_mb = temp_quota_mb # Optional cap on the temporary downloads, in MB
+        self.dry_run = dry_run # Only report what a run would process and how long it would take
+        self.transport = 'http2' if http2 else 'requests' # Multiplex the HTTP calls over a few HTTP/2 connections (needs httpx[http2])
 
     def run(self):
         """
         Executes the two update functions in sequence.
         This method will be run in the new thread.
         """
+        watermark = None
         try:
+            from function_project import update_attachments_by_type
+            from function_item import update_item_attachments
+            from autotune import calibrate, tuned_settings
+            from scope import RunScope
+            from incremental import RunWatermark
+            from verify_run import RunRecord
+            from dry_run import DryRunEstimate
+
             # Construct the V2 URL
             if not self.url.endswith("/"):
                 jama_base_url_v2 = self.url + "/rest/v2/"
             else:
                 jama_base_url_v2 = self.url + "rest/v2/"
             
+            # Calibrate first if asked, otherwise use the saved tuned profile for this URL (or the defaults)
+            if self.tune:
+                try:
+                    calibrate(self.basic_oauth, self.jama_username, self.jama_password, self.project_api_id,
+                              jama_base_url_v2, self.attachment_item_type_id)
+                except Exception as e:
+                    print(f"Calibration failed, continuing with the previous settings. Error: {e}")
+            tuned = tuned_settings(jama_base_url_v2)
+            scope = RunScope(locations=self.locations)
+            watermark = RunWatermark(jama_base_url_v2, self.project_api_id, self.incremental)
+            dry_run = DryRunEstimate(jama_base_url_v2) if self.dry_run else None
+            record = RunRecord(self.project_api_id) if self.verify and dry_run is None else None
+            temp = {'temp_location': self.temp_location.strip() or None}
+            if self.temp_quota_mb.strip():
+                temp['temp_quota'] = int(self.temp_quota_mb) * 1024 * 1024
+
+            if self.async_engine:
+                if self.profile or self.backup or not scope.whole_project or 'temp_quota' in temp or self.transport == 'http2':
+                    print("The async engine does not support profiling, backups, location limits, a temp quota or HTTP/2. Clear those options or the async engine.")
+                    return
+                self.run_async(jama_base_url_v2, tuned, watermark, record, temp['temp_location'], dry_run)
+                return
+
             # Step 1: Execute the first function
             print("Executing update_item_attachments...")
             index = update_item_attachments(
@@ -60,13 +106,23 @@ class Worker(QObject):
                 project_api_id=self.project_api_id,
                 custom_prefix=self.custom_prefix,
                 jama_base_url_v2=jama_base_url_v2,
-                t_f=self.delete_downloads
+                t_f=self.delete_downloads,
+                profile=self.profile,
+                scope=scope,
+                since=watermark.since,
+                backup_dir=BACKUP_DIR if self.backup else None,
+                optimize_images=self.optimize_images,
+                record=record,
+                dry_run=dry_run,
+                transport=self.transport,
+                **temp,
+                **tuned
             )
             print(f"update_item_attachments completed. Returned index: {index}")
 
             # Step 2: Execute the second function with the returned index
             print("Executing update_project_attachments...")
-            update_attachments_by_type(
+            updated = update_attachments_by_type(
                 basic_oauth=self.basic_oauth,  # Pass the new parameter
                 jama_username=self.jama_username,
                 jama_password=self.jama_password,
@@ -75,20 +131,101 @@ class Worker(QObject):
                 jama_base_url_v2=jama_base_url_v2,
                 attachment_item_type_id=self.attachment_item_type_id,
                 t_f=self.delete_downloads,
-                index=index
+                index=index,
+                profile=self.profile,
+                scope=scope,
+                since=watermark.since,
+                optimize_images=self.optimize_images,
+                record=record,
+                dry_run=dry_run,
+                transport=self.transport,
+                **temp,
+                **tuned
             )
             print("update_project_attachments completed.")
+            self.verify_record(record, jama_base_url_v2, tuned, updated[1] if updated else None)
+            self.report_dry_run(dry_run)
+            # A full, error-free run becomes the starting point for the next incremental run
+            watermark.finish(updated is not None and scope.whole_project and dry_run is None)
             print("Attachment update sequence finished successfully!")
         except Exception as e:
             print(f"An error occurred during the update sequence: {e}")
-        
-        # Emit the finished signal when done
-        self.finished.emit()
+        finally:
+            if watermark is not None:
+                watermark.finish(False)
+            # Emit the finished signal when done (also after an early return)
+            self.finished.emit()
+
+    def verify_record(self, record, jama_base_url_v2, tuned, work_key=None):
+        """Checks what the run wrote, before the incremental high-water mark can move."""
+        if record is None:
+            return
+        from autotune import authenticated_session
+        from verify_run import verify_run, wait_for_work
+        record.close()
+        session = authenticated_session(self.basic_oauth, self.jama_username, self.jama_password, jama_base_url_v2, self.transport)
+        # The project names change only once Jama has worked through the queued PATCH
+        renamed = wait_for_work(session, jama_base_url_v2, work_key) if work_key else 'completed'
+        verify_run(session, jama_base_url_v2, record.entries, max_workers=tuned['max_workers'], names_pending=renamed in ('pending', 'unknown'))
+        print(f"Run record saved to {record.path}")
+
+    def report_dry_run(self, dry_run):
+        if dry_run is None:
+            return
+        summary = dry_run.summary()
+        print(f"\nDry run finished, nothing was changed. Estimated total: {summary['calls']} HTTP calls, "
+              f"about {summary['estimated_seconds'] / 60:.1f} to {summary['estimated_max_seconds'] / 60:.1f} min.")
+
+    def run_async(self, jama_base_url_v2, tuned, watermark, record=None, temp_location=None, dry_run=None):
+        """Runs the same two workflows with the asyncio engine."""
+        from async_engine import run_item_attachments, run_attachments_by_type
+        common = dict(
+            basic_oauth=self.basic_oauth,
+            jama_username=self.jama_username,
+            jama_password=self.jama_password,
+            project_api_id=self.project_api_id,
+            custom_prefix=self.custom_prefix,
+            jama_base_url_v2=jama_base_url_v2,
+            t_f=self.delete_downloads,
+            page_size=tuned['page_size'],
+            chunk_size=tuned['chunk_size'],
+            since=watermark.since,
+            optimize_images=self.optimize_images,
+            record=record,
+            temp_location=temp_location,
+            dry_run=dry_run
+        )
+        print("Executing update_item_attachments (async engine)...")
+        index = run_item_attachments(**common)
+        if index is None:
+            return
+        print(f"update_item_attachments completed. Returned index: {index}")
+        print("Executing update_project_attachments (async engine)...")
+        updated = run_attachments_by_type(attachment_item_type_id=self.attachment_item_type_id, index=index, **common)
+        print("update_project_attachments completed.")
+        self.verify_record(record, jama_base_url_v2, tuned, updated[1] if updated else None)
+        self.report_dry_run(dry_run)
+        watermark.finish(updated is not None and dry_run is None)
+        print("Attachment update sequence finished successfully!")
+
+
+def preload_workflows():
+    """Imports the workflow modules on a background thread, so clicking Run doesn't wait for them."""
+    def load():
+        for name in PRELOAD_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                pass # Run imports it again and reports any error in the readout
+    threading.Thread(target=load, name="preload-workflows", daemon=True).start()
 
 
 class AttachmentUpdater(QWidget):
+    first_painted = pyqtSignal()
+
     def __init__(self):
         super().__init__()
+        self.painted = False
         self.setWindowTitle("Attachment Name Updater") # Title of app in header bar
         
         # Open app in the center of the screen & set size
@@ -122,13 +259,29 @@ class AttachmentUpdater(QWidget):
 
         self.SelectLoginMethod()
 
-        # Redirect sys.stdout to our custom Stream class
-        self.stream = Stream()
+        # Redirect sys.stdout to a buffered sink; a timer moves its text into the readout in batches
+        self.stream = BufferedLogSink()
         sys.stdout = self.stream
-        self.stream.text_written.connect(self.log_to_readout)
-
-    def log_to_readout(self, text):
-        """Append text to the readout log."""
+        self.log_timer = QTimer(self)
+        self.log_timer.timeout.connect(self.log_to_readout)
+        self.log_timer.start(LOG_FLUSH_INTERVAL_MS)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            self.painted = True
+            self.first_painted.emit()
+
+    def log_to_readout(self):
+        """Append everything printed since the last tick to the readout log in one update."""
+        if not hasattr(self, 'readout_log'):
+            return
+        text, dropped = self.stream.drain()
+        if not text:
+            return
+        if dropped:
+            text = f"[... {dropped} characters skipped in the readout; see the full log file ...]\n" + text
+        self.readout_log.moveCursor(QTextCursor.MoveOperation.End)
         self.readout_log.insertPlainText(text)
         self.readout_log.verticalScrollBar().setValue(self.readout_log.verticalScrollBar().maximum())
 
@@ -247,23 +400,82 @@ class AttachmentUpdater(QWidget):
         self.custom_prefix_input.setPlaceholderText("Enter the custom prefix for each new attachment's name")
         form_layout.addRow(self.custom_prefix_label,self.custom_prefix_input)
 
+        self.locations_label = QLabel("Limit to Locations: ")
+        self.locations_input = QLineEdit()
+        self.locations_input.setPlaceholderText("Optional: comma-separated folder/set/component IDs (blank = whole project)")
+        form_layout.addRow(self.locations_label,self.locations_input)
+
+        self.temp_location_label = QLabel("Temp Folder Location: ")
+        self.temp_location_input = QLineEdit()
+        self.temp_location_input.setPlaceholderText(f"Optional: where to keep downloads while they are processed (blank = {TEMP_LOCATION})")
+        form_layout.addRow(self.temp_location_label,self.temp_location_input)
+
+        self.temp_quota_label = QLabel("Temp Space Limit (MB): ")
+        self.temp_quota_input = QLineEdit()
+        self.temp_quota_input.setPlaceholderText("Optional: downloads wait when the temp folder reaches this size")
+        form_layout.addRow(self.temp_quota_label,self.temp_quota_input)
+
         self.delete_downloads_label = QLabel("Delete Downloaded Attachments? ")
         self.delete_downloads_input = QRadioButton("Delete")
         self.delete_downloads_input.setChecked(False)
         form_layout.addRow(self.delete_downloads_label,self.delete_downloads_input)
 
+        self.profile_label = QLabel("Profile Run? ")
+        self.profile_input = QCheckBox("Write timing/memory report")
+        form_layout.addRow(self.profile_label,self.profile_input)
+
+        self.tune_label = QLabel("Calibrate First? ")
+        self.tune_input = QCheckBox("Measure and save tuned transfer settings")
+        form_layout.addRow(self.tune_label,self.tune_input)
+
+        self.incremental_label = QLabel("Incremental Run? ")
+        self.incremental_input = QCheckBox("Only changes since the last successful run")
+        form_layout.addRow(self.incremental_label,self.incremental_input)
+
+        self.backup_label = QLabel("Back Up Originals? ")
+        self.backup_input = QCheckBox(f"Archive originals to {BACKUP_DIR} before deleting")
+        form_layout.addRow(self.backup_label,self.backup_input)
+
+        self.optimize_label = QLabel("Optimise Images? ")
+        self.optimize_input = QCheckBox("Losslessly shrink images before re-upload (needs Pillow)")
+        form_layout.addRow(self.optimize_label,self.optimize_input)
+
+        self.verify_label = QLabel("Verify After Run? ")
+        self.verify_input = QCheckBox("Check every renamed attachment (hashes of a 1% sample)")
+        form_layout.addRow(self.verify_label,self.verify_input)
+
+        self.dry_run_label = QLabel("Dry Run? ")
+        self.dry_run_input = QCheckBox("Only estimate what a run would process and how long it would take")
+        form_layout.addRow(self.dry_run_label,self.dry_run_input)
+
+        self.async_label = QLabel("Async Engine? ")
+        self.async_input = QCheckBox("Run transfers on one asyncio event loop (needs aiohttp)")
+        form_layout.addRow(self.async_label,self.async_input)
+
+        self.http2_label = QLabel("HTTP/2 Transport? ")
+        self.http2_input = QCheckBox("Multiplex requests over a few HTTP/2 connections (needs httpx[http2])")
+        form_layout.addRow(self.http2_label,self.http2_input)
+
         self.login_button = self.NextButton("Run",True)
         self.save_logs_button = self.NextButton("Save Logs", True)
         self.save_logs_button.hide()
         
+        # Live throughput/ETA dashboard, refreshed on the same timer as the readout
+        self.progress_label = QLabel("Progress:")
+        self.dashboard = ProgressDashboard()
+        self.log_timer.timeout.connect(self.dashboard.refresh)
+
         # Add the readout log area
         self.readout_label = QLabel("Readout Log:")
-        self.readout_log = QTextEdit()
+        self.readout_log = QPlainTextEdit()
         self.readout_log.setReadOnly(True)
+        self.readout_log.setMaximumBlockCount(MAX_READOUT_LINES) # Ring buffer: the widget never grows past this
 
         # Add to the dynamic content layout
         self.dynamic_content_layout.addLayout(form_layout)
         self.dynamic_content_layout.addWidget(self.login_button)
+        self.dynamic_content_layout.addWidget(self.progress_label)
+        self.dynamic_content_layout.addWidget(self.dashboard)
         self.dynamic_content_layout.addWidget(self.readout_label)
         self.dynamic_content_layout.addWidget(self.readout_log)
         self.dynamic_content_layout.addWidget(self.save_logs_button)
@@ -291,8 +503,13 @@ class AttachmentUpdater(QWidget):
         self.login_button.setStyleSheet("background-color: #53575A; color: white;")
         self.save_logs_button.hide()
         self.readout_log.clear()
+        self.stream.drain()
+        log_path = self.stream.start_file()
+        self.dashboard.reset()
+        progress_events.add_listener(self.dashboard.event_received)
         
         print("Starting attachment update sequence...")
+        print(f"Full log is being written to {log_path}")
 
         # Use the stored authentication method
         basic_oauth = self.basic_oauth
@@ -305,6 +522,18 @@ class AttachmentUpdater(QWidget):
         url = self.URL_input.text()
         attachment_item_type_id = self.attachement_api_id_input.text()
         delete_downloads = self.delete_downloads_input.isChecked()
+        profile = self.profile_input.isChecked()
+        tune = self.tune_input.isChecked()
+        locations = self.locations_input.text()
+        temp_location = self.temp_location_input.text()
+        temp_quota_mb = self.temp_quota_input.text()
+        incremental = self.incremental_input.isChecked()
+        backup = self.backup_input.isChecked()
+        async_engine = self.async_input.isChecked()
+        optimize_images = self.optimize_input.isChecked()
+        verify = self.verify_input.isChecked()
+        dry_run = self.dry_run_input.isChecked()
+        http2 = self.http2_input.isChecked()
 
         # Create the thread and worker objects
         self.thread = QThread()
@@ -316,7 +545,19 @@ class AttachmentUpdater(QWidget):
             custom_prefix=custom_prefix,
             url=url,
             attachment_item_type_id=attachment_item_type_id,
-            delete_downloads=delete_downloads
+            delete_downloads=delete_downloads,
+            profile=profile,
+            tune=tune,
+            locations=locations,
+            incremental=incremental,
+            backup=backup,
+            async_engine=async_engine,
+            optimize_images=optimize_images,
+            verify=verify,
+            temp_location=temp_location,
+            temp_quota_mb=temp_quota_mb,
+            dry_run=dry_run,
+            http2=http2
         )
 
         # Move the worker object to the thread
@@ -336,20 +577,28 @@ class AttachmentUpdater(QWidget):
     
     def enable_run_button(self):
         """Re-enables the 'Run' button and shows the 'Save Logs' button."""
+        self.stream.close_file()
+        self.log_to_readout()
+        progress_events.remove_listener(self.dashboard.event_received)
+        self.dashboard.refresh()
         self.login_button.setEnabled(True)
         self.login_button.setStyleSheet("background-color: #0052CC; color: white;")
         self.save_logs_button.show()
 
     def save_logs(self):
-        """Opens a file dialog and saves the log content to a text file."""
+        """Opens a file dialog and saves the full log of the last run to a text file."""
         # Open a save file dialog
         fileName, _ = QFileDialog.getSaveFileName(self, "Save Logs", "", "Text Files (*.txt);;All Files (*)")
 
         if fileName:
             # If a file name was selected, write the log content to it
             try:
-                with open(fileName, 'w', encoding='utf-8') as f:
-                    f.write(self.readout_log.toPlainText())
+                if self.stream.log_path and os.path.exists(self.stream.log_path):
+                    # The readout only keeps the newest lines; the log file has the whole run
+                    shutil.copyfile(self.stream.log_path, fileName)
+                else:
+                    with open(fileName, 'w', encoding='utf-8') as f:
+                        f.write(self.readout_log.toPlainText())
                 print(f"Logs successfully saved to {fileName}")
             except Exception as e:
                 print(f"Error saving file: {e}")
@@ -357,7 +606,12 @@ class AttachmentUpdater(QWidget):
 
 if __name__ == "__main__":
     # Run the app when running this file
+    multiprocessing.freeze_support() # Lets the frozen app start the image optimisation worker processes
+    probe = StartupProbe(STARTED) # Only reports when benchmarks/bench_startup.py asks for it
     app = QApplication(sys.argv)
     window = AttachmentUpdater()
+    probe.mark('window_built')
+    window.first_painted.connect(lambda: probe.first_paint(app))
+    window.first_painted.connect(lambda: QTimer.singleShot(0, preload_workflows))
     window.show()
     sys.exit(app.exec())
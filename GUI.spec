@@ -5,12 +5,14 @@ a = Analysis(
     ['GUI.py'],
     pathex=[],
     binaries=[],
-    datas=[('jama_logo_icon.png', '.'), ('jama_logo.png', '.'), ('cleanup_file_directory.py', '.'), ('function_project.py', '.'), ('function_item.py', '.')],
+    datas=[('jama_logo_icon.png', '.'), ('jama_logo.png', '.'), ('cleanup_file_directory.py', '.'), ('function_project.py', '.'), ('function_item.py', '.'), ('download_engine.py', '.'), ('scheduler.py', '.'), ('item_groups.py', '.'), ('log_sink.py', '.'), ('progress_events.py', '.'), ('progress_dashboard.py', '.'), ('http_metrics.py', '.'), ('run_profiler.py', '.'), ('autotune.py', '.'), ('maintenance_window.py', '.'), ('scope.py', '.'), ('incremental.py', '.'), ('backup_archive.py', '.'), ('async_engine.py', '.'), ('image_optimizer.py', '.'), ('placeholder_pool.py', '.'), ('verify_run.py', '.'), ('temp_storage.py', '.'), ('dry_run.py', '.'), ('listing_decoder.py', '.'), ('startup_probe.py', '.'), ('transport.py', '.'), ('rename_index.py', '.')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # Installed in the build environment but never imported by the app; left out so the onefile
+    # bundle has less to unpack on every start
+    excludes=['numpy', 'pandas', 'openpyxl', 'xlrd', 'pytz', 'dateutil', 'tkinter', 'setuptools', 'pkg_resources'],
     noarchive=False,
     optimize=0,
 )
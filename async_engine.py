@@ -0,0 +1,502 @@
+import os
+import json
+import time
+import asyncio
+from cleanup_file_directory import cleanup
+from download_engine import DEFAULT_CHUNK_SIZE, total_from_content_range, resume_state, save_resume_state, discard_partial
+from scheduler import metadata_size, largest_first
+from item_groups import group_by_item, print_grouping_report
+from progress_events import emit, emit_plan, track
+from http_metrics import HttpMetrics
+from autotune import DEFAULT_PAGE_SIZE
+from incremental import format_jama_date, changed_since
+from image_optimizer import ImageOptimizer
+from temp_storage import TempStorage
+from listing_decoder import decode_listing
+from rename_index import RenameIndex
+from transport import MAX_RETRIES, RETRY_STATUSES, should_retry, retry_delay
+
+try:
+    import aiohttp
+except ImportError:  # Optional: only the async engine needs it
+    aiohttp = None
+
+DEFAULT_MAX_IN_FLIGHT = 128  # Requests in flight at once on the single event loop
+JSON_HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+MULTIPART_HEADERS = {"Accept": "application/json"}
+
+
+class AsyncJamaClient:
+    """
+    A small aiohttp client for the Jama endpoints the updater uses. One semaphore bounds the
+    requests in flight; 429 and 5xx gateway responses are retried with backoff (honouring
+    Retry-After), and every response is recorded in an HttpMetrics collector.
+    """
+
+    def __init__(self, jama_base_url_v2, max_in_flight=DEFAULT_MAX_IN_FLIGHT, metrics=None):
+        self.base = jama_base_url_v2.rstrip('/')
+        self.max_in_flight = max_in_flight
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+        self.metrics = metrics or HttpMetrics()
+        self.session = None
+
+    async def open(self, basic_oauth, jama_username, jama_password):
+        """Authenticates like the synchronous functions and checks the credentials with GET /projects."""
+        auth = None
+        headers = {}
+        if basic_oauth == 'basic':
+            auth = aiohttp.BasicAuth(jama_username, jama_password)
+        elif basic_oauth == 'oauth':
+            token_data = {'grant_type': 'client_credentials', 'client_id': jama_username, 'client_secret': jama_password}
+            async with aiohttp.ClientSession() as token_session:
+                async with token_session.post(f"{self.base}/rest/oauth/token", data=token_data) as response:
+                    response.raise_for_status()
+                    headers["Authorization"] = f"Bearer {(await response.json(content_type=None)).get('access_token')}"
+            print("OAuth 2.0 authentication successful! 🎉")
+        else:
+            raise ValueError("Invalid 'basic_oauth' value. Please use 'basic' or 'oauth'.")
+
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, limit_per_host=self.max_in_flight)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300)
+        self.session = aiohttp.ClientSession(connector=connector, auth=auth, headers=headers, timeout=timeout)
+        await self.request('GET', f"{self.base}/projects")
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def _backoff(self, method, url, attempt, retry_after=None):
+        self.metrics.record_retry(method, url)
+        await asyncio.sleep(retry_delay(retry_after, attempt))
+
+    async def request(self, method, url, params=None, json_body=None, data=None, bytes_out=0, headers=JSON_HEADERS, decode=json.loads):
+        """
+        Sends one request and returns its parsed JSON body (None if empty). `data` may be a callable
+        returning a fresh body, so multipart uploads can be rebuilt for a retry. Listings pass
+        decode=decode_listing to keep only the fields the workflows use.
+        """
+        if json_body is not None:
+            data = json.dumps(json_body)
+            bytes_out = len(data)
+        for attempt in range(MAX_RETRIES + 1):
+            async with self.semaphore:
+                started = time.perf_counter()
+                body = data() if callable(data) else data
+                async with self.session.request(method, url, params=params, data=body, headers=headers) as response:
+                    content = await response.read()
+                    self.metrics.record(method, str(response.url), response.status, time.perf_counter() - started, len(content), bytes_out)
+                    if not should_retry(method, response.status) or attempt == MAX_RETRIES:
+                        response.raise_for_status()
+                        return decode(content) if content else None
+                    retry_after = response.headers.get('Retry-After')
+            await self._backoff(method, url, attempt + 1, retry_after)
+
+    async def list_all(self, url, params, page_size):
+        """
+        Fetches every record of a paged listing. The first page reveals the total and the page size
+        the server really honours, after which all remaining pages are requested concurrently.
+        """
+        first = await self.request('GET', url, params=dict(params, startAt=0, maxResults=page_size), decode=decode_listing)
+        records = list(first['data'])
+        page_info = first['meta'].get('pageInfo', {})
+        total = page_info.get('totalResults')
+        step = len(first['data'])
+        if total is None:
+            # No totals: fall back to following nextLink one page at a time
+            next_url, page = first['meta'].get('nextLink'), 2
+            while next_url:
+                data = await self.request('GET', next_url, params={'startAt': (page - 1) * page_size, 'maxResults': page_size}, decode=decode_listing)
+                records.extend(data['data'])
+                next_url, page = data['meta'].get('nextLink'), page + 1
+            return records
+        if step and total > step:
+            pages = await asyncio.gather(*(self.request('GET', url, params=dict(params, startAt=start, maxResults=step), decode=decode_listing)
+                                           for start in range(step, total, step)))
+            for data in pages:
+                records.extend(data['data'])
+        return records
+
+    async def download(self, url, file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Streams a file to disk, resuming the partial '.part' file with a Range request after a dropped
+        connection. As in download_engine.download_file, a partial file is only resumed when its saved
+        state names the same URL and size.
+        """
+        part_path = file_path + ".part"
+        state = resume_state(part_path, url) or {'url': url, 'total': None}
+        save_resume_state(part_path, state)
+        for attempt in range(MAX_RETRIES + 1):
+            done = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {"Range": f"bytes={done}-"} if done else {}
+            try:
+                async with self.semaphore:
+                    started = time.perf_counter()
+                    async with self.session.get(url, headers=headers) as response:
+                        self.metrics.record('GET', url, response.status, time.perf_counter() - started,
+                                            int(response.headers.get('Content-Length', 0) or 0))
+                        total = total_from_content_range(response) if response.status == 206 else response.content_length if response.status == 200 else None
+                        if done and state['total'] is not None and (total not in (None, state['total']) or
+                                                                    (response.status == 416 and done != state['total'])):
+                            os.remove(part_path)  # Bytes of another version of the file: start over
+                            continue
+                        if response.status == 416:
+                            break  # Already complete
+                        if response.status in RETRY_STATUSES and attempt < MAX_RETRIES:
+                            retry_after = response.headers.get('Retry-After')
+                        else:
+                            response.raise_for_status()
+                            if state['total'] is None and total is not None:
+                                state['total'] = total
+                                save_resume_state(part_path, state)
+                            mode = 'ab' if response.status == 206 else 'wb'  # 200: the server ignored Range, start over
+                            with open(part_path, mode) as f:
+                                async for chunk in response.content.iter_chunked(chunk_size):
+                                    f.write(chunk)
+                            break
+            except (aiohttp.ClientPayloadError, aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == MAX_RETRIES:
+                    raise
+                retry_after = None
+            await self._backoff('GET', url, attempt + 1, retry_after)
+        os.replace(part_path, file_path)
+        discard_partial(part_path)  # Only the state is left by now
+        return os.path.getsize(file_path)
+
+    async def upload(self, url, file_path):
+        size = os.path.getsize(file_path)
+
+        def form():
+            data = aiohttp.FormData()
+            data.add_field('file', open(file_path, 'rb'), filename=os.path.basename(file_path), content_type='application/octet-stream')
+            return data
+
+        await self.request('PUT', url, data=form, bytes_out=size, headers=MULTIPART_HEADERS)
+        return size
+
+
+async def _run_pool(tasks, work, workers, stop=None):
+    """Runs work(task) for every task with `workers` coroutines pulling largest-first; stops picking up tasks once `stop` is set."""
+    queue = asyncio.Queue()
+    for task in largest_first(tasks):
+        queue.put_nowait(task)
+
+    async def worker():
+        while not queue.empty():
+            task = queue.get_nowait()
+            if stop is None or not stop.is_set():
+                await work(task)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, min(workers, len(tasks))))))
+
+
+async def update_item_attachments_async(basic_oauth, jama_username, jama_password, project_api_id, custom_prefix, jama_base_url_v2, t_f,
+                                        max_in_flight=DEFAULT_MAX_IN_FLIGHT, trace_path=None, page_size=DEFAULT_PAGE_SIZE,
+                                        chunk_size=DEFAULT_CHUNK_SIZE, since=None, optimize_images=False, max_image_dimension=None, record=None, temp_location=None, dry_run=None):
+    """
+    asyncio version of function_item.update_item_attachments: discovery, download, create/upload/link
+    and delete all run on one event loop with up to `max_in_flight` requests outstanding.
+
+    Returns:
+        int or None: The next free enumeration index, or None if authentication failed.
+    """
+    metrics = HttpMetrics(trace_path)
+    client = AsyncJamaClient(jama_base_url_v2, max_in_flight, metrics)
+    print(f"\nAttempting to authenticate with Jama Connect using {basic_oauth.upper()} (async engine)...")
+    try:
+        await client.open(basic_oauth, jama_username, jama_password)
+        print("Authentication successful! 🎉")
+    except Exception as e:
+        print("Authentication failed. Please check your credentials.")
+        print(f"Error: {e}")
+        await client.close()
+        return None
+
+    try:
+        # --- Discovery: all listing pages, then every item's attachments, concurrently ---
+        print("Fetching all items for the specified project...")
+        if since is not None:
+            print(f"Incremental run: only items changed since {format_jama_date(since)}.")
+            all_items = await client.list_all(f"{client.base}/abstractitems", {"project": project_api_id, "lastActivityDate": format_jama_date(since)}, page_size)
+        else:
+            all_items = await client.list_all(f"{client.base}/items", {"project": project_api_id}, page_size)
+        all_items = [item for item in all_items if changed_since(item, since)]
+        print(f"Successfully fetched {len(all_items)} items from the project.")
+
+        emit_plan('list', len(all_items))
+
+        async def item_attachments(item):
+            started = time.perf_counter()
+            try:
+                data = await client.request('GET', f"{client.base}/items/{item['id']}/attachments", decode=decode_listing)
+                found = data.get('data', [])
+                for att in found:
+                    att['parent_item_id'] = item['id']
+                emit('list', 'ok', item_id=item['id'], name=f"{len(found)} attachments", duration=time.perf_counter() - started)
+                return found
+            except aiohttp.ClientResponseError as e:
+                if e.status != 404:
+                    print(f"Failed to fetch attachments for item ID {item['id']}. Error: {e}")
+                    emit('list', 'error', item_id=item['id'], message=str(e))
+                else:
+                    emit('list', 'skipped', item_id=item['id'], name="no attachments")
+            except Exception as e:
+                print(f"An unexpected error occurred while fetching attachments for item ID {item['id']}: {e}")
+                emit('list', 'error', item_id=item['id'], message=str(e))
+            return []
+
+        all_attachments = [att for found in await asyncio.gather(*(item_attachments(item) for item in all_items)) for att in found]
+        print(f"Successfully retrieved a total of {len(all_attachments)} attachments.")
+
+        # --- Filtering: same matching and naming as the threaded workflow ---
+        print("\nFiltering attachments that start with 'image' or 'Image'...")
+        attachments_to_update = []
+        renames = RenameIndex(jama_base_url_v2, project_api_id, custom_prefix).scan(all_attachments)
+        enumeration = renames.next_suffix()
+        for attachment in all_attachments:
+            attachment_name = attachment['fields'].get('name')
+            if attachment['id'] in renames:
+                continue
+            if attachment_name and attachment_name.lower().startswith('image'):
+                file_name = attachment['fields'].get('filename')
+                base_name, file_extension = os.path.splitext(file_name or attachment_name)
+                if not file_name:
+                    print(f"Warning: Attachment ID {attachment['id']} has no filename. Using attachment name for new file name.")
+                # A copy an interrupted run linked (per its run record) leaves only the original's delete to do
+                copy_name = renames.copy_of(attachment)
+                new_name = copy_name or f"{custom_prefix}{base_name}_{enumeration:05d}{file_extension or '.png'}"
+                if not copy_name:
+                    enumeration += 1
+                attachments_to_update.append({
+                    'item_id': attachment['parent_item_id'],
+                    'original_attachment_id': attachment['id'],
+                    'original_name': attachment_name,
+                    'original_file_name': file_name,
+                    'download_url': f"{client.base}/attachments/{attachment['id']}/file",
+                    'new_name': new_name,
+                    'size': 0 if copy_name else metadata_size(attachment),
+                    'copied': bool(copy_name)
+                })
+
+        to_copy = [a for a in attachments_to_update if not a['copied']]
+        print(f"Found {len(attachments_to_update)} attachments to update.")
+        if len(to_copy) < len(attachments_to_update):
+            print(f"{len(attachments_to_update) - len(to_copy)} of them already have their renamed copy linked; only their originals will be deleted.")
+        if not attachments_to_update:
+            print("No attachments found that meet the criteria. Exiting.")
+            return enumeration
+        if dry_run is not None:
+            n = len(to_copy)
+            dry_run.plan('item', attachments_to_update, [('download', n), ('create', n), ('upload', n), ('link', n), ('delete', len(attachments_to_update))],
+                         metrics, max_in_flight, probes_sizes=False)
+            return enumeration
+        renames.save(enumeration - 1)
+
+        # --- Per item: download, create/upload/link every replacement, then delete the originals ---
+        print("\nExecuting the download, upload, and delete workflow...")
+        storage = TempStorage(temp_location, evict=t_f)  # No quota: the event loop must never block on disk space
+        temp_dir = storage.directory
+        total_bytes = sum(a['size'] or 0 for a in attachments_to_update)
+        emit_plan('download', len(to_copy), total_bytes)
+        for stage in ('create', 'upload', 'link'):
+            emit_plan(stage, len(to_copy), total_bytes if stage == 'upload' else 0)
+        emit_plan('delete', len(attachments_to_update))
+        optimizer = ImageOptimizer(optimize_images, temp_dir, max_image_dimension)
+        optimizer.plan(len(to_copy), total_bytes)
+
+        failed = asyncio.Event()  # Set on the first upload failure so no new items start
+        request_counts = {'link': 0, 'delete': 0}
+
+        async def replace(attachment):
+            details = {'attachment_id': attachment['original_attachment_id'], 'item_id': attachment['item_id'], 'name': attachment['new_name']}
+            file_path = os.path.join(temp_dir, attachment['new_name'])
+            try:
+                with track('download', **details) as result:
+                    result['bytes'] = await client.download(attachment['download_url'], file_path, chunk_size)
+                storage.account(attachment['original_attachment_id'], file_path)
+                upload_path = await asyncio.wrap_future(optimizer.submit(file_path, **details))
+                if upload_path != file_path:
+                    storage.account(attachment['original_attachment_id'], upload_path)
+                with track('create', **details):
+                    created = await client.request('POST', f"{client.base}/projects/{project_api_id}/attachments", json_body={
+                        "fields": {"name": attachment['new_name'], "description": "Attachment renamed and re-uploaded via API script."}})
+                    new_attachment_item_id = created['meta']['id']
+                with track('upload', **details) as result:
+                    result['bytes'] = await client.upload(f"{client.base}/attachments/{new_attachment_item_id}/file", upload_path)
+                request_counts['link'] += 1
+                with track('link', **details):
+                    await client.request('POST', f"{client.base}/items/{attachment['item_id']}/attachments", json_body={"attachment": new_attachment_item_id})
+                if record is not None:
+                    await asyncio.to_thread(record.add, 'item', new_attachment_item_id, attachment['item_id'], attachment['new_name'], upload_path,
+                                            attachment['original_attachment_id'])
+                storage.evict(attachment['original_attachment_id'])
+                return True
+            except Exception as e:
+                print(f"   - An error occurred during the upload process for {attachment['new_name']}. Error: {e}")
+                failed.set()
+                return False
+
+        async def delete(attachment):
+            request_counts['delete'] += 1
+            try:
+                with track('delete', attachment_id=attachment['original_attachment_id'], item_id=attachment['item_id'], name=attachment['original_name']):
+                    await client.request('DELETE', f"{client.base}/items/{attachment['item_id']}/attachments/{attachment['original_attachment_id']}")
+            except Exception as e:
+                print(f"   - Failed to delete original attachment ID {attachment['original_attachment_id']}. Error: {e}")
+                print("   - Original attachments may remain. Please check manually.")
+
+        async def process_item(group):
+            results = await asyncio.gather(*(replace(a) for a in group['attachments'] if not a['copied']))
+            if not all(results):
+                print(f"\n⚠️ Upload/link did not complete for item {group['item_id']}. Its original attachments have been kept.")
+                return
+            await asyncio.gather(*(delete(a) for a in group['attachments']))
+
+        item_groups = group_by_item(attachments_to_update)
+        await _run_pool(item_groups, process_item, max_in_flight, stop=failed)
+
+        if failed.is_set():
+            print("\n⚠️ An error occurred during the upload/link process. Items that had not finished keep their original attachments.")
+        print_grouping_report(item_groups, request_counts['link'], request_counts['delete'])
+        optimizer.close()
+        storage.report()
+        cleanup(t_f, temp_dir)
+        print("\n✅ Item Attachment Script execution complete (async engine). ✅")
+        return enumeration
+    finally:
+        await client.close()
+        metrics.print_summary("Item attachment HTTP request summary")
+        metrics.close()
+
+
+async def update_attachments_by_type_async(basic_oauth, jama_username, jama_password, project_api_id, custom_prefix, jama_base_url_v2,
+                                           attachment_item_type_id, t_f, index, max_in_flight=DEFAULT_MAX_IN_FLIGHT, trace_path=None,
+                                           page_size=DEFAULT_PAGE_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, since=None, optimize_images=False,
+                                           max_image_dimension=None, record=None, temp_location=None, dry_run=None):
+    """
+    asyncio version of function_project.update_attachments_by_type.
+
+    Returns:
+        tuple or None: (number of matching attachments processed, work key of the queued name update
+        or None), or None if authentication failed.
+    """
+    metrics = HttpMetrics(trace_path)
+    client = AsyncJamaClient(jama_base_url_v2, max_in_flight, metrics)
+    print(f"Authenticating with Jama Connect using {basic_oauth.upper()} (async engine)...")
+    try:
+        await client.open(basic_oauth, jama_username, jama_password)
+        print("Initial authentication check successful! 🎉")
+    except Exception as e:
+        print(f"Authentication failed. Please check your credentials. Error: {e}")
+        await client.close()
+        return None
+
+    try:
+        print(f"Fetching all attachments (Item Type ID: {attachment_item_type_id}) for the project...")
+        params = {"project": project_api_id, "itemType": attachment_item_type_id}
+        if since is not None:
+            print(f"Incremental run: only attachments changed since {format_jama_date(since)}.")
+            params["lastActivityDate"] = format_jama_date(since)
+        all_attachments = [a for a in await client.list_all(f"{client.base}/abstractitems", params, page_size) if changed_since(a, since)]
+        print(f"Successfully fetched {len(all_attachments)} attachments from the project.")
+
+        print("Filtering attachments that start with 'image' or 'Image'...")
+        attachments_to_update = []
+        renames = RenameIndex(jama_base_url_v2, project_api_id, custom_prefix).scan(all_attachments)
+        enumeration = renames.next_suffix(index)
+        for attachment in all_attachments:
+            attachment_name = attachment['fields'].get('name')
+            if attachment['id'] in renames:
+                continue
+            if attachment_name and attachment_name.lower().startswith('image'):
+                base_name, file_extension = os.path.splitext(attachment_name)
+                attachments_to_update.append({
+                    'original_attachment_id': attachment['id'],
+                    'original_name': attachment_name,
+                    'download_url': f"{client.base}/attachments/{attachment['id']}/file",
+                    'new_name': f"{custom_prefix}{base_name}_{enumeration:05d}{file_extension}",
+                    'parent_item_id': attachment['fields'].get('parent'),
+                    'size': metadata_size(attachment)
+                })
+                enumeration += 1
+
+        print(f"Found {len(attachments_to_update)} attachments to update.")
+        if not attachments_to_update:
+            print("No attachments found that meet the criteria. Exiting.")
+            return 0, None
+        if dry_run is not None:
+            n = len(attachments_to_update)
+            dry_run.plan('project', attachments_to_update, [('download', n), ('upload', n), ('rename', 1)], metrics, max_in_flight, probes_sizes=False)
+            return n, None
+        renames.save(enumeration - 1)
+
+        print("Executing the download and update workflow...")
+        storage = TempStorage(temp_location, evict=t_f)  # No quota: the event loop must never block on disk space
+        temp_dir = storage.directory
+        total_bytes = sum(a['size'] or 0 for a in attachments_to_update)
+        emit_plan('download', len(attachments_to_update), total_bytes)
+        emit_plan('upload', len(attachments_to_update), total_bytes)
+        emit_plan('rename', 1)
+        optimizer = ImageOptimizer(optimize_images, temp_dir, max_image_dimension)
+        optimizer.plan(len(attachments_to_update), total_bytes)
+
+        async def process(attachment):
+            details = {'attachment_id': attachment['original_attachment_id'], 'item_id': attachment['parent_item_id'], 'name': attachment['new_name']}
+            file_path = os.path.join(temp_dir, attachment['new_name'])
+            try:
+                with track('download', **details) as result:
+                    result['bytes'] = await client.download(attachment['download_url'], file_path, chunk_size)
+                storage.account(attachment['original_attachment_id'], file_path)
+                upload_path = await asyncio.wrap_future(optimizer.submit(file_path, **details))
+                if upload_path != file_path:
+                    storage.account(attachment['original_attachment_id'], upload_path)
+                with track('upload', **details) as result:
+                    result['bytes'] = await client.upload(f"{client.base}/attachments/{attachment['original_attachment_id']}/file", upload_path)
+                if record is not None:
+                    await asyncio.to_thread(record.add, 'project', attachment['original_attachment_id'], attachment['parent_item_id'],
+                                            attachment['new_name'], upload_path)
+            except Exception as e:
+                print(f"    - An error occurred during the update process for {attachment['original_name']}. Error: {e}")
+            finally:
+                storage.evict(attachment['original_attachment_id'])
+
+        await _run_pool(attachments_to_update, process, max_in_flight)
+
+        print("\n--- 5. Finalizing Updates ---")
+        print("Submitting asynchronous PATCH request to update all attachment names...")
+        patch_payload = [{"items": [a['original_attachment_id']], "operations": [{"op": "replace", "path": "/fields/name", "value": a['new_name']}]}
+                         for a in attachments_to_update]
+        work_identifier = None
+        try:
+            with track('rename', name=f"{len(patch_payload)} attachment names"):
+                response_data = await client.request('PATCH', f"{client.base}/../v1/items", json_body=patch_payload)
+                work_identifier = response_data['data']['workKey']
+            print(f"PATCH request successful! A work identifier has been provided for monitoring: {work_identifier} 🚀")
+        except Exception as e:
+            print(f"An error occurred during the asynchronous name update: {e}")
+
+        optimizer.close()
+        storage.report()
+        cleanup(t_f, temp_dir)
+        print("\n✅ Project Attachment Script execution complete (async engine). ✅")
+        return len(attachments_to_update), work_identifier
+    finally:
+        await client.close()
+        metrics.print_summary("Project attachment HTTP request summary")
+        metrics.close()
+
+
+def _require_aiohttp():
+    if aiohttp is None:
+        raise RuntimeError("The async engine needs the optional 'aiohttp' package (pip install aiohttp).")
+
+
+def run_item_attachments(**kwargs):
+    """Runs update_item_attachments_async to completion on a fresh event loop (safe from a worker thread)."""
+    _require_aiohttp()
+    return asyncio.run(update_item_attachments_async(**kwargs))
+
+
+def run_attachments_by_type(**kwargs):
+    """Runs update_attachments_by_type_async to completion on a fresh event loop (safe from a worker thread)."""
+    _require_aiohttp()
+    return asyncio.run(update_attachments_by_type_async(**kwargs))
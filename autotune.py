@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import statistics
+import requests
+from requests.auth import HTTPBasicAuth
+from concurrent.futures import ThreadPoolExecutor
+from log_sink import LOG_DIR
+from download_engine import DEFAULT_CHUNK_SIZE
+from scheduler import DEFAULT_MAX_WORKERS
+from transport import new_session, DEFAULT_TRANSPORT
+
+DEFAULT_PAGE_SIZE = 20  # maxResults used for paged listings when no tuned profile exists
+PROFILE_PATH = os.path.join(os.path.dirname(LOG_DIR), "tuning_profiles.json")
+
+PAGE_SIZE_CANDIDATES = (20, 50, 100, 200, 500)
+CONCURRENCY_LEVELS = (1, 2, 4, 8, 16, 32)
+REQUESTS_PER_LEVEL = 4  # Requests per worker at each concurrency level
+MIN_SPEEDUP = 1.15  # A level must beat the previous one by this much to be worth its extra connections
+LATENCY_SAMPLES = 5
+BANDWIDTH_SAMPLE_BYTES = 16 * 1024 * 1024  # Largest amount read (or re-uploaded) per bandwidth sample
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+CHUNK_SECONDS = 0.05  # Aim for one chunk per ~50 ms of transfer at the measured bandwidth
+
+JSON_HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+
+
+def authenticated_session(basic_oauth, jama_username, jama_password, jama_base_url_v2, transport=DEFAULT_TRANSPORT):
+    """Opens a session the same way the update functions do. Raises on authentication failure."""
+    session = new_session(transport)
+    if basic_oauth == 'basic':
+        session.auth = HTTPBasicAuth(jama_username, jama_password)
+    elif basic_oauth == 'oauth':
+        token_data = {'grant_type': 'client_credentials', 'client_id': jama_username, 'client_secret': jama_password}
+        response = requests.post(f"{jama_base_url_v2.rstrip('/')}/rest/oauth/token", data=token_data)
+        response.raise_for_status()
+        session.headers.update({"Authorization": f"Bearer {response.json().get('access_token')}"})
+    else:
+        raise ValueError("Invalid 'basic_oauth' value. Please use 'basic' or 'oauth'.")
+    response = session.get(f"{jama_base_url_v2.rstrip('/')}/projects", headers=JSON_HEADERS)
+    response.raise_for_status()
+    return session
+
+
+def measure_latency(session, jama_base_url_v2, samples=LATENCY_SAMPLES):
+    """Median round-trip time in milliseconds of a small authenticated GET."""
+    url = f"{jama_base_url_v2.rstrip('/')}/projects"
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        session.get(url, headers=JSON_HEADERS, params={"maxResults": 1}).raise_for_status()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def _accepted_page_size(session, url, params, candidates):
+    """
+    Largest candidate maxResults the endpoint honours (servers either reject or silently cap larger
+    pages), and whether a limit was actually hit rather than the listing running out of data.
+    """
+    accepted = candidates[0]
+    for size in candidates:
+        try:
+            response = session.get(url, headers=JSON_HEADERS, params=dict(params, startAt=0, maxResults=size))
+            response.raise_for_status()
+            data = response.json()
+        except Exception:
+            return accepted, True
+        page_info = data.get('meta', {}).get('pageInfo', {})
+        returned = len(data.get('data', []))
+        total = page_info.get('totalResults', returned)
+        if returned < size and returned < total:
+            return accepted, True  # Capped below the requested size
+        accepted = size
+        if total <= size:
+            break  # Not enough data to test anything larger
+    return accepted, False
+
+
+def probe_page_size(session, jama_base_url_v2, project_api_id, attachment_item_type_id, candidates=PAGE_SIZE_CANDIDATES):
+    """
+    Largest page size accepted by both /items and /abstractitems. A listing too short to reach a
+    limit only proves a lower bound, so the other endpoint's result is used when it found one.
+    """
+    base = jama_base_url_v2.rstrip('/')
+    results = [
+        _accepted_page_size(session, f"{base}/items", {"project": project_api_id}, candidates),
+        _accepted_page_size(session, f"{base}/abstractitems", {"project": project_api_id, "itemType": attachment_item_type_id}, candidates),
+    ]
+    limits = [size for size, capped in results if capped]
+    return min(limits) if limits else max(size for size, _ in results)
+
+
+def probe_concurrency(session, jama_base_url_v2, levels=CONCURRENCY_LEVELS):
+    """
+    Raises the number of parallel requests until throughput stops improving or the server starts
+    answering 429, and returns (best level, {level: requests/s}).
+    """
+    url = f"{jama_base_url_v2.rstrip('/')}/projects"
+    session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=max(levels)))
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=max(levels)))
+
+    def call(_):
+        return session.get(url, headers=JSON_HEADERS, params={"maxResults": 1}).status_code
+
+    best, best_rate, rates = levels[0], 0.0, {}
+    for level in levels:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=level) as pool:
+            statuses = list(pool.map(call, range(level * REQUESTS_PER_LEVEL)))
+        rate = len(statuses) / (time.perf_counter() - started)
+        rates[level] = round(rate, 1)
+        if 429 in statuses:
+            print(f"   - Rate limited at {level} parallel requests.")
+            break
+        if rate < best_rate * MIN_SPEEDUP:
+            break
+        best, best_rate = level, rate
+    return best, rates
+
+
+def _sample_attachment(session, jama_base_url_v2, project_api_id, attachment_item_type_id):
+    """Returns the largest attachment on the first listing page, or None."""
+    response = session.get(f"{jama_base_url_v2.rstrip('/')}/abstractitems", headers=JSON_HEADERS,
+                           params={"project": project_api_id, "itemType": attachment_item_type_id, "startAt": 0, "maxResults": DEFAULT_PAGE_SIZE})
+    response.raise_for_status()
+    attachments = response.json().get('data', [])
+    if not attachments:
+        return None
+    return max(attachments, key=lambda a: int(a.get('fileSize') or a.get('fields', {}).get('fileSize') or 0))
+
+
+def probe_bandwidth(session, jama_base_url_v2, attachment, measure_upload=False):
+    """
+    Downloads up to BANDWIDTH_SAMPLE_BYTES of an attachment and returns (download MB/s, upload MB/s).
+    With measure_upload the same bytes are written back to the same attachment, which creates a new
+    file version on the server, so it is off unless asked for; the upload rate is None otherwise.
+    """
+    url = f"{jama_base_url_v2.rstrip('/')}/attachments/{attachment['id']}/file"
+    file_name = attachment['fields'].get('filename') or attachment['fields'].get('name') or f"attachment_{attachment['id']}"
+    started = time.perf_counter()
+    with session.get(url, stream=True) as response:
+        response.raise_for_status()
+        content = bytearray()
+        for chunk in response.iter_content(chunk_size=MIN_CHUNK_SIZE):
+            content.extend(chunk)
+            if len(content) >= BANDWIDTH_SAMPLE_BYTES:
+                break
+    download_mbps = len(content) / (1024 * 1024) / max(time.perf_counter() - started, 1e-6)
+
+    upload_mbps = None
+    if measure_upload and len(content) < BANDWIDTH_SAMPLE_BYTES:
+        started = time.perf_counter()
+        response = session.put(url, files={'file': (file_name, bytes(content), 'application/octet-stream')},
+                               headers={"Accept": "application/json"})
+        response.raise_for_status()
+        upload_mbps = len(content) / (1024 * 1024) / max(time.perf_counter() - started, 1e-6)
+    elif measure_upload:
+        print("   - Sample attachment is too large to re-upload safely; skipping the upload measurement.")
+    return download_mbps, upload_mbps
+
+
+def chunk_size_for(mbps):
+    """Power-of-two I/O chunk size covering ~CHUNK_SECONDS of transfer at the given rate."""
+    if not mbps:
+        return DEFAULT_CHUNK_SIZE
+    target = mbps * 1024 * 1024 * CHUNK_SECONDS
+    size = MIN_CHUNK_SIZE
+    while size < target and size < MAX_CHUNK_SIZE:
+        size *= 2
+    return size
+
+
+def calibrate(basic_oauth, jama_username, jama_password, project_api_id, jama_base_url_v2, attachment_item_type_id=22, measure_upload=False):
+    """
+    Measures latency, the accepted page size, the useful concurrency level and download (and
+    optionally upload) bandwidth for one instance, saves the result as its tuned profile and returns it.
+    """
+    print(f"\nCalibrating transfer settings for {jama_base_url_v2}...")
+    session = authenticated_session(basic_oauth, jama_username, jama_password, jama_base_url_v2)
+
+    latency_ms = measure_latency(session, jama_base_url_v2)
+    print(f"   - Round-trip latency: {latency_ms:.1f} ms")
+    page_size = probe_page_size(session, jama_base_url_v2, project_api_id, attachment_item_type_id)
+    print(f"   - Largest accepted page size: {page_size}")
+    max_workers, rates = probe_concurrency(session, jama_base_url_v2)
+    print(f"   - Requests/s by concurrency: {rates} -> using {max_workers} workers")
+
+    download_mbps = upload_mbps = None
+    attachment = _sample_attachment(session, jama_base_url_v2, project_api_id, attachment_item_type_id)
+    if attachment is None:
+        print("   - No attachments found to measure bandwidth; keeping the default chunk size.")
+    else:
+        download_mbps, upload_mbps = probe_bandwidth(session, jama_base_url_v2, attachment, measure_upload)
+        print(f"   - Download bandwidth: {download_mbps:.1f} MB/s" + (f", upload: {upload_mbps:.1f} MB/s" if upload_mbps else ""))
+
+    profile = {
+        'page_size': page_size,
+        'max_workers': max_workers,
+        'chunk_size': chunk_size_for(download_mbps),
+        'latency_ms': round(latency_ms, 1),
+        'requests_per_second': rates,
+        'download_mbps': round(download_mbps, 2) if download_mbps else None,
+        'upload_mbps': round(upload_mbps, 2) if upload_mbps else None,
+        'measured_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    save_profile(jama_base_url_v2, profile)
+    print(f"Tuned profile saved to {PROFILE_PATH}: page size {page_size}, {max_workers} workers, "
+          f"{profile['chunk_size'] // 1024} KiB chunks")
+    return profile
+
+
+def _profile_key(jama_base_url_v2):
+    return jama_base_url_v2.rstrip('/').lower()
+
+
+def _read_profiles(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_profile(jama_base_url_v2, profile, path=PROFILE_PATH):
+    profiles = _read_profiles(path)
+    profiles[_profile_key(jama_base_url_v2)] = profile
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(profiles, f, indent=2)
+
+
+def load_profile(jama_base_url_v2, path=PROFILE_PATH):
+    """The saved tuned profile for this instance, or None if it was never calibrated."""
+    return _read_profiles(path).get(_profile_key(jama_base_url_v2))
+
+
+def tuned_settings(jama_base_url_v2):
+    """Keyword arguments (max_workers, page_size, chunk_size) for the update functions, from the saved profile or defaults."""
+    profile = load_profile(jama_base_url_v2) or {}
+    return {
+        'max_workers': profile.get('max_workers', DEFAULT_MAX_WORKERS),
+        'page_size': profile.get('page_size', DEFAULT_PAGE_SIZE),
+        'chunk_size': profile.get('chunk_size', DEFAULT_CHUNK_SIZE),
+    }
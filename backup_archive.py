@@ -0,0 +1,182 @@
+import os
+import io
+import csv
+import time
+import queue
+import hashlib
+import tarfile
+import zipfile
+import threading
+from concurrent.futures import Future
+from log_sink import LOG_DIR
+from progress_events import emit
+
+BACKUP_DIR = os.path.join(os.path.dirname(LOG_DIR), "backups")
+DEFAULT_VOLUME_BYTES = 2 * 1024 ** 3  # Roll over to a new volume at 2 GiB
+COPY_CHUNK_SIZE = 1024 * 1024
+FORMATS = ('zip', 'tar')
+MANIFEST_FIELDS = ['volume', 'entry', 'original_attachment_id', 'item_id', 'original_name', 'original_file_name', 'size', 'sha256']
+
+
+class _HashingReader:
+    """File wrapper that hashes everything read through it (lets tarfile stream and hash in one pass)."""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.digest.update(data)
+        return data
+
+
+class BackupArchive:
+    """
+    Streams the originals the item workflow has already downloaded into ZIP (or tar) volumes
+    before they are deleted from Jama, so the backup costs no extra transfer.
+
+    add() queues a downloaded file and returns a Future that resolves to its manifest row once the
+    bytes are in the archive; a single writer thread does the archiving concurrently with the rest
+    of the pipeline. A new volume is started whenever the next file would take the current one
+    past `volume_limit`. Each volume carries its own manifest.csv, and a combined manifest
+    (original ID, item, name, size and SHA-256 per file) is written next to the volumes.
+    Every member is flushed to disk before its Future resolves; tar volumes also stay readable if
+    the run is killed before close(), whereas a ZIP's central directory is only written at close.
+    """
+
+    def __init__(self, directory=BACKUP_DIR, name="backup", volume_limit=DEFAULT_VOLUME_BYTES, archive_format='zip'):
+        if archive_format not in FORMATS:
+            raise ValueError(f"Unsupported backup format '{archive_format}', expected one of {', '.join(FORMATS)}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.stem = f"{name}_{time.strftime('%Y%m%d_%H%M%S')}"
+        self.volume_limit = volume_limit
+        self.archive_format = archive_format
+        self.volumes = []
+        self.files = 0
+        self.bytes = 0
+        self._volume = None
+        self._volume_bytes = 0
+        self._volume_rows = []
+        self._jobs = queue.Queue()
+        self.manifest_path = os.path.join(directory, f"{self.stem}_manifest.csv")
+        self._manifest_file = open(self.manifest_path, 'w', newline='', encoding='utf-8')
+        self._manifest = csv.DictWriter(self._manifest_file, fieldnames=MANIFEST_FIELDS)
+        self._manifest.writeheader()
+        self._writer = threading.Thread(target=self._run, name="backup-writer", daemon=True)
+        self._writer.start()
+
+    def add(self, file_path, original_attachment_id, item_id, original_name, original_file_name=None):
+        """Queues a downloaded original for archiving; returns a Future for its manifest row."""
+        future = Future()
+        entry = f"{item_id}/{original_attachment_id}_{original_file_name or original_name}"
+        self._jobs.put((future, file_path, {
+            'entry': entry,
+            'original_attachment_id': original_attachment_id,
+            'item_id': item_id,
+            'original_name': original_name,
+            'original_file_name': original_file_name or '',
+        }))
+        return future
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            future, file_path, row = job
+            details = {'attachment_id': row['original_attachment_id'], 'item_id': row['item_id'], 'name': row['entry']}
+            started = time.perf_counter()
+            try:
+                row = self._write(file_path, row)
+                emit('backup', 'ok', bytes=row['size'], duration=time.perf_counter() - started, **details)
+                future.set_result(row)
+            except Exception as e:
+                # The current volume may hold a partial member; start a clean one for the next file
+                emit('backup', 'error', message=str(e), **details)
+                try:
+                    self._close_volume()
+                except Exception:
+                    self._volume = None
+                future.set_exception(e)
+
+    def _open_volume(self):
+        number = len(self.volumes) + 1
+        path = os.path.join(self.directory, f"{self.stem}_vol{number:03d}.{self.archive_format}")
+        if self.archive_format == 'zip':
+            self._volume = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
+        else:
+            self._volume = tarfile.open(path, 'w')
+        self.volumes.append(path)
+        self._volume_bytes = 0
+        self._volume_rows = []
+
+    def _close_volume(self):
+        if self._volume is None:
+            return
+        try:
+            # Each volume stays self-describing even if the others are lost
+            manifest = io.StringIO()
+            writer = csv.DictWriter(manifest, fieldnames=MANIFEST_FIELDS)
+            writer.writeheader()
+            writer.writerows(self._volume_rows)
+            data = manifest.getvalue().encode('utf-8')
+            if self.archive_format == 'zip':
+                self._volume.writestr("manifest.csv", data)
+            else:
+                info = tarfile.TarInfo("manifest.csv")
+                info.size = len(data)
+                info.mtime = time.time()
+                self._volume.addfile(info, io.BytesIO(data))
+        finally:
+            self._volume.close()
+            self._volume = None
+
+    def _write(self, file_path, row):
+        size = os.path.getsize(file_path)
+        if self._volume is not None and self._volume_bytes and self._volume_bytes + size > self.volume_limit:
+            self._close_volume()
+        if self._volume is None:
+            self._open_volume()
+
+        with open(file_path, 'rb') as source:
+            if self.archive_format == 'zip':
+                digest = hashlib.sha256()
+                with self._volume.open(row['entry'], 'w', force_zip64=size >= 2 ** 31) as target:
+                    while True:
+                        chunk = source.read(COPY_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        target.write(chunk)
+                sha256 = digest.hexdigest()
+            else:
+                info = tarfile.TarInfo(row['entry'])
+                info.size = size
+                info.mtime = time.time()
+                reader = _HashingReader(source)
+                self._volume.addfile(info, reader)
+                sha256 = reader.digest.hexdigest()
+        underlying = self._volume.fp if self.archive_format == 'zip' else self._volume.fileobj
+        underlying.flush()
+        os.fsync(underlying.fileno())
+
+        row = dict(row, volume=os.path.basename(self.volumes[-1]), size=size, sha256=sha256)
+        self._volume_bytes += size
+        self._volume_rows.append(row)
+        self._manifest.writerow(row)
+        self._manifest_file.flush()
+        self.files += 1
+        self.bytes += size
+        return row
+
+    def close(self):
+        """Waits for every queued file, closes the last volume and the manifest, and prints a summary."""
+        self._jobs.put(None)
+        self._writer.join()
+        self._close_volume()
+        self._manifest_file.close()
+        print(f"\nBackup: {self.files} original attachments ({self.bytes / (1024 * 1024):.1f} MB) in "
+              f"{len(self.volumes)} volume(s) under {self.directory}. Manifest: {self.manifest_path}")
+        return self.volumes
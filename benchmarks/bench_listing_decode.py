@@ -0,0 +1,102 @@
+"""
+Micro-benchmark of decoding one listing page: the plain response.json() the workflows used to
+do against listing_decoder.decode_listing() with each backend that is installed here.
+
+Pages are synthetic Jama attachment listings whose records carry a rich-text description and
+a number of custom fields, like the pages of a large real project. Reported per decoder: CPU
+time per page and the peak traced Python memory while decoding it.
+
+Example:
+    python benchmarks/bench_listing_decode.py --records 50 --description-kb 32 --custom-fields 30
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import listing_decoder
+
+
+def synthetic_page(records, description_kb, custom_fields):
+    def record(i):
+        fields = {
+            'name': f"image{i}.png",
+            'filename': f"image{i}.png",
+            'fileSize': 250000 + i,
+            'parent': 1000 + i // 3,
+            'description': '<p>' + 'Lorem ipsum dolor sit amet. ' * (description_kb * 1024 // 28) + '</p>',
+            'mimeType': 'image/png',
+        }
+        fields.update({f"custom{j}$22": 'value ' * 8 for j in range(custom_fields)})
+        return {
+            'id': i, 'documentKey': f"PRJ-ATT-{i}", 'globalId': f"GID-{i}", 'itemType': 22, 'project': 1,
+            'createdDate': '2024-01-01T00:00:00.000+0000', 'modifiedDate': '2024-02-01T00:00:00.000+0000',
+            'lastActivityDate': '2024-02-01T00:00:00.000+0000', 'fields': fields,
+            'location': {'sortOrder': 0, 'globalSortOrder': i, 'sequence': f"1.{i}", 'parent': {'item': 7}},
+            'resources': {'self': {'allowed': ['GET', 'PUT', 'PATCH', 'DELETE']}}, 'type': 'attachments',
+        }
+    meta = {'status': 'OK', 'pageInfo': {'startIndex': 0, 'resultCount': records, 'totalResults': records * 100}}
+    return json.dumps({'meta': meta, 'links': {}, 'linked': {}, 'data': [record(i) for i in range(records)]}).encode()
+
+
+def measure(decode, body, repeat):
+    decode(body)
+    started = time.process_time()
+    for _ in range(repeat):
+        decode(body)
+    per_page = (time.process_time() - started) / repeat
+    tracemalloc.start()
+    decode(body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return per_page, peak
+
+
+def with_backends(**backends):
+    """decode_listing with the given listing_decoder backends switched in (None = not installed)."""
+    def decode(body):
+        saved = {name: getattr(listing_decoder, name) for name in backends}
+        try:
+            for name, module in backends.items():
+                setattr(listing_decoder, name, module)
+            return listing_decoder.decode_listing(body)
+        finally:
+            for name, module in saved.items():
+                setattr(listing_decoder, name, module)
+    return decode
+
+
+def decoders():
+    """(label, decode) for the old behaviour and every listing_decoder backend installed here."""
+    ijson, orjson = listing_decoder.ijson, listing_decoder.orjson
+    found = [("json.loads (whole page)", json.loads), ("decode_listing: json", with_backends(ijson=None, orjson=None))]
+    if orjson is not None:
+        found.append(("decode_listing: orjson", with_backends(ijson=None, orjson=orjson)))
+    if ijson is not None:
+        found.append((f"decode_listing: ijson ({ijson.backend})", with_backends(ijson=ijson, orjson=None, STREAM_MIN_BYTES=0)))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the listing page decoders.")
+    parser.add_argument('--records', type=int, default=50, help="Records per page (the page size).")
+    parser.add_argument('--description-kb', type=int, default=32, help="Size of each record's rich-text description.")
+    parser.add_argument('--custom-fields', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    body = synthetic_page(args.records, args.description_kb, args.custom_fields)
+    print(f"Page: {args.records} records, {len(body) / (1024 * 1024):.2f} MB. Default backend: {listing_decoder.BACKEND}\n")
+    print(f"{'decoder':<36}{'CPU ms/page':>12}{'peak MB':>10}")
+    for label, decode in decoders():
+        per_page, peak = measure(decode, body, args.repeat)
+        print(f"{label:<36}{per_page * 1000:>12.2f}{peak / (1024 * 1024):>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
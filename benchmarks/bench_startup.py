@@ -0,0 +1,127 @@
+"""
+Cold-start benchmark of the GUI: time from launching the process to the window's first paint.
+
+Each run launches GUI.py (or a built executable with --exe) with startup_probe.py's report
+enabled; the app writes its startup marks when the window first paints and quits. Reported per
+run: time to first paint as seen by this process (interpreter start-up, or the onefile unpack,
+included), and the app's own marks: module imports done, window built, first paint. Any module
+that should only load when Run is clicked (startup_probe.DEFERRED_MODULES) but was already loaded
+at first paint is listed, and fails the run.
+
+With --import-times (script mode only) one extra run under `python -X importtime` lists the
+slowest imports made before the window paints.
+
+Examples:
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --exe dist/GUI.exe --history benchmarks/startup_history.jsonl --max-first-paint 3
+    QT_QPA_PLATFORM=offscreen python benchmarks/bench_startup.py --import-times
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from startup_probe import STARTUP_REPORT_ENV
+
+GUI_SCRIPT = os.path.join(REPO_ROOT, "GUI.py")
+LAUNCH_TIMEOUT_SECONDS = 120
+
+
+def launch(command, extra_env=None):
+    """Starts the app once and returns its startup report, with 'first_paint_s' measured from launch."""
+    fd, report_path = tempfile.mkstemp(prefix="startup_", suffix=".json")
+    os.close(fd)
+    os.remove(report_path)  # The app creates it at first paint
+    env = dict(os.environ, **(extra_env or {}))
+    env[STARTUP_REPORT_ENV] = report_path
+    try:
+        launched = time.perf_counter()
+        completed = subprocess.run(command, env=env, cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                   text=True, timeout=LAUNCH_TIMEOUT_SECONDS)
+        if not os.path.exists(report_path):
+            raise RuntimeError(f"The app exited with code {completed.returncode} without painting its window:\n{completed.stderr[-2000:]}")
+        with open(report_path, 'r', encoding='utf-8') as f:
+            report = json.load(f)
+    finally:
+        if os.path.exists(report_path):
+            os.remove(report_path)
+    # perf_counter() is a system-wide monotonic clock, so the app's marks compare with ours
+    report['first_paint_s'] = round(report['marks']['first_paint'] - launched, 4)
+    report['stderr'] = completed.stderr
+    return report
+
+
+def import_times(stderr, limit=15):
+    """The slowest top-level imports from `python -X importtime` output, as (module, cumulative ms)."""
+    found = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # Only imports made by the script itself, not their dependencies
+            found.append((name.strip(), int(cumulative) / 1000))
+    return sorted(found, key=lambda entry: -entry[1])[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the GUI's time to first paint.")
+    parser.add_argument('--exe', help="Benchmark this built executable instead of GUI.py.")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--offscreen', action='store_true', help="Use Qt's offscreen platform (headless machines).")
+    parser.add_argument('--import-times', action='store_true', help="Also list the slowest imports before first paint (script mode).")
+    parser.add_argument('--history', help="Append a JSON line with this run's results to this file, to track regressions.")
+    parser.add_argument('--max-first-paint', type=float, help="Fail if the median time to first paint exceeds this many seconds.")
+    args = parser.parse_args(argv)
+
+    command = [args.exe] if args.exe else [sys.executable, GUI_SCRIPT]
+    extra_env = {'QT_QPA_PLATFORM': 'offscreen'} if args.offscreen else {}
+    print(f"Launching {' '.join(command)} {args.runs} times...\n")
+    print(f"{'run':<9}{'first paint s':>15}{'imports s':>11}{'window s':>10}{'in-app paint s':>16}")
+    reports = []
+    for run in range(1, args.runs + 1):
+        report = launch(command, extra_env)
+        reports.append(report)
+        seconds = report['seconds']
+        label = f"{run}{' (cold)' if run == 1 else ''}"
+        print(f"{label:<9}{report['first_paint_s']:>15.3f}{seconds['imported']:>11.3f}{seconds.get('window_built', 0):>10.3f}{seconds['first_paint']:>16.3f}")
+
+    first_paints = sorted(r['first_paint_s'] for r in reports)
+    median = first_paints[len(first_paints) // 2]
+    deferred = sorted({name for r in reports for name in r['deferred_loaded']})
+    print(f"\nMedian time to first paint: {median:.3f} s (cold run {reports[0]['first_paint_s']:.3f} s).")
+
+    if args.import_times and not args.exe:
+        report = launch([sys.executable, '-X', 'importtime', GUI_SCRIPT], extra_env)
+        print("\nSlowest imports before first paint (cumulative ms):")
+        for name, ms in import_times(report['stderr']):
+            print(f"   {name:<32}{ms:>9.1f}")
+
+    if args.history:
+        entry = {
+            'measured_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'target': args.exe or 'GUI.py',
+            'runs': [r['first_paint_s'] for r in reports],
+            'median_first_paint_s': median,
+            'deferred_loaded': deferred,
+        }
+        with open(args.history, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + "\n")
+
+    failed = False
+    if deferred:
+        print(f"\n⚠️ Loaded before the first paint but should wait for Run: {', '.join(deferred)}")
+        failed = True
+    if args.max_first_paint is not None and median > args.max_first_paint:
+        print(f"\n⚠️ Median time to first paint {median:.3f} s is over the {args.max_first_paint} s budget.")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
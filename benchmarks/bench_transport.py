@@ -0,0 +1,164 @@
+"""
+Benchmark of the HTTP transports in transport.py: the default requests transport (HTTP/1.1,
+one connection per busy worker) against the HTTP/2 transport (a few multiplexed connections),
+for the small create/link/delete calls that dominate a run on a project with many small files.
+
+A local HTTPS stand-in server (hypercorn, offering both h2 and http/1.1 over ALPN, with a
+self-signed certificate made by the openssl command line tool) answers those calls after a
+configurable latency. For each transport the same calls are made from a thread pool, and
+reported: wall time, calls per second, the TLS connections the server accepted and the HTTP
+versions it saw.
+
+Needs hypercorn, httpx[http2] and openssl on the PATH. Example:
+    python benchmarks/bench_transport.py --calls 600 --workers 16 --latency-ms 20
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from hypercorn.config import Config
+from hypercorn.asyncio import serve
+from transport import new_session, TRANSPORTS
+
+JSON_HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+
+
+class StandInServer:
+    """ASGI app answering the attachment create/link/delete calls, counting connections and HTTP versions."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.reset()
+
+    def reset(self):
+        self.connections = set()
+        self.versions = {}
+        self.next_id = 1000
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while (await receive())['type'] != 'lifespan.shutdown':
+                await send({'type': 'lifespan.startup.complete'})
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+        self.connections.add(tuple(scope['client']))
+        self.versions[scope['http_version']] = self.versions.get(scope['http_version'], 0) + 1
+        while (await receive()).get('more_body'):
+            pass
+        await asyncio.sleep(self.latency)
+        if scope['method'] == 'POST' and scope['path'].endswith('/attachments') and '/projects/' in scope['path']:
+            self.next_id += 1
+            status, body = 201, {'meta': {'status': 'Created', 'id': self.next_id}}
+        elif scope['method'] == 'POST':
+            status, body = 201, {'meta': {'status': 'Created'}}
+        else:
+            status, body = 204, None
+        payload = json.dumps(body).encode() if body is not None else b''
+        await send({'type': 'http.response.start', 'status': status, 'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': payload})
+
+
+def self_signed_certificate(directory):
+    """Writes a certificate/key pair for 127.0.0.1 and returns their paths."""
+    if shutil.which('openssl') is None:
+        sys.exit("This benchmark needs the openssl command line tool to make a test certificate.")
+    cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+    subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=127.0.0.1',
+                    '-addext', 'subjectAltName=IP:127.0.0.1,DNS:localhost', '-keyout', key, '-out', cert],
+                   check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+
+def start_server(app, port, cert, key):
+    """Runs hypercorn on a background event loop; returns a function that stops it."""
+    config = Config()
+    config.bind = [f"127.0.0.1:{port}"]
+    config.certfile, config.keyfile = cert, key
+    config.alpn_protocols = ['h2', 'http/1.1']
+    config.accesslog = config.errorlog = None
+    config.keep_alive_timeout = 60
+    loop = asyncio.new_event_loop()
+    stop = asyncio.Event()
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        loop.run_until_complete(serve(app, config, shutdown_trigger=stop.wait))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait()
+    time.sleep(0.5)  # Let hypercorn bind the socket
+
+    def shutdown():
+        loop.call_soon_threadsafe(stop.set)
+        thread.join(timeout=10)
+    return shutdown
+
+
+def run_calls(transport, base_url, cert, calls, workers):
+    """Makes `calls` create/link/delete calls (a third each) through a new session; returns the wall time."""
+    session = new_session(transport, workers)
+    session.trust_env = False  # Otherwise REQUESTS_CA_BUNDLE would override the test certificate
+    session.verify = cert
+
+    def one_attachment(i):
+        response = session.post(f"{base_url}/projects/1/attachments", json={'fields': {'name': f"a{i}"}}, headers=JSON_HEADERS)
+        response.raise_for_status()
+        attachment_id = response.json()['meta']['id']
+        session.post(f"{base_url}/items/{i}/attachments", json={'attachment': attachment_id}, headers=JSON_HEADERS).raise_for_status()
+        session.delete(f"{base_url}/items/{i}/attachments/{attachment_id}").raise_for_status()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one_attachment, range(calls // 3)))
+    elapsed = time.perf_counter() - started
+    session.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the HTTP/1.1 and HTTP/2 transports on many small calls.")
+    parser.add_argument('--calls', type=int, default=600, help="Calls per transport (create, link and delete, a third each).")
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--latency-ms', type=float, default=20, help="Server-side delay per call.")
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per transport; the best is reported.")
+    args = parser.parse_args()
+
+    app = StandInServer(args.latency_ms / 1000)
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = self_signed_certificate(directory)
+        stop = start_server(app, args.port, cert, key)
+        base_url = f"https://127.0.0.1:{args.port}/rest/v2"
+        try:
+            print(f"{args.calls} calls, {args.workers} workers, {args.latency_ms:g} ms server latency\n")
+            print(f"{'transport':<11}{'best s':>9}{'calls/s':>10}{'connections':>13}  versions")
+            for transport in TRANSPORTS:
+                best = None
+                for _ in range(args.repeat):
+                    app.reset()
+                    elapsed = run_calls(transport, base_url, cert, args.calls, args.workers)
+                    if best is None or elapsed < best[0]:
+                        best = (elapsed, len(app.connections), dict(app.versions))
+                elapsed, connections, versions = best
+                seen = ', '.join(f"HTTP/{version}: {count}" for version, count in sorted(versions.items()))
+                print(f"{transport:<11}{elapsed:>9.3f}{args.calls / elapsed:>10.1f}{connections:>13}  {seen}")
+        finally:
+            stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+End-to-end benchmark of both update workflows against the local mock Jama server.
+
+For each scale (number of attachments in the mock project) the mock server is started in its
+own process, then update_item_attachments and update_attachments_by_type are run against it.
+Reported per workflow: wall time, attachments completed (linked for the item workflow, uploaded
+for the project workflow, from the progress events) and completed attachments/s, failed steps,
+server requests/s, p50/p95 per stage and the peak traced Python memory of the client. A run that
+completed fewer attachments than it planned, or did not return within --timeout, is flagged as
+unfinished.
+
+--temp-quota-mb runs both workflows with a temp storage quota, which in the item workflow also
+exercises the quota waiting alongside the placeholders created ahead (--create-ahead).
+
+Examples:
+    python benchmarks/bench_workflows.py --scales 1000 10000 100000 --latency-ms 2
+    python benchmarks/bench_workflows.py --scales 200 --per-item 20 --file-size 100000 --temp-quota-mb 2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import tracemalloc
+import contextlib
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import requests
+import progress_events
+from function_item import update_item_attachments
+from function_project import update_attachments_by_type
+from placeholder_pool import DEFAULT_CREATE_AHEAD
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_jama_server.py")
+
+
+@contextlib.contextmanager
+def mock_server(server_args):
+    """Starts mock_jama_server.py in a child process so its memory and CPU don't count against the client."""
+    process = subprocess.Popen([sys.executable, SERVER_SCRIPT, '--port', '0'] + server_args, stdout=subprocess.PIPE, text=True)
+    try:
+        line = process.stdout.readline()
+        url = line.split(" on ")[1].split()[0]
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def server_requests(url):
+    return requests.get(f"{url}/mock/stats").json()['requests']
+
+
+class StageTimings:
+    """progress_events listener collecting per-stage durations, and the planned, completed and failed steps."""
+
+    def __init__(self):
+        self.durations = {}
+        self.planned = {}
+        self.ok = {}
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            if event.status == 'planned':
+                self.planned[event.stage] = self.planned.get(event.stage, 0) + event.count
+            elif event.status == 'ok':
+                self.ok[event.stage] = self.ok.get(event.stage, 0) + 1
+                if event.duration:
+                    self.durations.setdefault(event.stage, []).append(event.duration)
+            elif event.status == 'error':
+                self.failed += 1
+
+    def percentiles(self):
+        summary = {}
+        for stage, values in self.durations.items():
+            values = sorted(values)
+            summary[stage] = {
+                'count': len(values),
+                'p50_ms': round(values[len(values) // 2] * 1000, 2),
+                'p95_ms': round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 2),
+            }
+        return summary
+
+
+def run_workflow(name, url, scale, run, done_stage, timeout=None):
+    """
+    Runs one workflow; an attachment counts as completed on an 'ok' event for `done_stage`. A run
+    still going after `timeout` seconds is left behind (on a daemon thread) and reported as hung.
+    """
+    timings = StageTimings()
+    progress_events.add_listener(timings)
+    before = server_requests(url)
+    tracemalloc.start()
+    started = time.perf_counter()
+    outcome = {}
+
+    def target():
+        outcome['result'] = run()
+
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            thread = threading.Thread(target=target, name=f"bench-{name}", daemon=True)
+            thread.start()
+            thread.join(timeout)
+    finally:
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        progress_events.remove_listener(timings)
+    made = server_requests(url) - before - 1  # Minus the stats request itself
+    done = timings.ok.get(done_stage, 0)
+    planned = timings.planned.get(done_stage, 0)
+    hung = thread.is_alive()
+    return {
+        'workflow': name,
+        'scale': scale,
+        'result': outcome.get('result'),
+        'seconds': round(elapsed, 2),
+        'attachments_done': done,
+        'attachments_planned': planned,
+        'failed_steps': timings.failed,
+        'hung': hung,
+        'finished': done == planned and not timings.failed and not hung,
+        'attachments_per_second': round(done / elapsed, 1) if elapsed else None,
+        'requests': made,
+        'requests_per_second': round(made / elapsed, 1) if elapsed else None,
+        'peak_memory_mb': round(peak / (1024 * 1024), 1),
+        'stages': timings.percentiles(),
+    }
+
+
+def benchmark_scale(scale, args):
+    server_args = ['--attachments', str(scale), '--per-item', str(args.per_item), '--file-size', str(args.file_size),
+                   '--latency-ms', str(args.latency_ms), '--page-size-limit', str(args.page_size_limit),
+                   '--rate-limit-every', str(args.rate_limit_every)]
+    if args.project_file:
+        server_args += ['--project-file', args.project_file]
+    common = dict(basic_oauth='basic', jama_username='bench', jama_password='bench', project_api_id=1, custom_prefix='BENCH_', t_f=True,
+                  max_workers=args.max_workers, temp_quota=args.temp_quota_mb * 1024 * 1024 if args.temp_quota_mb else None)
+    results = []
+    with mock_server(server_args) as url:
+        base = f"{url}/rest/v2/"
+        item_result = run_workflow('item', url, scale, lambda: update_item_attachments(jama_base_url_v2=base, create_ahead=args.create_ahead, **common),
+                                   'link', args.timeout)
+        results.append(item_result)
+        index = item_result['result'] if isinstance(item_result['result'], int) else 1
+        results.append(run_workflow('project', url, scale,
+                                    lambda: update_attachments_by_type(jama_base_url_v2=base, attachment_item_type_id=22, index=index, **common),
+                                    'upload', args.timeout))
+    return results
+
+
+def print_table(results):
+    print(f"{'scale':>8} {'workflow':<9}{'seconds':>9}{'done':>13}{'att/s':>9}{'failed':>8}{'requests':>10}{'req/s':>9}{'peak MB':>9}  stage p50/p95 ms")
+    for r in results:
+        stages = ", ".join(f"{s} {v['p50_ms']:.0f}/{v['p95_ms']:.0f}" for s, v in r['stages'].items() if s != 'list')
+        done = f"{r['attachments_done']}/{r['attachments_planned']}"
+        print(f"{r['scale']:>8} {r['workflow']:<9}{r['seconds']:>9.2f}{done:>13}{r['attachments_per_second']:>9.1f}{r['failed_steps']:>8}"
+              f"{r['requests']:>10}{r['requests_per_second']:>9.1f}{r['peak_memory_mb']:>9.1f}  {stages}")
+        if r['hung']:
+            print(f"{'':>8} ⚠️ {r['workflow']} run hung: still going after {r['seconds']:.0f} s, "
+                  f"{r['attachments_done']} of {r['attachments_planned']} attachments completed.")
+        elif not r['finished']:
+            print(f"{'':>8} ⚠️ {r['workflow']} run did not finish: {r['attachments_done']} of {r['attachments_planned']} attachments completed, "
+                  f"{r['failed_steps']} failed steps.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark both workflows against the local mock Jama server.")
+    parser.add_argument('--scales', type=int, nargs='+', default=[1000, 10000, 100000], help="Attachment counts to benchmark.")
+    parser.add_argument('--per-item', type=int, default=3)
+    parser.add_argument('--file-size', type=int, default=32 * 1024)
+    parser.add_argument('--latency-ms', type=float, default=2.0)
+    parser.add_argument('--page-size-limit', type=int, default=50)
+    parser.add_argument('--rate-limit-every', type=int, default=0, help="Inject a 429 on every Nth request.")
+    parser.add_argument('--max-workers', type=int, default=4)
+    parser.add_argument('--create-ahead', type=int, default=DEFAULT_CREATE_AHEAD, help="Placeholders created ahead in the item workflow.")
+    parser.add_argument('--temp-quota-mb', type=int, help="Run with a temp storage quota.")
+    parser.add_argument('--timeout', type=float, default=3600, help="Seconds after which a workflow run is reported as hung.")
+    parser.add_argument('--project-file', help="Benchmark a synthetic_project.py file instead of uniform projects (use one scale as its label).")
+    parser.add_argument('--json-out', help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    results = []
+    for scale in args.scales:
+        results.extend(benchmark_scale(scale, args))
+        print_table(results[-2:])
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if any(r['hung'] for r in results):
+        sys.stdout.flush()
+        os._exit(1)  # Interpreter shutdown would wait forever for the hung run's pool threads
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
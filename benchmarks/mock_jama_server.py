@@ -0,0 +1,538 @@
+"""
+A self-contained local stand-in for the Jama Connect REST endpoints used by the attachment updater.
+
+Standard library only. It serves:
+    GET    /rest/v2/projects
+    POST   .../rest/oauth/token
+    GET    /rest/v2/items?project=            (paged)
+    GET    /rest/v2/abstractitems?project=&itemType=&lastActivityDate=   (paged)
+    GET    /rest/v2/items/{id}
+    GET    /rest/v2/items/{id}/children       (paged)
+    GET    /rest/v2/items/{id}/attachments
+    GET    /rest/v2/attachments/{id}
+    POST   /rest/v2/projects/{id}/attachments
+    GET    /rest/v2/attachments/{id}/file     (HEAD and Range supported)
+    PUT    /rest/v2/attachments/{id}/file     (multipart)
+    POST   /rest/v2/items/{id}/attachments
+    DELETE /rest/v2/items/{id}/attachments/{attachmentId}
+    DELETE /rest/v2/items/{id}                 (attachment records only, e.g. unused placeholders)
+    PATCH  /rest/v1/items                     (queued: applied after --rename-delay-ms, like Jama's bulk update)
+    GET    /rest/v1/work/{workKey}            (status of a queued PATCH)
+    GET    /mock/stats                        (request counter, for benchmarks)
+
+Latency, the page-size cap, file sizes and 429 injection are configurable. File bytes are
+generated on demand from the attachment ID, so large projects cost almost no memory.
+With --png-content, .png attachments are instead real, uncompressed screenshot-like PNGs
+(for exercising image optimisation).
+
+Run standalone:
+    python benchmarks/mock_jama_server.py --attachments 1000 --latency-ms 5
+"""
+import re
+import sys
+import json
+import time
+import random
+import zlib
+import struct
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+PATTERN_BLOCK = 64 * 1024  # Generated file bytes repeat a per-attachment block of this size
+
+
+def generated_bytes(seed, start, end):
+    """Returns bytes [start, end) of the deterministic file content for `seed`."""
+    block = hashlib.sha256(str(seed).encode()).digest() * (PATTERN_BLOCK // 32)
+    out = bytearray()
+    position = start
+    while position < end:
+        offset = position % PATTERN_BLOCK
+        take = min(PATTERN_BLOCK - offset, end - position)
+        out += block[offset:offset + take]
+        position += take
+    return bytes(out)
+
+
+def screenshot_png(seed, size, width=400):
+    """An uncompressed (stored-deflate) RGB PNG of flat colour bands, roughly `size` bytes, like a raw screenshot."""
+    rng = random.Random(seed)
+    height = max(1, size // (width * 3 + 1))
+    rows = []
+    colour = bytes(rng.randrange(256) for _ in range(3))
+    for y in range(height):
+        if y % 24 == 0:
+            colour = bytes(rng.randrange(256) for _ in range(3))
+        rows.append(b'\x00' + colour * width)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(b''.join(rows), 0)) + chunk(b'IEND', b'')
+
+
+def use_png_content(project):
+    """Replaces the generated bytes of every .png attachment with a real uncompressed PNG of about the same size."""
+    for attachment_id, attachment in project.attachments.items():
+        if (attachment['fields'].get('filename') or attachment['fields']['name']).lower().endswith('.png'):
+            project.uploads[attachment_id] = screenshot_png(attachment['content_seed'], attachment['fileSize'])
+            attachment['fileSize'] = len(project.uploads[attachment_id])
+
+
+def jama_now():
+    """The current UTC time in Jama's date format, e.g. 2024-05-01T22:00:00.123+0000 (sorts as a string)."""
+    now = time.time()
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(now)) + f".{int(now * 1000) % 1000:03d}+0000"
+
+
+def touch(record):
+    """Marks a record as modified now."""
+    record['modifiedDate'] = record['lastActivityDate'] = jama_now()
+
+
+class MockProject:
+    """
+    In-memory project: items, their attachments and the project's attachment items.
+    Attachment records hold metadata only; content comes from generated_bytes() until a file is uploaded.
+    """
+
+    def __init__(self, project_id=1, attachment_type_id=22, item_type_id=33):
+        self.project_id = project_id
+        self.attachment_type_id = attachment_type_id
+        self.item_type_id = item_type_id
+        self.items = {}
+        self.attachments = {}
+        self.uploads = {}  # attachment ID -> uploaded bytes
+        self.next_id = 1
+        self.lock = threading.Lock()
+        self._listing_cache = {}
+        self._children_cache = {}
+
+    def new_id(self, explicit_id=None):
+        with self.lock:
+            if explicit_id is not None:
+                self.next_id = max(self.next_id, explicit_id + 1)
+                return explicit_id
+            new_id = self.next_id
+            self.next_id += 1
+        return new_id
+
+    def add_item(self, name, parent=None, item_type_id=None, item_id=None):
+        item_id = self.new_id(item_id)
+        self.items[item_id] = {
+            'id': item_id,
+            'itemType': item_type_id or self.item_type_id,
+            'project': self.project_id,
+            'fields': {'name': name, 'description': '<p>' + 'Lorem ipsum dolor sit amet. ' * 20 + '</p>'},
+            'location': {'parent': {'item': parent} if parent else {'project': self.project_id}},
+            'attachments': [],
+        }
+        self.items[item_id]['createdDate'] = jama_now()
+        touch(self.items[item_id])
+        return item_id
+
+    def add_attachment(self, name, filename, size, item_id=None, content_seed=None, attachment_id=None):
+        attachment_id = self.new_id(attachment_id)
+        fields = {'name': name, 'description': ''}
+        if filename is not None:
+            fields['filename'] = filename
+        if item_id is not None:
+            fields['parent'] = item_id
+        self.attachments[attachment_id] = {
+            'id': attachment_id,
+            'itemType': self.attachment_type_id,
+            'project': self.project_id,
+            'fileSize': size,
+            'fields': fields,
+            'content_seed': attachment_id if content_seed is None else content_seed,
+        }
+        self.attachments[attachment_id]['createdDate'] = jama_now()
+        touch(self.attachments[attachment_id])
+        if item_id is not None:
+            self.items[item_id]['attachments'].append(attachment_id)
+        return attachment_id
+
+    def remove_attachment(self, attachment_id):
+        """Deletes an attachment record outright, unlinking it from its item."""
+        with self.lock:
+            attachment = self.attachments.pop(attachment_id)
+            self.uploads.pop(attachment_id, None)
+            parent = self.items.get(attachment['fields'].get('parent'))
+            if parent is not None and attachment_id in parent['attachments']:
+                parent['attachments'].remove(attachment_id)
+            self._listing_cache = {}
+
+    def listing(self, item_type=None):
+        """Records for a paged listing, cached until the next record is added so paging stays O(page)."""
+        key = (item_type, self.next_id)
+        records = self._listing_cache.get(key)
+        if records is None:
+            if item_type is None:
+                records = list(self.items.values())
+            else:
+                records = [r for r in list(self.attachments.values()) + list(self.items.values()) if str(r['itemType']) == str(item_type)]
+            self._listing_cache = {key: records}
+        return records
+
+    def children(self, parent_id):
+        """Direct children of an item, from an index rebuilt only when records are added."""
+        key = ('children', self.next_id)
+        index = self._children_cache.get(key)
+        if index is None:
+            index = {}
+            for item in list(self.items.values()):
+                index.setdefault(item['location']['parent'].get('item'), []).append(item)
+            self._children_cache = {key: index}
+        return index.get(parent_id, [])
+
+    def public(self, record):
+        """Strips server-side bookkeeping keys before a record is returned to a client."""
+        return {k: v for k, v in record.items() if k not in ('attachments', 'content_seed')}
+
+    def content(self, attachment_id, start=0, end=None):
+        attachment = self.attachments[attachment_id]
+        if attachment_id in self.uploads:
+            data = self.uploads[attachment_id]
+            return data[start:end]
+        end = attachment['fileSize'] if end is None else end
+        return generated_bytes(attachment['content_seed'], start, end)
+
+
+def build_simple_project(attachments=1000, per_item=3, file_size=32 * 1024, other_fraction=0.2, seed=1):
+    """A uniform project: items holding `per_item` attachments each, mostly named image*.png."""
+    rng = random.Random(seed)
+    project = MockProject()
+    item_id = None
+    for n in range(attachments):
+        if n % per_item == 0:
+            item_id = project.add_item(f"Requirement {n // per_item + 1}")
+        name = f"diagram{n}.pdf" if rng.random() < other_fraction else f"image{n}.png"
+        project.add_attachment(name, name, file_size, item_id)
+    return project
+
+
+class MockJamaHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MockJama/1.0'
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes; avoid 40 ms delayed-ACK stalls
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- helpers ---
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_empty(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        return self.rfile.read(length) if length else b''
+
+    def page(self, records, query):
+        config = self.server.config
+        start = int(query.get('startAt', ['0'])[-1])
+        requested = int(query.get('maxResults', ['20'])[-1])
+        size = max(1, min(requested, config['page_size_limit']))
+        chunk = [self.server.project.public(r) for r in records[start:start + size]]
+        meta = {'status': 'OK', 'pageInfo': {'startIndex': start, 'resultCount': len(chunk), 'totalResults': len(records)}}
+        if start + size < len(records):
+            # The updater re-sends startAt/maxResults itself, so nextLink carries only the filters
+            parts = urlsplit(self.path)
+            filters = '&'.join(f"{k}={v}" for k, values in query.items() if k not in ('startAt', 'maxResults') for v in values)
+            meta['nextLink'] = f"http://{self.headers.get('Host')}{parts.path}" + (f"?{filters}" if filters else "")
+        return {'meta': meta, 'data': chunk}
+
+    def gate(self):
+        """Applies configured latency and 429 injection. Returns False if the request was rejected."""
+        config = self.server.config
+        with self.server.stats_lock:
+            self.server.request_count += 1
+            count = self.server.request_count
+        if config['latency']:
+            time.sleep(config['latency'])
+        every = config['rate_limit_every']
+        if every and count % every == 0:
+            self.read_body()
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return False
+        return True
+
+    # --- routing ---
+    def route(self, method):
+        if not self.gate():
+            return
+        project = self.server.project
+        parts = urlsplit(self.path)
+        path = re.sub(r'/rest/v2/\.\./v1/', '/rest/v1/', parts.path.rstrip('/'))
+        query = parse_qs(parts.query)
+
+        if method == 'GET' and path == '/mock/stats':
+            return self.send_json(200, {'requests': self.server.request_count, 'attachments': len(project.attachments), 'items': len(project.items)})
+        if method == 'POST' and path.endswith('/rest/oauth/token'):
+            self.read_body()
+            return self.send_json(200, {'access_token': 'mock-token', 'token_type': 'bearer', 'expires_in': 3600})
+        if method == 'GET' and path == '/rest/v2/projects':
+            return self.send_json(200, {'meta': {'status': 'OK'}, 'data': [{'id': project.project_id}]})
+        if method == 'GET' and path == '/rest/v2/items':
+            return self.send_json(200, self.page(project.listing(), query))
+        if method == 'GET' and path == '/rest/v2/abstractitems':
+            item_type = query.get('itemType', [None])[-1]
+            records = project.listing(item_type)
+            since = query.get('lastActivityDate', [None])[0]
+            if since:
+                records = [r for r in records if r['lastActivityDate'] >= since]
+            return self.send_json(200, self.page(records, query))
+
+        match = re.fullmatch(r'/rest/v2/items/(\d+)(/children)?', path)
+        if match and method == 'GET':
+            item = project.items.get(int(match.group(1)))
+            if item is None:
+                return self.send_json(404, {'meta': {'status': 'Not Found'}})
+            if match.group(2):
+                return self.send_json(200, self.page(project.children(item['id']), query))
+            return self.send_json(200, {'meta': {'status': 'OK'}, 'data': project.public(item)})
+
+        match = re.fullmatch(r'/rest/v2/items/(\d+)', path)
+        if match and method == 'DELETE':
+            if int(match.group(1)) not in project.attachments:
+                return self.send_json(404, {'meta': {'status': 'Not Found'}})
+            project.remove_attachment(int(match.group(1)))
+            return self.send_empty(204)
+
+        match = re.fullmatch(r'/rest/v2/items/(\d+)/attachments(?:/(\d+))?', path)
+        if match:
+            item = project.items.get(int(match.group(1)))
+            if item is None:
+                return self.send_json(404, {'meta': {'status': 'Not Found'}})
+            if method == 'GET' and not match.group(2):
+                data = [project.public(project.attachments[a]) for a in item['attachments'] if a in project.attachments]
+                return self.send_json(200, {'meta': {'status': 'OK'}, 'data': data})
+            if method == 'POST' and not match.group(2):
+                attachment_id = json.loads(self.read_body() or b'{}').get('attachment')
+                if attachment_id not in project.attachments:
+                    return self.send_json(400, {'meta': {'status': 'Bad Request', 'message': 'Unknown attachment'}})
+                item['attachments'].append(attachment_id)
+                project.attachments[attachment_id]['fields']['parent'] = item['id']
+                touch(item)
+                return self.send_json(201, {'meta': {'status': 'Created'}})
+            if method == 'DELETE' and match.group(2):
+                attachment_id = int(match.group(2))
+                if attachment_id not in item['attachments']:
+                    return self.send_json(404, {'meta': {'status': 'Not Found'}})
+                item['attachments'].remove(attachment_id)
+                touch(item)
+                return self.send_empty(204)
+
+        match = re.fullmatch(r'/rest/v2/projects/(\d+)/attachments', path)
+        if match and method == 'POST':
+            fields = json.loads(self.read_body() or b'{}').get('fields', {})
+            attachment_id = project.add_attachment(fields.get('name'), None, 0)
+            project.uploads[attachment_id] = b''
+            return self.send_json(201, {'meta': {'status': 'Created', 'id': attachment_id, 'location': f"/rest/v2/attachments/{attachment_id}"}})
+
+        match = re.fullmatch(r'/rest/v2/attachments/(\d+)(/file)?', path)
+        if match:
+            attachment_id = int(match.group(1))
+            attachment = project.attachments.get(attachment_id)
+            if attachment is None:
+                self.read_body()
+                return self.send_json(404, {'meta': {'status': 'Not Found'}})
+            if not match.group(2) and method == 'GET':
+                return self.send_json(200, {'meta': {'status': 'OK'}, 'data': project.public(attachment)})
+            if match.group(2) and method in ('GET', 'HEAD'):
+                return self.send_file(attachment_id, attachment, head=(method == 'HEAD'))
+            if match.group(2) and method == 'PUT':
+                content = self.parse_multipart(self.read_body())
+                project.uploads[attachment_id] = content
+                attachment['fileSize'] = len(content)
+                touch(attachment)
+                return self.send_empty(204)
+
+        if method == 'PATCH' and path == '/rest/v1/items':
+            operations = json.loads(self.read_body() or b'[]')
+            work_key = f"mock-work-{time.time_ns()}"
+
+            def apply():
+                for entry in operations:
+                    for attachment_id in entry.get('items', []):
+                        for op in entry.get('operations', []):
+                            if op.get('path') == '/fields/name' and attachment_id in project.attachments:
+                                project.attachments[attachment_id]['fields']['name'] = op.get('value')
+                                touch(project.attachments[attachment_id])
+                self.server.work[work_key] = 'COMPLETED'
+
+            # Like Jama, the PATCH is only queued: names change later, and the work key reports when
+            self.server.work[work_key] = 'IN_PROGRESS'
+            threading.Timer(self.server.config['rename_delay'], apply).start()
+            return self.send_json(202, {'meta': {'status': 'Accepted'}, 'data': {'workKey': work_key}})
+        match = re.fullmatch(r'/rest/v1/work/([^/]+)', path)
+        if method == 'GET' and match:
+            if match.group(1) not in self.server.work:
+                return self.send_json(404, {'meta': {'status': 'Not Found'}})
+            return self.send_json(200, {'meta': {'status': 'OK'}, 'data': {'workKey': match.group(1), 'status': self.server.work[match.group(1)]}})
+
+        self.read_body()
+        return self.send_json(404, {'meta': {'status': 'Not Found', 'message': f"No mock route for {method} {path}"}})
+
+    def send_file(self, attachment_id, attachment, head=False):
+        project = self.server.project
+        total = attachment['fileSize']
+        start, end = 0, total
+        status = 200
+        byte_range = self.headers.get('Range')
+        if byte_range and self.server.config['ranges']:
+            match = re.fullmatch(r'bytes=(\d+)-(\d*)', byte_range.strip())
+            if match:
+                start = int(match.group(1))
+                end = int(match.group(2)) + 1 if match.group(2) else total
+                end = min(end, total)
+                if start >= total:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f"bytes */{total}")
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                status = 206
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end - 1}/{total}")
+        self.end_headers()
+        if head:
+            return
+        chunk = 1024 * 1024
+        for position in range(start, end, chunk):
+            self.wfile.write(project.content(attachment_id, position, min(position + chunk, end)))
+
+    def parse_multipart(self, body):
+        """Extracts the first part's content from a multipart/form-data body."""
+        match = re.search(r'boundary=(.+)', self.headers.get('Content-Type', ''))
+        if not match:
+            return body
+        boundary = b'--' + match.group(1).strip('"').encode()
+        for part in body.split(boundary):
+            head, separator, content = part.partition(b'\r\n\r\n')
+            if separator and b'filename=' in head:
+                return content[:-2] if content.endswith(b'\r\n') else content
+        return b''
+
+    def do_GET(self):
+        self.route('GET')
+
+    def do_HEAD(self):
+        self.route('HEAD')
+
+    def do_POST(self):
+        self.route('POST')
+
+    def do_PUT(self):
+        self.route('PUT')
+
+    def do_PATCH(self):
+        self.route('PATCH')
+
+    def do_DELETE(self):
+        self.route('DELETE')
+
+
+class MockJamaServer:
+    """
+    Runs a MockJamaHandler on a background thread.
+
+    Args:
+        project (MockProject): The data to serve.
+        latency (float): Seconds slept before answering each request.
+        page_size_limit (int): Largest maxResults honoured on paged listings (Jama caps at 50).
+        rate_limit_every (int): Reject every Nth request with 429 (0 disables).
+        ranges (bool): Honour HTTP Range requests on file downloads.
+        rename_delay (float): Seconds before a queued PATCH /v1/items rename is applied.
+    """
+
+    def __init__(self, project, host='127.0.0.1', port=0, latency=0.0, page_size_limit=50, rate_limit_every=0, ranges=True, rename_delay=0.5):
+        self.httpd = ThreadingHTTPServer((host, port), MockJamaHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.project = project
+        self.httpd.config = {
+            'latency': latency,
+            'page_size_limit': page_size_limit,
+            'rate_limit_every': rate_limit_every,
+            'ranges': ranges,
+            'rename_delay': rename_delay,
+        }
+        self.httpd.work = {}  # workKey -> 'IN_PROGRESS' or 'COMPLETED'
+        self.httpd.request_count = 0
+        self.httpd.stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        return self.httpd.request_count
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a mock Jama Connect project on localhost.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--attachments', type=int, default=1000)
+    parser.add_argument('--per-item', type=int, default=3)
+    parser.add_argument('--file-size', type=int, default=32 * 1024)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--page-size-limit', type=int, default=50)
+    parser.add_argument('--rate-limit-every', type=int, default=0)
+    parser.add_argument('--no-ranges', action='store_true')
+    parser.add_argument('--rename-delay-ms', type=float, default=500.0, help="Delay before a queued PATCH rename is applied.")
+    parser.add_argument('--project-file', help="Serve a project written by synthetic_project.py instead of a uniform one.")
+    parser.add_argument('--png-content', action='store_true', help="Serve .png attachments as real uncompressed PNGs.")
+    args = parser.parse_args(argv)
+
+    if args.project_file:
+        from synthetic_project import load_project
+        project = load_project(args.project_file)
+    else:
+        project = build_simple_project(args.attachments, args.per_item, args.file_size)
+    if args.png_content:
+        use_png_content(project)
+    server = MockJamaServer(project, port=args.port, latency=args.latency_ms / 1000, page_size_limit=args.page_size_limit,
+                            rate_limit_every=args.rate_limit_every, ranges=not args.no_ranges,
+                            rename_delay=args.rename_delay_ms / 1000).start()
+    print(f"Mock Jama server listening on {server.url} (project {project.project_id})", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
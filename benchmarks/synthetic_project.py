@@ -0,0 +1,160 @@
+"""
+Seeded generator of large, realistic Jama projects for scale testing against the mock server.
+
+The generated project has a folder/set/component tree, a skewed number of attachments per item
+(most items none, a few very many), a mix of "image*" and other names, names without an
+extension (exercising the '.png' default), attachments with no 'filename' field, duplicate
+payloads and a long tail of very large files.
+
+Only metadata is stored on disk, as gzip-compressed JSON lines. File bytes are generated from
+each attachment's content seed when they are requested, so a 500 GB project costs a few MB.
+
+Example:
+    python benchmarks/synthetic_project.py --seed 7 --items 50000 --out big_project.jsonl.gz
+    python benchmarks/mock_jama_server.py --project-file big_project.jsonl.gz
+"""
+import sys
+import gzip
+import json
+import math
+import random
+import argparse
+
+FORMAT_VERSION = 1
+
+FOLDER_TYPE = 32
+SET_TYPE = 31
+COMPONENT_TYPE = 30
+REQUIREMENT_TYPE = 33
+
+IMAGE_NAME_PATTERNS = [
+    ("image.png", "image.png"),
+    ("Image.png", "Image.png"),
+    ("image ({n}).png", "image ({n}).png"),
+    ("IMAGE_{n}.JPG", "IMAGE_{n}.JPG"),
+    ("image{n}", "image{n}"),  # No extension: the updater falls back to '.png'
+    ("imageFile_{n}.gif", "imageFile_{n}.gif"),
+]
+OTHER_NAME_PATTERNS = [
+    ("spec_{n}.pdf", "spec_{n}.pdf"),
+    ("screenshot_{n}.png", "screenshot_{n}.png"),
+    ("notes_{n}.docx", "notes_{n}.docx"),
+    ("diagram_{n}.vsdx", "diagram_{n}.vsdx"),
+]
+
+
+def generate(seed=1, items=10000, image_fraction=0.6, missing_filename_fraction=0.05, duplicate_fraction=0.1,
+             huge_file_probability=0.0005, median_size=200 * 1024, empty_item_fraction=0.6, max_per_item=250):
+    """
+    Yields the project as records: first a header dict, then one ('item', ...) or ('attachment', ...) record at a time.
+    Nothing is held in memory except the list of content seeds used for duplicates.
+    """
+    rng = random.Random(seed)
+    yield {'format': FORMAT_VERSION, 'seed': seed, 'items': items, 'project': 1, 'attachment_type': 22}
+
+    next_id = 1
+    components = max(1, items // 2000)
+    sets_per_component = 4
+    folders_per_set = max(1, items // (components * sets_per_component * 40))
+
+    folder_ids = []
+    for c in range(components):
+        component_id = next_id
+        next_id += 1
+        yield ['item', component_id, None, COMPONENT_TYPE, f"Component {c + 1}"]
+        for s in range(sets_per_component):
+            set_id = next_id
+            next_id += 1
+            yield ['item', set_id, component_id, SET_TYPE, f"Set {c + 1}.{s + 1}"]
+            for f in range(folders_per_set):
+                folder_id = next_id
+                next_id += 1
+                folder_ids.append(folder_id)
+                yield ['item', folder_id, set_id, FOLDER_TYPE, f"Folder {c + 1}.{s + 1}.{f + 1}"]
+
+    seeds = []
+    sequence = 0
+    for i in range(items):
+        item_id = next_id
+        next_id += 1
+        yield ['item', item_id, rng.choice(folder_ids), REQUIREMENT_TYPE, f"Requirement {i + 1}"]
+
+        if rng.random() < empty_item_fraction:
+            continue
+        # Pareto-distributed count: most items have one or two attachments, a few have hundreds
+        count = min(max_per_item, int(rng.paretovariate(1.3)))
+        for _ in range(count):
+            sequence += 1
+            patterns = IMAGE_NAME_PATTERNS if rng.random() < image_fraction else OTHER_NAME_PATTERNS
+            name_pattern, file_pattern = rng.choice(patterns)
+            name = name_pattern.format(n=sequence)
+            filename = None if rng.random() < missing_filename_fraction else file_pattern.format(n=sequence)
+
+            if seeds and rng.random() < duplicate_fraction:
+                content_seed, size = rng.choice(seeds)
+            else:
+                if rng.random() < huge_file_probability:
+                    size = rng.randint(500 * 1024 ** 2, 4 * 1024 ** 3)
+                else:
+                    size = max(1, min(int(rng.lognormvariate(math.log(median_size), 1.5)), 200 * 1024 ** 2))
+                content_seed = f"{seed}:{sequence}"
+                if len(seeds) < 10000:
+                    seeds.append((content_seed, size))
+            attachment_id = next_id
+            next_id += 1
+            yield ['attachment', attachment_id, item_id, name, filename, size, content_seed]
+
+
+def write(path, records):
+    """Writes generated records to a gzip JSON-lines file and returns (items, attachments, total bytes)."""
+    counts = {'item': 0, 'attachment': 0}
+    total_bytes = 0
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, separators=(',', ':')) + "\n")
+            if isinstance(record, list):
+                counts[record[0]] += 1
+                if record[0] == 'attachment':
+                    total_bytes += record[5]
+    return counts['item'], counts['attachment'], total_bytes
+
+
+def load_project(path):
+    """Builds a mock_jama_server.MockProject from a generated project file."""
+    from mock_jama_server import MockProject
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        project = MockProject(project_id=header['project'], attachment_type_id=header['attachment_type'])
+        for line in f:
+            record = json.loads(line)
+            if record[0] == 'item':
+                _, item_id, parent, item_type, name = record
+                project.add_item(name, parent=parent, item_type_id=item_type, item_id=item_id)
+            else:
+                _, attachment_id, item_id, name, filename, size, content_seed = record
+                project.add_attachment(name, filename, size, item_id, content_seed=content_seed, attachment_id=attachment_id)
+    return project
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Jama project for the mock server.")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--image-fraction', type=float, default=0.6)
+    parser.add_argument('--missing-filename-fraction', type=float, default=0.05)
+    parser.add_argument('--duplicate-fraction', type=float, default=0.1)
+    parser.add_argument('--huge-file-probability', type=float, default=0.0005)
+    parser.add_argument('--median-size', type=int, default=200 * 1024)
+    parser.add_argument('--out', required=True, help="Output file (.jsonl.gz).")
+    args = parser.parse_args(argv)
+
+    records = generate(args.seed, args.items, args.image_fraction, args.missing_filename_fraction,
+                       args.duplicate_fraction, args.huge_file_probability, args.median_size)
+    items, attachments, total_bytes = write(args.out, records)
+    print(f"Wrote {items} items and {attachments} attachments ({total_bytes / 1024 ** 3:.1f} GB of virtual file content) to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
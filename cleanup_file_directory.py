@@ -11,4 +11,4 @@ def cleanup(delete_files_after_run, temp_dir):
         except Exception as e:
             print(f"Failed to clean up temporary directory. Please delete '{temp_dir}' manually. Error: {e}")
     else:
-        print("User chose not to delete temporary files. The 'temp_renamed_attachments' folder remains.")
\ No newline at end of file
+        print(f"User chose not to delete temporary files. The '{temp_dir}' folder remains.")
\ No newline at end of file
@@ -0,0 +1,387 @@
+"""
+Headless command-line entry point for the attachment updater.
+
+Runs the same two update functions as the GUI (item attachments, then project attachments)
+without importing PyQt6 or pandas, so it starts quickly from cron jobs and containers.
+
+Example:
+    python cli.py --url https://example.jamacloud.com --username me --project 95 --prefix PK_ --json
+
+Settings can also be kept in a JSON config file (keys match the long option names, with
+underscores) and passed with --config; options given on the command line take precedence.
+The password or client secret is read from --password, the config file, or the environment
+variable named by --password-env (JAMA_PASSWORD by default).
+
+--tune (or --tune-only) first calibrates page size, concurrency and chunk size against the
+instance and saves them as its tuned profile (see autotune.py); later runs against the same URL
+use that profile for any of those settings not given explicitly.
+
+--window restricts the run to maintenance windows, each with optional budgets, e.g.
+    --window "Mon-Fri 22:00-06:00 rps=20 mbps=10" --window "Sat-Sun 00:00-24:00"
+Outside the windows the run pauses between units of work and resumes when the next one opens.
+
+--location, --item-type and --item-id limit a run to part of a project, e.g. one component's
+subtree; discovery then walks only that part of the tree.
+
+--incremental examines only items and attachments changed since the last successful full run
+of the same project on the same instance (its high-water mark, kept in run_state.json).
+
+--backup (or --backup-dir) archives each original item attachment, from the copy already
+downloaded for the rename, into ZIP/tar volumes with a manifest before it is deleted.
+
+--optimize-images losslessly re-encodes PNG/GIF attachments on a process pool before they are
+re-uploaded (needs Pillow), and with --max-image-dimension also downsamples larger images.
+Files that don't get smaller are uploaded unchanged; the bytes saved are reported.
+
+Downloads go to a temp_renamed_attachments folder under --temp-location (default
+~/AttachmentUpdater). --temp-quota-mb caps its size: downloads wait while it is full, and each
+file is deleted as soon as it has been uploaded (and archived, with --backup).
+
+--verify records every file a run uploads (name, size and SHA-256, under run_records/) and then
+checks each renamed attachment by metadata: it exists, is linked to its item, has the expected
+name and size. A random --verify-sample fraction (default 0.01) is also re-downloaded and
+compared by hash. Jama applies the project workflow's renames asynchronously, so --verify first
+waits (up to 5 minutes) for that work to finish; names still not applied then are reported as
+pending rather than failed. --verify-only RECORD re-checks the record of an earlier run without
+updating anything, e.g. once that rename has finished.
+
+--dry-run does the discovery and filtering of a normal run, then reports per phase how many
+attachments would be processed, their total size from metadata, the HTTP calls the run would
+make and an estimated duration, and stops: nothing is downloaded, uploaded, renamed or deleted.
+The estimate uses the tuned profile's latency and bandwidth when there is one (see --tune).
+
+--engine async runs both workflows on a single asyncio event loop (needs aiohttp) with up to
+--max-in-flight requests outstanding, instead of a thread pool of --max-workers transfers.
+It does not support --window, the scoping options, --backup, --profile or --temp-quota-mb.
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import contextlib
+
+# Machine-readable exit codes
+EXIT_OK = 0
+EXIT_RUN_ERROR = 1
+EXIT_USAGE = 2
+EXIT_AUTH_FAILED = 3
+EXIT_VERIFY_FAILED = 4
+
+DEFAULTS = {
+    'auth': 'basic',
+    'attachment_type': 22,
+    'prefix': '',
+    'delete_downloads': False,
+    'max_workers': None,  # None: tuned profile for the URL, else the built-in default
+    'page_size': None,
+    'chunk_size': None,
+    'password_env': 'JAMA_PASSWORD',
+    'window': None,
+    'location': None,
+    'item_type': None,
+    'item_id': None,
+    'incremental': False,
+    'backup': False,
+    'backup_dir': None,
+    'backup_volume_mb': 2048,
+    'backup_format': 'zip',
+    'optimize_images': False,
+    'max_image_dimension': None,
+    'create_ahead': None,
+    'temp_location': None,
+    'temp_quota_mb': None,
+    'verify': False,
+    'verify_sample': 0.01,
+    'verify_only': None,
+    'dry_run': False,
+    'engine': 'threads',
+    'transport': 'requests',
+    'max_in_flight': None,
+    'skip_items': False,
+    'skip_project': False,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Rename Jama Connect 'image*' attachments with a custom prefix, without the GUI.")
+    parser.add_argument('--config', help="JSON file with default values for any of the options below.")
+    parser.add_argument('--url', help="Jama Connect instance URL, e.g. https://example.jamacloud.com")
+    parser.add_argument('--auth', choices=['basic', 'oauth'], help="Login method (default: basic).")
+    parser.add_argument('--username', help="Username, or client ID for OAuth.")
+    parser.add_argument('--password', help="Password, or client secret for OAuth. Prefer --password-env.")
+    parser.add_argument('--password-env', help="Environment variable holding the password (default: JAMA_PASSWORD).")
+    parser.add_argument('--project', action='append', type=int, help="Project API ID. Repeat to process several projects.")
+    parser.add_argument('--attachment-type', type=int, help="API ID of the Attachment item type (default: 22).")
+    parser.add_argument('--prefix', help="Custom prefix for each new attachment name.")
+    parser.add_argument('--delete-downloads', action='store_true', default=None, help="Delete the temporary downloads after the run.")
+    parser.add_argument('--max-workers', type=int, help="Parallel transfers per workflow (default: tuned profile, else 4).")
+    parser.add_argument('--page-size', type=int, help="maxResults for paged listings (default: tuned profile, else 20).")
+    parser.add_argument('--chunk-size', type=int, help="Download chunk size in bytes (default: tuned profile, else 1 MiB).")
+    parser.add_argument('--tune', action='store_true', default=None, help="Calibrate and save a tuned profile for this URL before running.")
+    parser.add_argument('--tune-only', action='store_true', default=None, help="Calibrate and save a tuned profile, then exit.")
+    parser.add_argument('--tune-upload', action='store_true', default=None,
+                        help="Also measure upload bandwidth while tuning (re-uploads one attachment's own bytes, creating a new file version).")
+    parser.add_argument('--no-tuned-profile', action='store_true', default=None, help="Ignore any saved tuned profile.")
+    parser.add_argument('--trace', help="Append a JSON-lines trace of every HTTP request to this file.")
+    parser.add_argument('--profile', action='store_true', default=None, help="Write a per-phase timing, memory and cProfile report for each workflow.")
+    parser.add_argument('--profile-dir', help="Directory for profile reports (default: the log directory).")
+    parser.add_argument('--window', action='append', help="Allowed maintenance window, e.g. 'Mon-Fri 22:00-06:00 rps=20 mbps=10' (local time). Repeatable.")
+    parser.add_argument('--location', action='append', help="Limit the run to this folder/set/component and everything below it. Repeatable, or comma-separated IDs.")
+    parser.add_argument('--item-type', action='append', help="Limit the run to items of this item type ID. Repeatable, or comma-separated IDs.")
+    parser.add_argument('--item-id', action='append', help="Limit the run to this item. Repeatable, or comma-separated IDs.")
+    parser.add_argument('--incremental', action='store_true', default=None, help="Only examine items and attachments changed since the last successful run.")
+    parser.add_argument('--backup', action='store_true', default=None, help="Back up original item attachments before deleting them (to ~/AttachmentUpdater/backups).")
+    parser.add_argument('--backup-dir', help="Back up original item attachments to this directory before deleting them.")
+    parser.add_argument('--backup-volume-mb', type=int, help="Start a new backup volume at this size (default: 2048).")
+    parser.add_argument('--backup-format', choices=['zip', 'tar'], help="Backup archive format (default: zip).")
+    parser.add_argument('--create-ahead', type=int, help="Placeholder attachments created ahead of the item uploads (default: 8, 0 = create each one inline).")
+    parser.add_argument('--optimize-images', action='store_true', default=None, help="Shrink image attachments before re-uploading them (needs Pillow).")
+    parser.add_argument('--max-image-dimension', type=int, help="With --optimize-images, downsample images larger than this many pixels.")
+    parser.add_argument('--temp-location', help="Directory for the temporary downloads folder, e.g. a tmpfs or scratch volume (default: ~/AttachmentUpdater).")
+    parser.add_argument('--temp-quota-mb', type=int, help="Cap on temporary downloads; downloads wait for uploads to free space (implies deleting each file once uploaded).")
+    parser.add_argument('--verify', action='store_true', default=None, help="Check every renamed attachment after the run (metadata, plus hashes of a sample).")
+    parser.add_argument('--verify-sample', type=float, help="Fraction of renamed attachments re-downloaded for a hash check (default: 0.01).")
+    parser.add_argument('--verify-only', help="Verify the run record file of an earlier run, then exit.")
+    parser.add_argument('--dry-run', action='store_true', default=None, help="Report what a run would process and estimate its duration, without changing anything.")
+    parser.add_argument('--engine', choices=['threads', 'async'], help="Transfer engine (default: threads). 'async' needs aiohttp.")
+    parser.add_argument('--transport', choices=['requests', 'http2'],
+                        help="HTTP transport for --engine threads (default: requests, HTTP/1.1). 'http2' multiplexes the calls over a few connections; needs httpx[http2].")
+    parser.add_argument('--max-in-flight', type=int, help="Requests in flight at once with --engine async (default: 128).")
+    parser.add_argument('--skip-items', action='store_true', default=None, help="Skip the item attachment workflow.")
+    parser.add_argument('--skip-project', action='store_true', default=None, help="Skip the project attachment workflow.")
+    parser.add_argument('--json', action='store_true', help="Send progress output to stderr and print a JSON result to stdout.")
+    return parser
+
+
+def load_settings(args):
+    """Merges defaults, the optional JSON config file and command-line options (highest priority)."""
+    settings = dict(DEFAULTS)
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            settings.update(json.load(f))
+    for key, value in vars(args).items():
+        if value is not None and key not in ('config', 'json'):
+            settings[key] = value
+
+    if settings.get('password') is None:
+        settings['password'] = os.environ.get(settings['password_env'])
+    if isinstance(settings.get('project'), (int, str)):
+        settings['project'] = [settings['project']]
+
+    if settings.get('window'):
+        from maintenance_window import MaintenanceSchedule
+        settings['window'] = MaintenanceSchedule(settings['window'])  # Raises ValueError on a bad window
+
+    from scope import RunScope
+    settings['scope'] = RunScope(_flatten_ids(settings.get('location')), _flatten_ids(settings.get('item_type')),
+                                 _flatten_ids(settings.get('item_id')))  # Raises ValueError on a non-numeric ID
+
+    if settings['engine'] == 'async':
+        unsupported = [option for option, used in (('--window', settings.get('window')), ('--location/--item-type/--item-id', not settings['scope'].whole_project),
+                                                    ('--backup', settings.get('backup') or settings.get('backup_dir')), ('--profile', settings.get('profile')),
+                                                    ('--temp-quota-mb', settings.get('temp_quota_mb')), ('--transport http2', settings.get('transport') == 'http2')) if used]
+        if unsupported:
+            raise ValueError(f"--engine async does not support {', '.join(unsupported)}")
+
+    required = ('url', 'username', 'password') if settings.get('verify_only') else ('url', 'username', 'password', 'project')
+    missing = [key for key in required if not settings.get(key)]
+    if missing:
+        raise ValueError(f"Missing required setting(s): {', '.join(missing)}")
+    return settings
+
+
+def _flatten_ids(values):
+    """['1,2', '3'] or 4 -> '1,2,3' / '4', for options that are both repeatable and comma-separated."""
+    if values is None or isinstance(values, (int, str)):
+        return values
+    return ','.join(str(v) for v in values)
+
+
+def jama_base_url_v2(url):
+    """Builds the REST v2 base URL the update functions expect from an instance URL."""
+    if not url.endswith("/"):
+        return url + "/rest/v2/"
+    return url + "rest/v2/"
+
+
+def run_project(settings, project_api_id):
+    """Runs both workflows for one project and returns (exit code, result dict)."""
+    # Imported here so --help and argument errors never pay for requests
+    from function_item import update_item_attachments
+    from function_project import update_attachments_by_type
+    from autotune import tuned_settings, DEFAULT_PAGE_SIZE
+    from download_engine import DEFAULT_CHUNK_SIZE
+    from scheduler import DEFAULT_MAX_WORKERS
+    from incremental import RunWatermark, format_jama_date
+    from backup_archive import BACKUP_DIR
+    from placeholder_pool import DEFAULT_CREATE_AHEAD
+    from verify_run import RunRecord
+    from dry_run import DryRunEstimate
+
+    result = {'project': project_api_id, 'status': 'ok'}
+    base_url = jama_base_url_v2(settings['url'])
+    if settings.get('no_tuned_profile'):
+        tuned = {'max_workers': DEFAULT_MAX_WORKERS, 'page_size': DEFAULT_PAGE_SIZE, 'chunk_size': DEFAULT_CHUNK_SIZE}
+    else:
+        tuned = tuned_settings(base_url)
+    # Explicit options win over the tuned profile
+    transfer = {key: settings.get(key) or value for key, value in tuned.items()}
+    watermark = RunWatermark(base_url, project_api_id, settings.get('incremental', False))
+    if watermark.since is not None:
+        result['since'] = format_jama_date(watermark.since)
+    dry_run = DryRunEstimate(base_url) if settings.get('dry_run') else None
+    record = RunRecord(project_api_id) if settings.get('verify') and dry_run is None else None
+    common = dict(
+        basic_oauth=settings['auth'],
+        jama_username=settings['username'],
+        jama_password=settings['password'],
+        project_api_id=project_api_id,
+        custom_prefix=settings['prefix'],
+        jama_base_url_v2=base_url,
+        t_f=settings['delete_downloads'],
+        **transfer,
+        trace_path=settings.get('trace'),
+        profile=settings.get('profile', False),
+        profile_dir=settings.get('profile_dir'),
+        schedule=settings.get('window'),
+        scope=settings.get('scope'),
+        since=watermark.since,
+        optimize_images=settings.get('optimize_images', False),
+        max_image_dimension=settings.get('max_image_dimension'),
+        record=record,
+        temp_location=settings.get('temp_location'),
+        temp_quota=settings['temp_quota_mb'] * 1024 * 1024 if settings.get('temp_quota_mb') else None,
+        dry_run=dry_run,
+        transport=settings.get('transport', 'requests'),
+    )
+    if settings['engine'] == 'async':
+        from async_engine import run_item_attachments, run_attachments_by_type, DEFAULT_MAX_IN_FLIGHT
+        for key in ('max_workers', 'profile', 'profile_dir', 'schedule', 'scope', 'temp_quota', 'transport'):
+            del common[key]
+        common['max_in_flight'] = settings.get('max_in_flight') or DEFAULT_MAX_IN_FLIGHT
+    started = time.perf_counter()
+    try:
+        index, work_key = 1, None
+        if not settings['skip_items'] and settings['engine'] == 'async':
+            index = run_item_attachments(**common)
+            if index is None:
+                raise SystemExit(EXIT_AUTH_FAILED)
+            result['item_index'] = index
+        elif not settings['skip_items']:
+            # update_item_attachments exits the interpreter when authentication fails
+            backup_dir = settings.get('backup_dir') or (BACKUP_DIR if settings.get('backup') else None)
+            index = update_item_attachments(backup_dir=backup_dir, backup_volume_size=settings['backup_volume_mb'] * 1024 * 1024,
+                                            backup_format=settings['backup_format'],
+                                            create_ahead=DEFAULT_CREATE_AHEAD if settings['create_ahead'] is None else settings['create_ahead'],
+                                            **common)
+            result['item_index'] = index
+        if not settings['skip_project']:
+            update = run_attachments_by_type if settings['engine'] == 'async' else update_attachments_by_type
+            updated = update(attachment_item_type_id=settings['attachment_type'], index=index, **common)
+            if updated is None:
+                raise SystemExit(EXIT_AUTH_FAILED)
+            result['project_attachments'], work_key = updated
+        code = EXIT_OK
+        if dry_run is not None:
+            result['status'] = 'dry_run'
+            result['estimate'] = dry_run.summary()
+        if record is not None:
+            # Checked before the high-water mark moves, so a failed check keeps these changes in the next incremental run
+            record.close()
+            code, result['verification'] = run_verification(settings, record.entries, record.path, work_key)
+            if code != EXIT_OK:
+                result['status'] = 'verify_failed'
+        # Only a run over everything may advance the incremental high-water mark
+        complete = settings['scope'].whole_project and not settings['skip_items'] and not settings['skip_project'] and dry_run is None
+        result['high_water_mark_saved'] = watermark.finish(complete)
+    except SystemExit:
+        result['status'] = 'auth_failed'
+        code = EXIT_AUTH_FAILED
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+        code = EXIT_RUN_ERROR
+    finally:
+        watermark.finish(False)
+        if record is not None:
+            record.close()
+    result['elapsed_seconds'] = round(time.perf_counter() - started, 3)
+    return code, result
+
+
+def run_verification(settings, entries, record_path, work_key=None):
+    """
+    Verifies the attachments in a run record and returns (exit code, summary dict). With the work key
+    of the project workflow's queued rename, waits for it first; names still not applied by then are
+    reported as pending, not failed, and left to a later --verify-only.
+    """
+    from autotune import authenticated_session
+    from verify_run import verify_run, wait_for_work
+    from scheduler import DEFAULT_MAX_WORKERS
+
+    base_url = jama_base_url_v2(settings['url'])
+    session = authenticated_session(settings['auth'], settings['username'], settings['password'], base_url, settings.get('transport', 'requests'))
+    renamed = wait_for_work(session, base_url, work_key) if work_key else 'completed'
+    summary = verify_run(session, base_url, entries, settings['verify_sample'], settings.get('max_workers') or DEFAULT_MAX_WORKERS,
+                         names_pending=renamed in ('pending', 'unknown'))
+    if work_key:
+        summary['rename'] = renamed
+    summary['record'] = record_path
+    return (EXIT_VERIFY_FAILED if summary['failures'] else EXIT_OK), summary
+
+
+def run_tuning(settings):
+    """Calibrates the instance against the first project and returns (exit code, result dict)."""
+    from autotune import calibrate
+
+    result = {'project': settings['project'][0], 'status': 'tuned'}
+    try:
+        result['profile'] = calibrate(settings['auth'], settings['username'], settings['password'], settings['project'][0],
+                                      jama_base_url_v2(settings['url']), settings['attachment_type'], settings.get('tune_upload', False))
+        return EXIT_OK, result
+    except Exception as e:
+        auth_failed = getattr(getattr(e, 'response', None), 'status_code', None) in (401, 403)
+        result['status'] = 'auth_failed' if auth_failed else 'error'
+        result['error'] = str(e)
+        return (EXIT_AUTH_FAILED if auth_failed else EXIT_RUN_ERROR), result
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        settings = load_settings(args)
+    except (OSError, ValueError) as e:
+        print(f"Configuration error: {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    results = []
+    exit_code = EXIT_OK
+    # With --json, stdout is reserved for the machine-readable result
+    progress = contextlib.redirect_stdout(sys.stderr) if args.json else contextlib.nullcontext()
+    with progress:
+        if settings.get('verify_only'):
+            from verify_run import load_record
+            try:
+                code, result = run_verification(settings, load_record(settings['verify_only']), settings['verify_only'])
+                result = {'status': 'verified' if code == EXIT_OK else 'verify_failed', 'verification': result}
+            except Exception as e:
+                code, result = EXIT_RUN_ERROR, {'status': 'error', 'error': str(e)}
+            results.append(result)
+            exit_code = max(exit_code, code)
+        elif settings.get('tune') or settings.get('tune_only'):
+            code, result = run_tuning(settings)
+            results.append(result)
+            exit_code = max(exit_code, code)
+        for project_api_id in ([] if settings.get('tune_only') or settings.get('verify_only') or exit_code else settings['project']):
+            code, result = run_project(settings, project_api_id)
+            results.append(result)
+            exit_code = max(exit_code, code)
+
+    if args.json:
+        print(json.dumps({'exit_code': exit_code, 'results': results}, indent=2))
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
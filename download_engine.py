@@ -0,0 +1,283 @@
+import os
+import re
+import json
+import time
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from http_metrics import record_retry
+from maintenance_window import consume_bytes
+
+# Large buffers keep the per-chunk Python overhead negligible on multi-GB files
+DEFAULT_CHUNK_SIZE = 1024 * 1024  # 1 MiB per read/write
+RANGE_SPLIT_THRESHOLD = 64 * 1024 * 1024  # Files at least this big are fetched as parallel ranges
+RANGE_PARTS = 4  # Number of concurrent ranges for a split download
+MAX_RETRIES = 5  # Reconnect attempts per stream before giving up
+STATE_SAVE_INTERVAL = 16  # Persist split-download progress every N chunks
+
+_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+# Errors that mean the connection dropped mid-transfer and a resume is worth trying
+_RESUMABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
+)
+
+
+class SourceChanged(Exception):
+    """The server's file no longer matches the partial download being resumed."""
+
+
+def total_from_content_range(response):
+    """Return the full file size advertised by a 206 response, or None."""
+    match = _CONTENT_RANGE.match(response.headers.get('Content-Range', ''))
+    if match and match.group(3) != '*':
+        return int(match.group(3))
+    return None
+
+
+def resume_state(part_path, url):
+    """
+    The saved state of a partial download of `url` ({'url', 'total'} plus 'ranges' for a split
+    download), or None. Partial data that can't be shown to come from `url` (no state, or a file
+    left by a run that numbered the files differently) is deleted, never resumed.
+    """
+    state = None
+    try:
+        with open(part_path + ".json", 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (ValueError, OSError):
+        pass
+    if isinstance(state, dict) and state.get('url') == url:
+        return state
+    discard_partial(part_path)
+    return None
+
+
+def save_resume_state(part_path, state):
+    with open(part_path + ".json", 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+
+def discard_partial(part_path):
+    """Deletes a partial download and its state."""
+    for path in (part_path, part_path + ".json"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _finish(part_path, file_path):
+    os.replace(part_path, file_path)
+    discard_partial(part_path)  # Only the state is left by now
+
+
+def _open_range(session, url, start, end=None):
+    """Issue a ranged GET starting at byte `start` (inclusive) up to `end` (inclusive)."""
+    byte_range = f"bytes={start}-" if end is None else f"bytes={start}-{end}"
+    response = session.get(url, headers={"Range": byte_range}, stream=True)
+    if response.status_code == 416:
+        return response
+    response.raise_for_status()
+    return response
+
+
+def _stream_to_file(response, f, chunk_size, on_chunk=None):
+    """Copy a streamed response body into an open file, returning bytes written."""
+    written = 0
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if chunk:
+            f.write(chunk)
+            written += len(chunk)
+            if on_chunk:
+                on_chunk(len(chunk))
+    return written
+
+
+def _single_stream(session, url, part_path, chunk_size, max_retries, first_response=None, total=None):
+    """
+    Download into `part_path` over one connection, resuming from the bytes already on
+    disk whenever the server honours Range requests. A resume whose file size is not `total`
+    (when known) starts over: the bytes on disk belong to another version of the file.
+    """
+    attempt = 0
+    response = first_response
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        try:
+            if response is None:
+                response = _open_range(session, url, offset) if offset else session.get(url, stream=True)
+                if response.status_code == 416 and (total is None or offset == total):
+                    # Nothing left to fetch: the partial file already holds every byte
+                    response.close()
+                    return offset
+                if offset and total is not None and (response.status_code == 416 or total_from_content_range(response) not in (None, total)):
+                    response.close()
+                    response = None
+                    os.remove(part_path)
+                    continue
+                response.raise_for_status()
+
+            if response.status_code == 206:
+                mode = 'ab'
+            else:
+                # Server ignored the Range header, so the partial file is useless
+                mode = 'wb'
+                offset = 0
+
+            with open(part_path, mode) as f:
+                _stream_to_file(response, f, chunk_size, on_chunk=lambda n: consume_bytes(session, n))
+            response.close()
+
+            expected = response.headers.get('Content-Length')
+            size = os.path.getsize(part_path)
+            if expected is not None and response.status_code == 206 and size < offset + int(expected):
+                raise requests.exceptions.ChunkedEncodingError("Connection closed before the range completed.")
+            return size
+        except _RESUMABLE_ERRORS as e:
+            if response is not None:
+                response.close()
+            response = None
+            attempt += 1
+            if attempt > max_retries:
+                raise
+            record_retry(session, 'GET', url)
+            print(f"      - Download interrupted ({e}). Resuming (attempt {attempt}/{max_retries})...")
+            time.sleep(min(2 ** attempt, 30))
+
+
+def _load_ranges(state, total, parts):
+    """The saved per-range progress of a split download, or fresh ranges."""
+    if state and state.get('total') == total and state.get('ranges'):
+        return state['ranges']
+    span = -(-total // parts)  # Ceiling division so the last range picks up the remainder
+    return [
+        {'start': start, 'end': min(start + span, total) - 1, 'done': 0}
+        for start in range(0, total, span)
+    ]
+
+
+def _split_download(session, url, part_path, total, chunk_size, parts, max_retries, state=None):
+    """
+    Fetch `total` bytes as concurrent ranges written straight into their file offsets, resuming
+    the ranges in `state`. Raises SourceChanged if the server's file is no longer `total` bytes.
+    """
+    ranges = _load_ranges(state, total, parts)
+    lock = threading.Lock()
+
+    # Pre-size the file so every range can seek to its own offset
+    mode = 'r+b' if os.path.exists(part_path) else 'wb'
+    with open(part_path, mode) as f:
+        f.truncate(total)
+
+    def save_state():
+        with lock:
+            save_resume_state(part_path, {'url': url, 'total': total, 'ranges': ranges})
+
+    save_state()
+
+    def fetch(byte_range):
+        attempt = 0
+        chunks_since_save = 0
+        while byte_range['start'] + byte_range['done'] <= byte_range['end']:
+            response = None
+            try:
+                position = byte_range['start'] + byte_range['done']
+                response = _open_range(session, url, position, byte_range['end'])
+                if response.status_code == 416 or total_from_content_range(response) not in (None, total):
+                    response.close()
+                    raise SourceChanged(f"The file on the server is no longer {total} bytes.")
+                if response.status_code != 206:
+                    response.close()
+                    raise requests.exceptions.HTTPError(f"Server stopped honouring Range requests (status {response.status_code}).", response=response)
+                with open(part_path, 'r+b') as f:
+                    f.seek(position)
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            f.write(chunk)
+                            byte_range['done'] += len(chunk)
+                            consume_bytes(session, len(chunk))
+                            chunks_since_save += 1
+                            if chunks_since_save >= STATE_SAVE_INTERVAL:
+                                save_state()
+                                chunks_since_save = 0
+                response.close()
+            except _RESUMABLE_ERRORS:
+                if response is not None:
+                    response.close()  # Otherwise the dropped connection stays checked out of the pool
+                attempt += 1
+                if attempt > max_retries:
+                    save_state()
+                    raise
+                record_retry(session, 'GET', url)
+                time.sleep(min(2 ** attempt, 30))
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            for future in [pool.submit(fetch, r) for r in ranges]:
+                future.result()
+    except Exception:
+        save_state()
+        raise
+    return total
+
+
+def download_file(session, url, file_path, chunk_size=DEFAULT_CHUNK_SIZE, parts=RANGE_PARTS, split_threshold=RANGE_SPLIT_THRESHOLD, max_retries=MAX_RETRIES):
+    """
+    Downloads `url` to `file_path` using HTTP Range requests whenever the server supports them.
+
+    Partial data is kept in `<file_path>.part` so an interrupted transfer (including one from a
+    previous run) resumes where it stopped instead of starting over; its `.part.json` state
+    records the source URL and size, and a partial file of another URL or size is discarded
+    (names are reused: a later run may number the same file name for another attachment). Files at or above
+    `split_threshold` bytes are fetched as `parts` concurrent ranges. Servers that ignore Range
+    requests fall back to a single plain stream.
+
+    Args:
+        session (requests.Session): An authenticated session.
+        url (str): The file download URL.
+        file_path (str): Destination path for the completed file.
+        chunk_size (int): I/O buffer size in bytes.
+        parts (int): Number of concurrent ranges for very large files.
+        split_threshold (int): Minimum size in bytes before a file is split into ranges.
+        max_retries (int): Reconnect attempts per stream before the error is raised.
+
+    Returns:
+        int: The number of bytes in the completed file.
+    """
+    part_path = file_path + ".part"
+    state = resume_state(part_path, url)
+
+    if state and state.get('ranges') and state.get('total'):
+        # A split download was interrupted; pick it up range by range
+        try:
+            size = _split_download(session, url, part_path, state['total'], chunk_size, parts, max_retries, state)
+            _finish(part_path, file_path)
+            return size
+        except SourceChanged:
+            discard_partial(part_path)
+    elif state and os.path.exists(part_path) and os.path.getsize(part_path) > 0:
+        size = _single_stream(session, url, part_path, chunk_size, max_retries, total=state.get('total'))
+        _finish(part_path, file_path)
+        return size
+
+    # Fresh download: ask for the whole file as a range to learn whether ranges are supported
+    response = _open_range(session, url, 0)
+    if response.status_code == 416:
+        # Zero-length file
+        response.close()
+        open(file_path, 'wb').close()
+        return 0
+
+    total = total_from_content_range(response) if response.status_code == 206 else None
+    if total is not None and parts > 1 and total >= split_threshold:
+        response.close()
+        size = _split_download(session, url, part_path, total, chunk_size, parts, max_retries)
+    else:
+        save_resume_state(part_path, {'url': url, 'total': total})
+        size = _single_stream(session, url, part_path, chunk_size, max_retries, first_response=response, total=total)
+
+    _finish(part_path, file_path)
+    return size
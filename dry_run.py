@@ -0,0 +1,145 @@
+from autotune import load_profile
+
+MB = 1024 * 1024
+TRANSFER_DIRECTIONS = {'download': 'down', 'upload': 'up'}
+
+
+def _measured_latency(metrics):
+    """Median latency in seconds of the run's most frequent request so far (its discovery calls), or None."""
+    endpoints = [e for e in metrics.endpoints.values() if e['histogram'].count]
+    if not endpoints:
+        return None
+    busiest = max(endpoints, key=lambda e: e['histogram'].count)
+    return busiest['histogram'].percentile(0.50)
+
+
+def _calls_so_far(metrics):
+    return sum(e['histogram'].count for e in metrics.endpoints.values())
+
+
+class DryRunEstimate:
+    """
+    Collects the plan of a dry run. The workflows do their normal discovery and filtering, then
+    hand their per-phase counts to plan() and return before anything is downloaded or written.
+
+    Each phase is estimated as its calls at the request rate measured for max_workers concurrent
+    requests, plus its bytes at the measured single-stream bandwidth. Transfers are given as a
+    range: from scaling with concurrency like the requests did, down to a link one stream
+    already saturates. Rates come from the instance's tuned profile (see autotune.py); without
+    one the latency of the discovery requests just made is used and transfer time is unknown.
+    """
+
+    def __init__(self, jama_base_url_v2):
+        self.profile = load_profile(jama_base_url_v2) or {}
+        self.workflows = {}
+
+    def plan(self, workflow, attachments, stages, metrics, max_workers, probes_sizes=True):
+        """
+        Records and prints one workflow's plan for the prepared `attachments`. stages lists the run's
+        phases in order as (name, calls); 'download' and 'upload' move every attachment's bytes.
+        probes_sizes says whether the run HEADs attachments without size metadata (the threaded
+        workflows do, to schedule largest-first).
+        """
+        unknown = sum(1 for a in attachments if a.get('size') is None)
+        total_bytes = sum(a['size'] or 0 for a in attachments)
+        phases = []
+        if unknown and probes_sizes:
+            # The real run probes these with a HEAD request before scheduling
+            phases.append({'phase': 'size probe', 'count': unknown, 'bytes': 0, 'calls': unknown})
+        for name, calls in stages:
+            direction = TRANSFER_DIRECTIONS.get(name)
+            phases.append({'phase': name, 'count': len(attachments), 'bytes': total_bytes if direction else 0, 'calls': calls, 'direction': direction})
+
+        latency = self.profile['latency_ms'] / 1000 if self.profile.get('latency_ms') else _measured_latency(metrics)
+        bandwidth = {'down': self.profile.get('download_mbps'), 'up': self.profile.get('upload_mbps') or self.profile.get('download_mbps')}
+        workers = max(1, max_workers)
+        request_rate, speedup = self._concurrency(workers, latency)
+
+        transfer_known = True
+        for phase in phases:
+            seconds = phase['calls'] / request_rate if request_rate else 0.0
+            slowest = seconds
+            direction = phase.get('direction')
+            if direction and phase['bytes']:
+                if bandwidth[direction]:
+                    single_stream = phase['bytes'] / (bandwidth[direction] * MB)
+                    seconds += single_stream / speedup
+                    slowest += single_stream
+                else:
+                    transfer_known = False
+            phase['seconds'] = round(seconds, 1)
+            phase['max_seconds'] = round(slowest, 1)
+        total_seconds = sum(p['seconds'] for p in phases)
+        total_max_seconds = sum(p['max_seconds'] for p in phases)
+
+        estimate = {
+            'discovery_calls': _calls_so_far(metrics),
+            'phases': phases,
+            'calls': sum(p['calls'] for p in phases),
+            'attachments': len(attachments),
+            'bytes': total_bytes,
+            'unknown_sizes': unknown,
+            'latency_ms': round(latency * 1000, 1) if latency is not None else None,
+            'download_mbps': bandwidth['down'],
+            'upload_mbps': bandwidth['up'],
+            'max_workers': workers,
+            'estimated_seconds': round(total_seconds, 1),
+            'estimated_max_seconds': round(total_max_seconds, 1),
+            'transfer_time_included': transfer_known,
+        }
+        self.workflows[workflow] = estimate
+
+        print(f"\n🔎 Dry run: {workflow} attachment plan (nothing was downloaded or changed)")
+        print(f"   {'phase':<12}{'count':>9}{'MB':>11}{'HTTP calls':>12}   est. time")
+        for phase in phases:
+            print(f"   {phase['phase']:<12}{phase['count']:>9}{phase['bytes'] / MB:>11.1f}{phase['calls']:>12}   {_duration_range(phase['seconds'], phase['max_seconds'])}")
+        if unknown:
+            print(f"   {unknown} attachment(s) have no size metadata, so their bytes are not included above.")
+        print(f"   Discovery took {estimate['discovery_calls']} HTTP calls; the run itself would make about {estimate['calls']} more.")
+        source = "tuned profile" if self.profile.get('latency_ms') else "discovery requests"
+        print(f"   Estimated duration: {_duration_range(total_seconds, total_max_seconds)} at a concurrency of {workers} "
+              f"(latency {estimate['latency_ms']} ms from the {source}).")
+        if not transfer_known:
+            print("   Transfer time is not included: no bandwidth has been measured for this instance. Calibrate first (--tune) to include it.")
+        return estimate
+
+    def _concurrency(self, workers, latency):
+        """
+        (requests per second at `workers`, how many times faster than one stream that is). Uses the
+        profile's request rate at the highest measured concurrency not above `workers`; without one,
+        assumes every worker keeps a request in flight.
+        """
+        rates = {int(c): rate for c, rate in (self.profile.get('requests_per_second') or {}).items() if rate}
+        measured = [c for c in rates if c <= workers]
+        if measured and 1 in rates:
+            concurrency = max(measured)
+            return rates[concurrency], max(1.0, rates[concurrency] / rates[1])
+        if latency:
+            return workers / latency, float(workers)
+        return None, float(workers)
+
+    def summary(self):
+        """Both workflows' estimates plus their combined totals."""
+        return {
+            'workflows': self.workflows,
+            'calls': sum(w['discovery_calls'] + w['calls'] for w in self.workflows.values()),
+            'estimated_seconds': round(sum(w['estimated_seconds'] for w in self.workflows.values()), 1),
+            'estimated_max_seconds': round(sum(w['estimated_max_seconds'] for w in self.workflows.values()), 1),
+        }
+
+
+def _duration_range(low, high):
+    if _duration(low) == _duration(high):
+        return _duration(low)
+    return f"{_duration(low)} to {_duration(high)}"
+
+
+def _duration(seconds):
+    if seconds < 10:
+        return f"{seconds:.1f} s"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min {seconds % 60:02d} s"
+    return f"{seconds // 3600} h {seconds % 3600 // 60:02d} min"
@@ -1,259 +1,412 @@
 import requests
 from requests.auth import HTTPBasicAuth
-import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
 from cleanup_file_directory import cleanup
+from download_engine import DEFAULT_CHUNK_SIZE, download_file
+from scheduler import DEFAULT_MAX_WORKERS, metadata_size, fill_sizes, largest_first, run_largest_first
+from item_groups import group_by_item, print_grouping_report
+from progress_events import emit, emit_plan, track
+from http_metrics import instrument_session
+from run_profiler import RunProfiler
+from autotune import DEFAULT_PAGE_SIZE
+from maintenance_window import WindowGate
+from scope import discover_items
+from incremental import format_jama_date, changed_since
+from backup_archive import BackupArchive, DEFAULT_VOLUME_BYTES
+from image_optimizer import ImageOptimizer
+from placeholder_pool import PlaceholderPool, create_placeholder, DEFAULT_CREATE_AHEAD
+from temp_storage import TempStorage
+from listing_decoder import get_listing
+from transport import new_session, DEFAULT_TRANSPORT
+from rename_index import RenameIndex
 
-def update_item_attachments(basic_oauth, jama_username, jama_password, project_api_id, custom_prefix, jama_base_url_v2, t_f):
-    # --- 2. Authenticate based on the basic_oauth parameter ---
-    print(f"\nAttempting to authenticate with Jama Connect using {basic_oauth.upper()}...")
-    session = requests.Session()
+def update_item_attachments(basic_oauth, jama_username, jama_password, project_api_id, custom_prefix, jama_base_url_v2, t_f, max_workers=DEFAULT_MAX_WORKERS, trace_path=None, profile=False, profile_dir=None, page_size=DEFAULT_PAGE_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, schedule=None, scope=None, since=None, backup_dir=None, backup_volume_size=DEFAULT_VOLUME_BYTES, backup_format='zip', optimize_images=False, max_image_dimension=None, create_ahead=DEFAULT_CREATE_AHEAD, record=None, temp_location=None, temp_quota=None, dry_run=None, transport=DEFAULT_TRANSPORT):
+    profiler = RunProfiler(profile, "item_attachments", profile_dir).start()
+    try:
+        profiler.mark('auth')
+        gate = WindowGate(schedule)  # Pauses between units of work outside the allowed maintenance windows
+        gate.checkpoint()
+
+        # --- 2. Authenticate based on the basic_oauth parameter ---
+        print(f"\nAttempting to authenticate with Jama Connect using {basic_oauth.upper()}...")
+        session = new_session(transport, max_workers)  # requests over HTTP/1.1, or multiplexed HTTP/2 (see transport.py)
+        metrics = instrument_session(session, trace_path)  # Times every request; optional JSON-lines trace
+        gate.install(session)
     
-    if basic_oauth == 'basic':
-        auth = HTTPBasicAuth(jama_username, jama_password)
-        session.auth = auth
-    elif basic_oauth == 'oauth':
-        # OAuth 2.0 Client Credentials Flow
-        client_id = jama_username
-        client_secret = jama_password
-        token_url = f"{jama_base_url_v2.rstrip('/')}/rest/oauth/token"
+        if basic_oauth == 'basic':
+            auth = HTTPBasicAuth(jama_username, jama_password)
+            session.auth = auth
+        elif basic_oauth == 'oauth':
+            # OAuth 2.0 Client Credentials Flow
+            client_id = jama_username
+            client_secret = jama_password
+            token_url = f"{jama_base_url_v2.rstrip('/')}/rest/oauth/token"
         
+            try:
+                # Get the access token
+                token_data = {
+                    'grant_type': 'client_credentials',
+                    'client_id': client_id,
+                    'client_secret': client_secret
+                }
+                response = requests.post(token_url, data=token_data)
+                response.raise_for_status()
+                token = response.json().get('access_token')
+            
+                # Use the token for subsequent requests
+                session.headers.update({"Authorization": f"Bearer {token}"})
+                print("OAuth 2.0 authentication successful! 🎉")
+            except requests.exceptions.HTTPError as e:
+                print(f"OAuth 2.0 authentication failed. Please check your client ID and secret.")
+                print(f"Error: {e}")
+                exit()
+            except Exception as e:
+                print(f"An unexpected error occurred during OAuth authentication: {e}")
+                exit()
+        else:
+            print("Invalid 'basic_oauth' value. Please use 'basic' or 'oauth'.")
+            exit()
+
+        json_headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+
+        multipart_headers = {
+            "Accept": "application/json",
+        }
+
+        test_url = f"{jama_base_url_v2.rstrip('/')}/projects"
         try:
-            # Get the access token
-            token_data = {
-                'grant_type': 'client_credentials',
-                'client_id': client_id,
-                'client_secret': client_secret
-            }
-            response = requests.post(token_url, data=token_data)
+            response = session.get(test_url, headers=json_headers)
             response.raise_for_status()
-            token = response.json().get('access_token')
-            
-            # Use the token for subsequent requests
-            session.headers.update({"Authorization": f"Bearer {token}"})
-            print("OAuth 2.0 authentication successful! 🎉")
+            print("Authentication successful! 🎉")
         except requests.exceptions.HTTPError as e:
-            print(f"OAuth 2.0 authentication failed. Please check your client ID and secret.")
+            print(f"Authentication failed. Please check your credentials.")
             print(f"Error: {e}")
             exit()
         except Exception as e:
-            print(f"An unexpected error occurred during OAuth authentication: {e}")
+            print(f"An unexpected error occurred: {e}")
             exit()
-    else:
-        print("Invalid 'basic_oauth' value. Please use 'basic' or 'oauth'.")
-        exit()
 
-    json_headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
+        print("\nAuthentication complete. Ready to fetch attachments.")
 
-    multipart_headers = {
-        "Accept": "application/json",
-    }
+        # -------------------------------------------------------------------------------------------
+        ## 3. Find all items with attachments and prepare the list
+        profiler.mark('listing')
+        print("Fetching all items for the specified project...")
+        all_attachments = []
+        all_items = []
+        items_url = f"{jama_base_url_v2.rstrip('/')}/items?project={project_api_id}"
+        page = 1
 
-    test_url = f"{jama_base_url_v2.rstrip('/')}/projects"
-    try:
-        response = session.get(test_url, headers=json_headers)
-        response.raise_for_status()
-        print("Authentication successful! 🎉")
-    except requests.exceptions.HTTPError as e:
-        print(f"Authentication failed. Please check your credentials.")
-        print(f"Error: {e}")
-        exit()
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        exit()
-
-    print("\nAuthentication complete. Ready to fetch attachments.")
-
-    # -------------------------------------------------------------------------------------------
-    ## 3. Find all items with attachments and prepare the list
-    print("Fetching all items for the specified project...")
-    all_attachments = []
-    all_items = []
-    items_url = f"{jama_base_url_v2.rstrip('/')}/items?project={project_api_id}"
-    page = 1
-
-    while items_url:
-        params = {"startAt": (page - 1) * 20, "maxResults": 20}
-        response = session.get(items_url, headers=json_headers, params=params)
-        response.raise_for_status()
-        data = response.json()
-        all_items.extend(data['data'])
-        if 'nextLink' in data['meta']:
-            items_url = data['meta']['nextLink']
-            page += 1
-        else:
+        if since is not None:
+            # Incremental run: only items active since the last successful run, filtered server-side
+            print(f"Incremental run: only items changed since {format_jama_date(since)}.")
+            items_url = f"{jama_base_url_v2.rstrip('/')}/abstractitems?project={project_api_id}&lastActivityDate={quote(format_jama_date(since))}"
+
+        if scope is not None and not scope.whole_project:
+            # Walk only the selected subtrees/items instead of listing the whole project
+            print(f"Limiting the run to {scope.describe()}...")
+            all_items = discover_items(session, jama_base_url_v2, project_api_id, scope, page_size, json_headers, gate.checkpoint)
             items_url = None
 
-    print(f"Successfully fetched {len(all_items)} items from the project.")
+        while items_url:
+            gate.checkpoint()
+            params = {"startAt": (page - 1) * page_size, "maxResults": page_size}
+            data = get_listing(session, items_url, json_headers, params)  # Keeps only the fields used below
+            all_items.extend(data['data'])
+            if 'nextLink' in data['meta']:
+                items_url = data['meta']['nextLink']
+                page += 1
+            else:
+                items_url = None
 
-    for item in all_items:
-        item_id = item['id']
-        attachments_url = f"{jama_base_url_v2.rstrip('/')}/items/{item_id}/attachments"
-        try:
-            response = session.get(attachments_url, headers=json_headers)
-            response.raise_for_status()
-            item_attachments = response.json().get('data', [])
-            for att in item_attachments:
-                att['parent_item_id'] = item_id
-            all_attachments.extend(item_attachments)
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code != 404:
-                print(f"Failed to fetch attachments for item ID {item_id}. Error: {e}")
-        except Exception as e:
-            print(f"An unexpected error occurred while fetching attachments for item ID {item_id}: {e}")
+        # Also checked client-side, in case the server ignores the date filter or the run is scoped
+        all_items = [item for item in all_items if changed_since(item, since)]
+        print(f"Successfully fetched {len(all_items)} items from the project.")
+
+        emit_plan('list', len(all_items))
+        for item in all_items:
+            gate.checkpoint()
+            item_id = item['id']
+            attachments_url = f"{jama_base_url_v2.rstrip('/')}/items/{item_id}/attachments"
+            started = time.perf_counter()
+            try:
+                item_attachments = get_listing(session, attachments_url, json_headers).get('data', [])
+                for att in item_attachments:
+                    att['parent_item_id'] = item_id
+                all_attachments.extend(item_attachments)
+                emit('list', 'ok', item_id=item_id, name=f"{len(item_attachments)} attachments", duration=time.perf_counter() - started)
+            except requests.exceptions.HTTPError as e:
+                if e.response.status_code != 404:
+                    print(f"Failed to fetch attachments for item ID {item_id}. Error: {e}")
+                    emit('list', 'error', item_id=item_id, message=str(e))
+                else:
+                    emit('list', 'skipped', item_id=item_id, name="no attachments")
+            except Exception as e:
+                print(f"An unexpected error occurred while fetching attachments for item ID {item_id}: {e}")
+                emit('list', 'error', item_id=item_id, message=str(e))
 
-    print(f"Successfully retrieved a total of {len(all_attachments)} attachments.")
+        print(f"Successfully retrieved a total of {len(all_attachments)} attachments.")
 
-    # -------------------------------------------------------------------------------------------
-    ## 4. Filter and Update Attachments
-    print("\nFiltering attachments that start with 'image' or 'Image'...")
-    attachments_to_update = []
-    enumeration = 1
+        # -------------------------------------------------------------------------------------------
+        ## 4. Filter and Update Attachments
+        profiler.mark('filtering')
+        print("\nFiltering attachments that start with 'image' or 'Image'...")
+        attachments_to_update = []
+        # Attachments earlier runs already renamed are skipped, and numbering continues after theirs
+        renames = RenameIndex(jama_base_url_v2, project_api_id, custom_prefix).scan(all_attachments)
+        enumeration = renames.next_suffix()
 
-    for attachment in all_attachments:
-        attachment_name = attachment['fields'].get('name')
-        if attachment_name and attachment_name.lower().startswith('image'):
-            file_name = attachment['fields'].get('filename')
+        for attachment in all_attachments:
+            attachment_name = attachment['fields'].get('name')
+            if attachment['id'] in renames:
+                continue
+            if attachment_name and attachment_name.lower().startswith('image'):
+                file_name = attachment['fields'].get('filename')
             
-            if file_name:
-                base_name, file_extension = os.path.splitext(file_name)
+                if file_name:
+                    base_name, file_extension = os.path.splitext(file_name)
+                else:
+                    base_name, file_extension = os.path.splitext(attachment_name)
+                    print(f"Warning: Attachment ID {attachment['id']} has no filename. Using attachment name for new file name.")
                 if not file_extension:
                     file_extension = ".png"
-                new_name_with_ext = f"{custom_prefix}{base_name}_{enumeration:05d}{file_extension}"
-            else:
-                base_name, file_extension = os.path.splitext(attachment_name)
-                if not file_extension:
-                    file_extension = ".png"
-                new_name_with_ext = f"{custom_prefix}{base_name}_{enumeration:05d}{file_extension}"
-                print(f"Warning: Attachment ID {attachment['id']} has no filename. Using attachment name for new file name.")
+
+                # A copy an interrupted run linked (per its run record): only the original's delete is left to do
+                copy_name = renames.copy_of(attachment)
+                if copy_name:
+                    new_name_with_ext = copy_name
+                else:
+                    new_name_with_ext = f"{custom_prefix}{base_name}_{enumeration:05d}{file_extension}"
+                    enumeration += 1
             
-            attachments_to_update.append({
-                'item_id': attachment['parent_item_id'],
-                'original_attachment_id': attachment['id'],
-                'original_name': attachment_name,
-                'original_file_name': file_name,
-                'download_url': f"{jama_base_url_v2.rstrip('/')}/attachments/{attachment['id']}/file",
-                'new_name': new_name_with_ext
-            })
-            enumeration += 1
-
-    print(f"Found {len(attachments_to_update)} attachments to update.")
-    if not attachments_to_update:
-        print("No attachments found that meet the criteria. Exiting.")
-        exit()
-
-    # -------------------------------------------------------------------------------------------
-    ## 5. Download, Upload, and Delete
-    print("\nExecuting the download, upload, and delete workflow...")
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    temp_dir = os.path.join(script_dir, "temp_renamed_attachments")
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)
-
-    # Download and rename attachments
-    attachment_file_counter = 1
-    for attachment in attachments_to_update:
-        try:
-            response = session.get(attachment['download_url'], stream=True)
-            response.raise_for_status()
-            file_path = os.path.join(temp_dir, attachment['new_name'])
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            attachment['new_file_path'] = file_path
-            attachment_file_counter = attachment_file_counter + 1
-            print(f"   - Downloaded '{attachment['original_name']}' and saved as '{attachment['new_name']}'.")
-        except Exception as e:
-            print(f"   - Failed to download attachment ID {attachment['original_attachment_id']}. Error: {e}")
-            attachment['new_file_path'] = None
-            attachment_file_counter = attachment_file_counter + 1
+                attachments_to_update.append({
+                    'item_id': attachment['parent_item_id'],
+                    'original_attachment_id': attachment['id'],
+                    'original_name': attachment_name,
+                    'original_file_name': file_name,
+                    'download_url': f"{jama_base_url_v2.rstrip('/')}/attachments/{attachment['id']}/file",
+                    'new_name': new_name_with_ext,
+                    'size': 0 if copy_name else metadata_size(attachment),
+                    'copied': bool(copy_name)
+                })
 
-    # --- NEW UPLOAD LOGIC: Using the correct three-step Jama API workflow ---
-    print("\nExecuting the three-step attachment upload process...")
-    upload_successful = True
-    new_attachment_ids = {}
+        # The replacements still to make; the rest only need their original deleted
+        to_copy = [a for a in attachments_to_update if not a['copied']]
+        print(f"Found {len(attachments_to_update)} attachments to update.")
+        if len(to_copy) < len(attachments_to_update):
+            print(f"{len(attachments_to_update) - len(to_copy)} of them already have their renamed copy linked; only their originals will be deleted.")
+        if not attachments_to_update:
+            print("No attachments found that meet the criteria. Exiting.")
+            return enumeration
+        if dry_run is not None:
+            # Nothing is downloaded or created: the plan is priced from the metadata gathered so far
+            n = len(to_copy)
+            dry_run.plan('item', attachments_to_update, [('download', n), ('create', n), ('upload', n), ('link', n), ('delete', len(attachments_to_update))], metrics, max_workers)
+            metrics.close()
+            session.close()
+            return enumeration
+        renames.save(enumeration - 1)
 
-    for attachment in attachments_to_update:
-        try:
-            print(f"\n   - Processing attachment '{attachment['new_name']}'...")
-            
-            # Step 1: Create a placeholder attachment item
-            print("      - Step 1: Creating a placeholder attachment item...")
-            create_attachment_url = f"{jama_base_url_v2.rstrip('/')}/projects/{project_api_id}/attachments"
-            attachment_payload = {
-                "fields": {
-                    "name": attachment['new_name'],
-                    "description": "Attachment renamed and re-uploaded via API script."
-                }
-            }
-            
-            response = session.post(create_attachment_url, json=attachment_payload, headers=json_headers)
-            response.raise_for_status()
-            
+        # -------------------------------------------------------------------------------------------
+        ## 5. Download, Upload, and Delete
+        profiler.mark('download/upload/link/delete')
+        print("\nExecuting the download, upload, and delete workflow...")
+        # Downloads go to a configurable temp directory; each file is deleted once it is no longer needed
+        # when the user chose to delete downloads or set a quota, and a quota pauses downloads when full
+        storage = TempStorage(temp_location, temp_quota, evict=t_f)
+        temp_dir = storage.directory
+
+        # Largest attachments are scheduled first so one big file doesn't leave the other workers idle at the end
+        fill_sizes(session, attachments_to_update, max_workers)
+        total_bytes = sum(a['size'] or 0 for a in attachments_to_update)
+        emit_plan('download', len(to_copy), total_bytes)
+        for stage in ('create', 'upload', 'link'):
+            emit_plan(stage, len(to_copy), total_bytes if stage == 'upload' else 0)
+        emit_plan('delete', len(attachments_to_update))
+
+        # Optional pre-delete backup: the originals just downloaded are archived concurrently, never re-downloaded
+        backup = None
+        if backup_dir:
+            backup = BackupArchive(backup_dir, f"backup_project{project_api_id}", backup_volume_size, backup_format)
+            emit_plan('backup', len(to_copy), total_bytes)
+            print(f"Backing up original attachments to {backup_dir} before they are deleted.")
+
+        # Optional CPU stage: smaller copies are made on a process pool while the downloads continue
+        optimizer = ImageOptimizer(optimize_images, temp_dir, max_image_dimension)
+        optimizer.plan(len(to_copy), total_bytes)
+
+        # Download and rename attachments
+        def download(attachment):
+            gate.checkpoint()
+            try:
+                file_path = storage.path(attachment['new_name'])
+                with track('download', attachment_id=attachment['original_attachment_id'], item_id=attachment['item_id'], name=attachment['new_name']) as result:
+                    result['bytes'] = download_file(session, attachment['download_url'], file_path, chunk_size)
+                storage.account(attachment['original_attachment_id'], file_path, attachment['size'])
+                attachment['new_file_path'] = file_path
+                attachment['upload_path'] = optimizer.submit(file_path, attachment_id=attachment['original_attachment_id'], item_id=attachment['item_id'], name=attachment['new_name'])
+                if backup is not None:
+                    attachment['backup'] = backup.add(file_path, attachment['original_attachment_id'], attachment['item_id'],
+                                                      attachment['original_name'], attachment['original_file_name'])
+            except Exception as e:
+                print(f"   - Failed to download attachment ID {attachment['original_attachment_id']}. Error: {e}")
+                attachment['new_file_path'] = None
+                storage.release(attachment['original_attachment_id'])
+
+        download_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download")
+
+        # --- NEW UPLOAD LOGIC: Using the correct three-step Jama API workflow ---
+        print("\nExecuting the three-step attachment upload process...")
+        upload_failed = threading.Event()  # Set on the first failure so no new uploads start
+        new_attachment_ids = {}
+        request_counts = {'link': 0, 'delete': 0}
+        counts_lock = threading.Lock()
+
+        def upload(attachment):
+            event_details = {'attachment_id': attachment['original_attachment_id'], 'item_id': attachment['item_id'], 'name': attachment['new_name']}
             try:
-                response_data = response.json()
-                print("      - Raw JSON response:", json.dumps(response_data, indent=2))
-                new_attachment_item_id = response_data['meta']['id']
-                print(f"      - Successfully created placeholder item with ID: {new_attachment_item_id}")
-            except KeyError:
-                raise Exception(f"Could not find attachment ID in the server response. Please inspect the raw JSON output above.")
+                if not attachment['new_file_path']:
+                    raise Exception("The original could not be downloaded.")
+
+                # Step 1: Create a placeholder attachment item (normally created ahead of time by the pool)
+                if placeholders is not None:
+                    new_attachment_item_id = placeholders.take(attachment)
+                else:
+                    new_attachment_item_id = create_placeholder(session, jama_base_url_v2, project_api_id, attachment, json_headers)
             
-            # Step 2: Upload the file content to the placeholder item
-            print("      - Step 2: Uploading the file content...")
-            upload_file_url = f"{jama_base_url_v2.rstrip('/')}/attachments/{new_attachment_item_id}/file"
+                # Step 2: Upload the file content to the placeholder item
+                upload_file_url = f"{jama_base_url_v2.rstrip('/')}/attachments/{new_attachment_item_id}/file"
             
-            with open(attachment['new_file_path'], 'rb') as f:
-                files = {'file': (os.path.basename(attachment['new_file_path']), f, 'application/octet-stream')}
-                response = session.put(upload_file_url, files=files, headers=multipart_headers)
-                response.raise_for_status()
-                print("      - Successfully uploaded file content.")
+                # The optimised copy when it came out smaller, otherwise the file as downloaded
+                upload_path = attachment['upload_path'].result() if attachment.get('upload_path') else attachment['new_file_path']
+                if upload_path != attachment['new_file_path']:
+                    storage.account(attachment['original_attachment_id'], upload_path)
+                with track('upload', **event_details) as result, open(upload_path, 'rb') as f:
+                    files = {'file': (os.path.basename(upload_path), f, 'application/octet-stream')}
+                    response = session.put(upload_file_url, files=files, headers=multipart_headers)
+                    response.raise_for_status()
+                    result['bytes'] = os.path.getsize(upload_path)
             
-            # Step 3: Link the new attachment to the original item
-            print("      - Step 3: Linking the new attachment to the original item...")
-            link_attachment_url = f"{jama_base_url_v2.rstrip('/')}/items/{attachment['item_id']}/attachments"
-            link_payload = {
-                "attachment": new_attachment_item_id
-            }
+                # Step 3: Link the new attachment to the original item
+                link_attachment_url = f"{jama_base_url_v2.rstrip('/')}/items/{attachment['item_id']}/attachments"
+                link_payload = {
+                    "attachment": new_attachment_item_id
+                }
             
-            response = session.post(link_attachment_url, json=link_payload, headers=json_headers)
-            response.raise_for_status()
-            print(f"      - Successfully linked new attachment to item {attachment['item_id']}.")
+                with counts_lock:
+                    request_counts['link'] += 1
+                with track('link', **event_details):
+                    response = session.post(link_attachment_url, json=link_payload, headers=json_headers)
+                    response.raise_for_status()
 
-            new_attachment_ids[attachment['original_attachment_id']] = new_attachment_item_id
+                new_attachment_ids[attachment['original_attachment_id']] = new_attachment_item_id
+                if record is not None:
+                    record.add('item', new_attachment_item_id, attachment['item_id'], attachment['new_name'], upload_path,
+                               original_id=attachment['original_attachment_id'])
+                if backup is None:
+                    storage.evict(attachment['original_attachment_id'])  # Uploaded and linked: the local copies are done with
+                return True
 
-        except requests.exceptions.HTTPError as e:
-            print(f"   - An HTTP error occurred during the upload process for {attachment['new_name']}.")
-            print(f"     Status Code: {e.response.status_code}")
-            print(f"     Response: {e.response.text}")
-            upload_successful = False
-            break
-        except Exception as e:
-            print(f"   - An unexpected error occurred during the upload process for {attachment['new_name']}. Error: {e}")
-            upload_successful = False
-            break
-
-    # Conditionally delete the original attachments
-    if upload_successful and len(new_attachment_ids) == len(attachments_to_update):
-        print("\nAll files successfully uploaded and linked. Deleting original attachments...")
-        for attachment in attachments_to_update:
-            try:
-                # --- FIX: Use the correct endpoint for deletion, including both IDs ---
-                delete_url = f"{jama_base_url_v2.rstrip('/')}/items/{attachment['item_id']}/attachments/{attachment['original_attachment_id']}"
-                delete_response = session.delete(delete_url, headers=json_headers)
-                delete_response.raise_for_status()
-                print(f"   - Deleted original attachment ID {attachment['original_attachment_id']} from item {attachment['item_id']}.")
+            except requests.exceptions.HTTPError as e:
+                print(f"   - An HTTP error occurred during the upload process for {attachment['new_name']}.")
+                print(f"     Status Code: {e.response.status_code}")
+                print(f"     Response: {e.response.text}")
+                upload_failed.set()
             except Exception as e:
-                print(f"   - Failed to delete original attachment ID {attachment['original_attachment_id']}. Error: {e}")
-                print("   - Original attachments may remain. Please check manually.")
-    else:
-        print("\n⚠️ An error occurred during the upload/link process. Deletion of original attachments has been skipped.")
+                print(f"   - An unexpected error occurred during the upload process for {attachment['new_name']}. Error: {e}")
+                upload_failed.set()
+            return False
+
+        def process_item(group):
+            # An item's uploads, links and deletes never straddle a window boundary
+            gate.checkpoint(upload_failed)
+            copies = [a for a in group['attachments'] if not a['copied']]
+            # Download the item's originals, waiting for temp space while the quota is full...
+            if copies and not storage.reserve({a['original_attachment_id']: a['size'] for a in copies}, upload_failed, group.get('reserve_turn')):
+                return
+            list(download_pool.map(download, copies))
+
+            # ...upload and link every replacement for this item...
+            for attachment in copies:
+                if upload_failed.is_set() or not upload(attachment):
+                    print(f"\n⚠️ Upload/link did not complete for item {group['item_id']}. Its original attachments have been kept.")
+                    return
+
+            # Originals are only deleted once their bytes are safely in the backup archive
+            if backup is not None:
+                try:
+                    for attachment in copies:
+                        attachment['backup'].result()
+                except Exception as e:
+                    print(f"\n⚠️ Backup failed for item {group['item_id']} ({e}). Its original attachments have been kept.")
+                    return
+                finally:
+                    # Archived (or kept on the server after a failed backup): the local copies are done with
+                    for attachment in copies:
+                        storage.evict(attachment['original_attachment_id'])
+
+            # ...then delete its originals straight away, so all of the item's writes land as one burst
+            print(f"\n   - All replacements linked to item {group['item_id']}. Deleting its original attachments...")
+            for attachment in group['attachments']:
+                try:
+                    # --- FIX: Use the correct endpoint for deletion, including both IDs ---
+                    delete_url = f"{jama_base_url_v2.rstrip('/')}/items/{attachment['item_id']}/attachments/{attachment['original_attachment_id']}"
+                    with counts_lock:
+                        request_counts['delete'] += 1
+                    with track('delete', attachment_id=attachment['original_attachment_id'], item_id=attachment['item_id'], name=attachment['original_name']):
+                        delete_response = session.delete(delete_url, headers=json_headers)
+                        delete_response.raise_for_status()
+                except Exception as e:
+                    print(f"   - Failed to delete original attachment ID {attachment['original_attachment_id']}. Error: {e}")
+                    print("   - Original attachments may remain. Please check manually.")
+
+        # Work is grouped per parent item; items are scheduled largest-first across the workers
+        item_groups = group_by_item(attachments_to_update)
+
+        # Placeholders are created a bounded number ahead, in the order the workers will upload
+        placeholders = None
+        if create_ahead:
+            copying = [group for group in largest_first(item_groups) if any(not a['copied'] for a in group['attachments'])]
+            upload_order = [a for group in copying for a in group['attachments'] if not a['copied']]
+            if temp_quota:
+                # Placeholders come in upload order, so quota must too: an item holding space while it waits for
+                # placeholders that belong to an earlier item still waiting for space would deadlock the run
+                for turn, group in enumerate(copying):
+                    group['reserve_turn'] = turn
+            placeholders = PlaceholderPool(session, jama_base_url_v2, project_api_id, upload_order, json_headers, create_ahead,
+                                           max_workers, upload_failed, gate.checkpoint)
+        try:
+            run_largest_first(item_groups, process_item, max_workers, stop_event=upload_failed)
+        finally:
+            download_pool.shutdown()
+            if placeholders is not None:
+                placeholders.close()  # Removes any placeholders left unused after a failure
+
+        if upload_failed.is_set():
+            print("\n⚠️ An error occurred during the upload/link process. Items that had not finished keep their original attachments.")
+        print_grouping_report(item_groups, request_counts['link'], request_counts['delete'])
+
+        # Cleanup
+        profiler.mark('cleanup')
+        if backup is not None:
+            backup.close()  # Finish archiving before the downloads are removed
+        optimizer.close()
+        storage.report()
+        cleanup(t_f,temp_dir)
 
-    # Cleanup
-    cleanup(t_f,temp_dir)
+        metrics.print_summary("Item attachment HTTP request summary")
+        metrics.close()
+        session.close()
 
-    print("\n✅ Item Attachment Script execution complete. ✅")
+        print("\n✅ Item Attachment Script execution complete. ✅")
 
-    return attachment_file_counter
\ No newline at end of file
+        return enumeration
+    finally:
+        profiler.write_report()  # Also stops the profiler after an early exit() or an error
\ No newline at end of file
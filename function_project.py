@@ -1,10 +1,24 @@
 import requests
 from requests.auth import HTTPBasicAuth
 import os
-import shutil
+from urllib.parse import quote
 from cleanup_file_directory import cleanup
+from download_engine import DEFAULT_CHUNK_SIZE, download_file
+from scheduler import DEFAULT_MAX_WORKERS, metadata_size, fill_sizes, run_largest_first
+from progress_events import emit_plan, track
+from http_metrics import instrument_session
+from run_profiler import RunProfiler
+from autotune import DEFAULT_PAGE_SIZE
+from maintenance_window import WindowGate
+from scope import discover_items, list_item_attachments
+from incremental import format_jama_date, changed_since
+from image_optimizer import ImageOptimizer
+from temp_storage import TempStorage
+from listing_decoder import get_listing
+from transport import new_session, DEFAULT_TRANSPORT
+from rename_index import RenameIndex
 
-def update_attachments_by_type(basic_oauth, jama_username, jama_password, project_api_id, custom_prefix, jama_base_url_v2, attachment_item_type_id, t_f, index):
+def update_attachments_by_type(basic_oauth, jama_username, jama_password, project_api_id, custom_prefix, jama_base_url_v2, attachment_item_type_id, t_f, index, max_workers=DEFAULT_MAX_WORKERS, trace_path=None, profile=False, profile_dir=None, page_size=DEFAULT_PAGE_SIZE, chunk_size=DEFAULT_CHUNK_SIZE, schedule=None, scope=None, since=None, optimize_images=False, max_image_dimension=None, record=None, temp_location=None, temp_quota=None, dry_run=None, transport=DEFAULT_TRANSPORT):
     """
     Finds and re-uploads attachments within a Jama Connect project that are of a specific item type,
     renaming them with a custom prefix and a unique suffix, and replacing the original file.
@@ -18,202 +32,298 @@ def update_attachments_by_type(basic_oauth, jama_username, jama_password, projec
         jama_base_url_v2 (str): The base URL for the Jama Connect REST API v2.
         attachment_item_type_id (int): The item type ID for attachments.
         t_f (bool): Flag to determine if the temporary directory should be cleaned up.
-        index (int): The starting index for the image renaming suffix.
+        index (int): The starting index for the image renaming suffix. Suffixes an earlier run already used are
+            never handed out again, and attachments it renamed are skipped (see rename_index.py).
+        max_workers (int): Number of attachments transferred in parallel, largest first.
+        trace_path (str): Optional file to append a JSON-lines trace of every HTTP request to.
+        profile (bool): Record per-phase wall/CPU time, memory snapshots and a cProfile dump.
+        profile_dir (str): Where to write the profile report (defaults to the log directory).
+        page_size (int): maxResults for the paged attachment listing (see autotune.py).
+        chunk_size (int): Download I/O chunk size in bytes.
+        schedule (list): Optional maintenance windows (see maintenance_window.py); work pauses outside them
+            and requests are held to each window's rps and MB/s budgets.
+        scope (RunScope): Optional subtrees, item types or item IDs to limit the run to (see scope.py);
+            only attachments linked to items in scope are considered.
+        since (datetime): Incremental mode; only attachments created or changed at or after this time are examined.
+        optimize_images (bool): Shrink images on a process pool before re-upload (needs Pillow; see image_optimizer.py).
+        max_image_dimension (int): With optimize_images, also downsample images larger than this many pixels.
+        record (RunRecord): Optional record of every file uploaded, for verify_run.py to check afterwards.
+        temp_location (str): Where to put the temporary downloads folder (defaults to ~/AttachmentUpdater).
+        temp_quota (int): Optional cap in bytes on the temporary downloads; downloads wait for space
+            and each file is deleted once uploaded (see temp_storage.py).
+        dry_run (DryRunEstimate): If given, stop after discovery and filtering and add this run's
+            counts, bytes and estimated duration to it; nothing is downloaded or changed (see dry_run.py).
+        transport (str): 'requests' (HTTP/1.1, default) or 'http2' to multiplex the calls over a few
+            HTTP/2 connections (needs httpx[http2]; see transport.py).
+
+    Returns:
+        tuple or None: (number of matching attachments processed, work key of the queued name update
+        or None if none was accepted), or None if authentication failed. Jama applies the names only
+        once that work finishes (see verify_run.wait_for_work).
     """
 
-    # --- 1. Authentication ---
-    print(f"Authenticating with Jama Connect using {basic_oauth.upper()}...")
-    session = requests.Session()
-
-    if basic_oauth == 'basic':
-        auth = HTTPBasicAuth(jama_username, jama_password)
-        session.auth = auth
-    elif basic_oauth == 'oauth':
-        # OAuth 2.0 Client Credentials Flow
-        client_id = jama_username
-        client_secret = jama_password
-        token_url = f"{jama_base_url_v2.rstrip('/')}/rest/oauth/token"
+    profiler = RunProfiler(profile, "project_attachments", profile_dir).start()
+    try:
+        profiler.mark('auth')
+        gate = WindowGate(schedule)  # Pauses between units of work outside the allowed maintenance windows
+        gate.checkpoint()
+
+        # --- 1. Authentication ---
+        print(f"Authenticating with Jama Connect using {basic_oauth.upper()}...")
+        session = new_session(transport, max_workers)  # requests over HTTP/1.1, or multiplexed HTTP/2 (see transport.py)
+        metrics = instrument_session(session, trace_path)  # Times every request; optional JSON-lines trace
+        gate.install(session)
+
+        if basic_oauth == 'basic':
+            auth = HTTPBasicAuth(jama_username, jama_password)
+            session.auth = auth
+        elif basic_oauth == 'oauth':
+            # OAuth 2.0 Client Credentials Flow
+            client_id = jama_username
+            client_secret = jama_password
+            token_url = f"{jama_base_url_v2.rstrip('/')}/rest/oauth/token"
         
+            try:
+                # Get the access token
+                token_data = {
+                    'grant_type': 'client_credentials',
+                    'client_id': client_id,
+                    'client_secret': client_secret
+                }
+                response = requests.post(token_url, data=token_data)
+                response.raise_for_status()
+                token = response.json().get('access_token')
+            
+                # Use the token for subsequent requests
+                session.headers.update({"Authorization": f"Bearer {token}"})
+                print("OAuth 2.0 authentication successful! 🎉")
+            except requests.exceptions.HTTPError as e:
+                print(f"OAuth 2.0 authentication failed. Please check your client ID and secret.")
+                print(f"Error: {e}")
+                return
+            except Exception as e:
+                print(f"An unexpected error occurred during OAuth authentication: {e}")
+                return
+        else:
+            print("Invalid 'basic_oauth' value. Please use 'basic' or 'oauth'.")
+            return
+
+        json_headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+
+        multipart_headers = {
+            "Accept": "application/json",
+        }
+    
+        # Test authentication with a simple API call
         try:
-            # Get the access token
-            token_data = {
-                'grant_type': 'client_credentials',
-                'client_id': client_id,
-                'client_secret': client_secret
-            }
-            response = requests.post(token_url, data=token_data)
+            response = session.get(f"{jama_base_url_v2.rstrip('/')}/projects", headers=json_headers)
             response.raise_for_status()
-            token = response.json().get('access_token')
-            
-            # Use the token for subsequent requests
-            session.headers.update({"Authorization": f"Bearer {token}"})
-            print("OAuth 2.0 authentication successful! 🎉")
+            print("Initial authentication check successful! 🎉")
         except requests.exceptions.HTTPError as e:
-            print(f"OAuth 2.0 authentication failed. Please check your client ID and secret.")
-            print(f"Error: {e}")
+            print(f"Authentication failed. Please check your credentials. Error: {e}")
             return
         except Exception as e:
-            print(f"An unexpected error occurred during OAuth authentication: {e}")
+            print(f"An unexpected error occurred during authentication: {e}")
             return
-    else:
-        print("Invalid 'basic_oauth' value. Please use 'basic' or 'oauth'.")
-        return
-
-    json_headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
-
-    multipart_headers = {
-        "Accept": "application/json",
-    }
-    
-    # Test authentication with a simple API call
-    try:
-        response = session.get(f"{jama_base_url_v2.rstrip('/')}/projects", headers=json_headers)
-        response.raise_for_status()
-        print("Initial authentication check successful! 🎉")
-    except requests.exceptions.HTTPError as e:
-        print(f"Authentication failed. Please check your credentials. Error: {e}")
-        return
-    except Exception as e:
-        print(f"An unexpected error occurred during authentication: {e}")
-        return
-    print("-" * 50)
-
-    # --- 2. Fetch Attachments of a Specific Type ---
-    print(f"Fetching all attachments (Item Type ID: {attachment_item_type_id}) for the project...")
-    all_attachments = []
-    items_url = f"{jama_base_url_v2.rstrip('/')}/abstractitems"
-    page = 1
+        print("-" * 50)
+
+        # --- 2. Fetch Attachments of a Specific Type ---
+        profiler.mark('listing')
+        print(f"Fetching all attachments (Item Type ID: {attachment_item_type_id}) for the project...")
+        all_attachments = []
+        items_url = f"{jama_base_url_v2.rstrip('/')}/abstractitems"
+        page = 1
+
+        if since is not None:
+            # Incremental run: the date filter rides on the URL so nextLink keeps it without repeating it
+            print(f"Incremental run: only attachments changed since {format_jama_date(since)}.")
+            items_url += f"?lastActivityDate={quote(format_jama_date(since))}"
+
+        if scope is not None and not scope.whole_project:
+            # Only the attachments linked to items in scope, found without listing the whole project
+            print(f"Limiting the run to {scope.describe()}...")
+            scoped_items = discover_items(session, jama_base_url_v2, project_api_id, scope, page_size, json_headers, gate.checkpoint)
+            linked = list_item_attachments(session, jama_base_url_v2, scoped_items, json_headers, gate.checkpoint)
+            all_attachments = list({a['id']: a for a in linked if str(a.get('itemType')) == str(attachment_item_type_id)}.values())
+            items_url = None
     
-    while items_url:
-        params = {
-            "project": project_api_id,
-            "itemType": attachment_item_type_id,
-            "startAt": (page - 1) * 20,
-            "maxResults": 20
-        }
+        while items_url:
+            gate.checkpoint()
+            params = {
+                "project": project_api_id,
+                "itemType": attachment_item_type_id,
+                "startAt": (page - 1) * page_size,
+                "maxResults": page_size
+            }
         
-        response = session.get(items_url, headers=json_headers, params=params)
-        response.raise_for_status()
-        data = response.json()
-        all_attachments.extend(data['data'])
+            data = get_listing(session, items_url, json_headers, params)  # Keeps only the fields used below
+            all_attachments.extend(data['data'])
         
-        if 'nextLink' in data['meta']:
-            items_url = data['meta']['nextLink']
-            page += 1
-        else:
-            items_url = None
+            if 'nextLink' in data['meta']:
+                items_url = data['meta']['nextLink']
+                page += 1
+            else:
+                items_url = None
 
-    print(f"Successfully fetched {len(all_attachments)} attachments from the project.")
-    print("-" * 50)
+        # Also checked client-side, in case the server ignores the date filter or the run is scoped
+        all_attachments = [attachment for attachment in all_attachments if changed_since(attachment, since)]
+        print(f"Successfully fetched {len(all_attachments)} attachments from the project.")
+        print("-" * 50)
     
-    # --- 3. Filter and Prepare Attachments for Update ---
-    print("Filtering attachments that start with 'image' or 'Image'...")
-    attachments_to_update = []
+        # --- 3. Filter and Prepare Attachments for Update ---
+        profiler.mark('filtering')
+        print("Filtering attachments that start with 'image' or 'Image'...")
+        attachments_to_update = []
     
-    # Use the 'index' argument to initialize the enumeration counter
-    enumeration = index
+        # Use the 'index' argument to initialize the enumeration counter, after any suffix an earlier run used;
+        # attachments earlier runs (or the item workflow just now) renamed are skipped
+        renames = RenameIndex(jama_base_url_v2, project_api_id, custom_prefix).scan(all_attachments)
+        enumeration = renames.next_suffix(index)
 
-    for attachment in all_attachments:
-        attachment_name = attachment['fields'].get('name')
+        for attachment in all_attachments:
+            attachment_name = attachment['fields'].get('name')
+            if attachment['id'] in renames:
+                continue
         
-        if attachment_name and attachment_name.lower().startswith('image'):
-            base_name, file_extension = os.path.splitext(attachment_name)
+            if attachment_name and attachment_name.lower().startswith('image'):
+                base_name, file_extension = os.path.splitext(attachment_name)
             
-            # Format the suffix with leading zeros up to 5 digits
-            new_name_with_ext = f"{custom_prefix}{base_name}_{enumeration:05d}{file_extension}"
+                # Format the suffix with leading zeros up to 5 digits
+                new_name_with_ext = f"{custom_prefix}{base_name}_{enumeration:05d}{file_extension}"
             
-            attachments_to_update.append({
-                'original_attachment_id': attachment['id'],
-                'original_name': attachment_name,
-                'download_url': f"{jama_base_url_v2.rstrip('/')}/attachments/{attachment['id']}/file",
-                'new_name': new_name_with_ext,
-                'parent_item_id': attachment['fields'].get('parent'),
-                'item_type_id': attachment['itemType']
-            })
-            enumeration += 1
-
-    print(f"Found {len(attachments_to_update)} attachments to update.")
-    if not attachments_to_update:
-        print("No attachments found that meet the criteria. Exiting.")
-        return
-    print("-" * 50)
+                attachments_to_update.append({
+                    'original_attachment_id': attachment['id'],
+                    'original_name': attachment_name,
+                    'download_url': f"{jama_base_url_v2.rstrip('/')}/attachments/{attachment['id']}/file",
+                    'new_name': new_name_with_ext,
+                    'parent_item_id': attachment['fields'].get('parent'),
+                    'item_type_id': attachment['itemType'],
+                    'size': metadata_size(attachment)
+                })
+                enumeration += 1
+
+        print(f"Found {len(attachments_to_update)} attachments to update.")
+        if not attachments_to_update:
+            print("No attachments found that meet the criteria. Exiting.")
+            return 0, None
+        if dry_run is not None:
+            n = len(attachments_to_update)
+            dry_run.plan('project', attachments_to_update, [('download', n), ('upload', n), ('rename', 1)], metrics, max_workers)
+            metrics.close()
+            session.close()
+            return n, None
+        renames.save(enumeration - 1)
+        print("-" * 50)
     
-    # --- 4. Download and Update Attachments ---
-    print("Executing the download and update workflow...")
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    temp_dir = os.path.join(script_dir, "temp_renamed_attachments")
-    if not os.path.exists(temp_dir):
-        os.makedirs(temp_dir)
-
-    for attachment in attachments_to_update:
-        print(f"\nProcessing attachment '{attachment['original_name']}'...")
-        try:
-            # Step A: Download the original attachment
-            print("    - Step A: Downloading original attachment...")
-            response = session.get(attachment['download_url'], stream=True)
-            response.raise_for_status()
-            
-            # Save the file with the new name
-            file_path = os.path.join(temp_dir, attachment['new_name'])
-            with open(file_path, 'wb') as f:
-                shutil.copyfileobj(response.raw, f)
-            print(f"    - Saved '{attachment['original_name']}' as '{attachment['new_name']}'.")
+        # --- 4. Download and Update Attachments ---
+        profiler.mark('download/upload')
+        print("Executing the download and update workflow...")
+        storage = TempStorage(temp_location, temp_quota, evict=t_f)
+        temp_dir = storage.directory
+
+        # Largest attachments are scheduled first so one big file doesn't leave the other workers idle at the end
+        fill_sizes(session, attachments_to_update, max_workers)
+        total_bytes = sum(a['size'] or 0 for a in attachments_to_update)
+        emit_plan('download', len(attachments_to_update), total_bytes)
+        emit_plan('upload', len(attachments_to_update), total_bytes)
+        emit_plan('rename', 1)
+        optimizer = ImageOptimizer(optimize_images, temp_dir, max_image_dimension)
+        optimizer.plan(len(attachments_to_update), total_bytes)
+
+        def process(attachment):
+            gate.checkpoint()
+            event_details = {'attachment_id': attachment['original_attachment_id'], 'item_id': attachment['parent_item_id'], 'name': attachment['new_name']}
+            key = attachment['original_attachment_id']
+            storage.reserve({key: attachment['size']})  # Waits while the temp storage quota is full
+            try:
+                # Step A: Download the original attachment
+                # Save the file with the new name (resumes any partial download left by a previous run)
+                file_path = storage.path(attachment['new_name'])
+                with track('download', **event_details) as result:
+                    result['bytes'] = download_file(session, attachment['download_url'], file_path, chunk_size)
+                storage.account(key, file_path, attachment['size'])
+
+                # Step B: Optionally shrink the image on the process pool (passes through unchanged if it can't)
+                upload_path = optimizer.submit(file_path, **event_details).result()
+                if upload_path != file_path:
+                    storage.account(key, upload_path)
             
-            # Step C: Upload the new file content to the existing attachment
-            print("    - Step C: Uploading the new file content...")
-            upload_file_url = f"{jama_base_url_v2.rstrip('/')}/attachments/{attachment['original_attachment_id']}/file"
-            with open(file_path, 'rb') as f:
-                files = {'file': (os.path.basename(file_path), f, 'application/octet-stream')}
-                response = session.put(upload_file_url, files=files, headers=multipart_headers)
-                response.raise_for_status()
-                print("    - Successfully replaced the file content.")
+                # Step C: Upload the new file content to the existing attachment
+                upload_file_url = f"{jama_base_url_v2.rstrip('/')}/attachments/{attachment['original_attachment_id']}/file"
+                with track('upload', **event_details) as result, open(upload_path, 'rb') as f:
+                    files = {'file': (os.path.basename(upload_path), f, 'application/octet-stream')}
+                    response = session.put(upload_file_url, files=files, headers=multipart_headers)
+                    response.raise_for_status()
+                    result['bytes'] = os.path.getsize(upload_path)
+                if record is not None:
+                    record.add('project', attachment['original_attachment_id'], attachment['parent_item_id'], attachment['new_name'], upload_path)
 
-        except requests.exceptions.HTTPError as e:
-            print(f"    - An HTTP error occurred during the update process for {attachment['original_name']}. Error: {e}")
-        except Exception as e:
-            print(f"    - An unexpected error occurred during the update process for {attachment['original_name']}. Error: {e}")
+            except requests.exceptions.HTTPError as e:
+                print(f"    - An HTTP error occurred during the update process for {attachment['original_name']}. Error: {e}")
+            except Exception as e:
+                print(f"    - An unexpected error occurred during the update process for {attachment['original_name']}. Error: {e}")
+            finally:
+                # The attachment keeps its old content on the server if anything failed, so the local copy is never needed again
+                storage.evict(key)
+
+        run_largest_first(attachments_to_update, process, max_workers)
+        optimizer.close()
 
-    # --- 5. Asynchronous Name Update using PATCH ---
-    print("\n--- 5. Finalizing Updates ---")
-    if attachments_to_update:
-        print("Submitting asynchronous PATCH request to update all attachment names...")
+        # --- 5. Asynchronous Name Update using PATCH ---
+        profiler.mark('rename')
+        print("\n--- 5. Finalizing Updates ---")
+        work_identifier = None
+        if attachments_to_update:
+            gate.checkpoint()
+            print("Submitting asynchronous PATCH request to update all attachment names...")
         
-        # Correct endpoint for this operation is '/rest/v1/items'
-        patch_items_url = f"{jama_base_url_v2.rstrip('/')}/../v1/items"
+            # Correct endpoint for this operation is '/rest/v1/items'
+            patch_items_url = f"{jama_base_url_v2.rstrip('/')}/../v1/items"
         
-        # Build the payload according to the Swagger page format
-        patch_payload = []
-        for attachment in attachments_to_update:
-            patch_payload.append({
-                "items": [
-                    attachment['original_attachment_id']
-                ],
-                "operations": [
-                    {
-                        "op": "replace",
-                        "path": "/fields/name",
-                        "value": attachment['new_name']
-                    }
-                ]
-            })
+            # Build the payload according to the Swagger page format
+            patch_payload = []
+            for attachment in attachments_to_update:
+                patch_payload.append({
+                    "items": [
+                        attachment['original_attachment_id']
+                    ],
+                    "operations": [
+                        {
+                            "op": "replace",
+                            "path": "/fields/name",
+                            "value": attachment['new_name']
+                        }
+                    ]
+                })
 
-        try:
-            response = session.patch(patch_items_url, json=patch_payload, headers=json_headers)
-            response.raise_for_status()
-            response_data = response.json()
-            work_identifier = response_data['data']['workKey']
-            print(f"PATCH request successful! A work identifier has been provided for monitoring: {work_identifier} 🚀")
-        except requests.exceptions.HTTPError as e:
-            print(f"An HTTP error occurred during the asynchronous name update. Error: {e}")
-        except Exception as e:
-            print(f"An unexpected error occurred during the asynchronous name update: {e}")
-    else:
-        print("No PATCH operations to submit.")
+            try:
+                with track('rename', name=f"{len(patch_payload)} attachment names"):
+                    response = session.patch(patch_items_url, json=patch_payload, headers=json_headers)
+                    response.raise_for_status()
+                    response_data = response.json()
+                    work_identifier = response_data['data']['workKey']
+                print(f"PATCH request successful! A work identifier has been provided for monitoring: {work_identifier} 🚀")
+            except requests.exceptions.HTTPError as e:
+                print(f"An HTTP error occurred during the asynchronous name update. Error: {e}")
+            except Exception as e:
+                print(f"An unexpected error occurred during the asynchronous name update: {e}")
+        else:
+            print("No PATCH operations to submit.")
 
-    #Cleanup
-    cleanup(t_f, temp_dir)
+        #Cleanup
+        profiler.mark('cleanup')
+        storage.report()
+        cleanup(t_f, temp_dir)
+
+        metrics.print_summary("Project attachment HTTP request summary")
+        metrics.close()
+        session.close()
     
-    print("\n✅ Project Attachment Script execution complete. ✅")
\ No newline at end of file
+        print("\n✅ Project Attachment Script execution complete. ✅")
+
+        return len(attachments_to_update), work_identifier
+    finally:
+        profiler.write_report()  # Also stops the profiler after an early exit() or an error
\ No newline at end of file
@@ -0,0 +1,146 @@
+import re
+import json
+import math
+import time
+import threading
+
+# (method, URL pattern, endpoint class); the first match wins
+ENDPOINT_CLASSES = [
+    ('POST', re.compile(r'/rest/oauth/token'), 'oauth_token'),
+    ('GET', re.compile(r'/projects/?(\?|$)'), 'auth_check'),
+    ('GET', re.compile(r'/items/\d+/attachments/?(\?|$)'), 'list_attachments'),
+    ('GET', re.compile(r'/(items|abstractitems)/?(\?|$)'), 'list'),
+    ('GET', re.compile(r'/attachments/\d+/file'), 'download'),
+    ('HEAD', re.compile(r'/attachments/\d+/file'), 'size_probe'),
+    ('POST', re.compile(r'/projects/\d+/attachments'), 'create'),
+    ('PUT', re.compile(r'/attachments/\d+/file'), 'upload'),
+    ('POST', re.compile(r'/items/\d+/attachments'), 'link'),
+    ('DELETE', re.compile(r'/items/\d+/attachments/\d+'), 'delete'),
+    ('PATCH', re.compile(r'/v1/items'), 'rename'),
+]
+
+HISTOGRAM_MIN_SECONDS = 0.0005  # Lower edge of the first latency bucket
+HISTOGRAM_GROWTH = 2 ** (1 / 8)  # Bucket width ratio, roughly 9% relative error on percentiles
+
+
+def classify(method, url):
+    """Maps a request to the endpoint class used for grouping metrics."""
+    for class_method, pattern, name in ENDPOINT_CLASSES:
+        if method == class_method and pattern.search(url):
+            return name
+    return 'other'
+
+
+class LatencyHistogram:
+    """A log-bucketed latency histogram: constant memory however many requests are recorded."""
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        bucket = 0 if seconds <= HISTOGRAM_MIN_SECONDS else int(math.log(seconds / HISTOGRAM_MIN_SECONDS, HISTOGRAM_GROWTH)) + 1
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, fraction):
+        """Returns the upper edge of the bucket holding the given percentile (0-1), in seconds."""
+        if not self.count:
+            return 0.0
+        target = math.ceil(self.count * fraction)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                return min(HISTOGRAM_MIN_SECONDS * HISTOGRAM_GROWTH ** bucket, self.max)
+        return self.max
+
+
+class HttpMetrics:
+    """
+    Per-endpoint latency histograms, status counts, byte counters and retry counts for one run.
+    Latency is the time until response headers arrive (requests' Response.elapsed), so streamed
+    downloads are measured to first byte; their size comes from Content-Length.
+    """
+
+    def __init__(self, trace_path=None):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+        self._trace = open(trace_path, 'a', encoding='utf-8') if trace_path else None
+
+    def _endpoint(self, name):
+        endpoint = self.endpoints.get(name)
+        if endpoint is None:
+            endpoint = self.endpoints[name] = {
+                'histogram': LatencyHistogram(), 'statuses': {}, 'bytes_in': 0, 'bytes_out': 0, 'retries': 0,
+            }
+        return endpoint
+
+    def record(self, method, url, status, seconds, bytes_in=0, bytes_out=0):
+        name = classify(method, url)
+        with self._lock:
+            endpoint = self._endpoint(name)
+            endpoint['histogram'].add(seconds)
+            endpoint['statuses'][status] = endpoint['statuses'].get(status, 0) + 1
+            endpoint['bytes_in'] += bytes_in
+            endpoint['bytes_out'] += bytes_out
+            if self._trace:
+                self._trace.write(json.dumps({
+                    'ts': time.time(), 'endpoint': name, 'method': method, 'url': url, 'status': status,
+                    'seconds': round(seconds, 6), 'bytes_in': bytes_in, 'bytes_out': bytes_out,
+                }) + "\n")
+
+    def record_retry(self, method, url):
+        name = classify(method, url)
+        with self._lock:
+            self._endpoint(name)['retries'] += 1
+            if self._trace:
+                self._trace.write(json.dumps({'ts': time.time(), 'endpoint': name, 'method': method, 'url': url, 'retry': True}) + "\n")
+
+    def response_hook(self, response, *args, **kwargs):
+        """requests response hook that records every response made through the session."""
+        request = response.request
+        body = request.body
+        bytes_out = len(body) if isinstance(body, (bytes, str)) else int(request.headers.get('Content-Length', 0) or 0)
+        bytes_in = int(response.headers.get('Content-Length', 0) or 0)
+        self.record(request.method, request.url, response.status_code, response.elapsed.total_seconds(), bytes_in, bytes_out)
+
+    def print_summary(self, title="HTTP request summary"):
+        print(f"\n{title}:")
+        print(f"   {'endpoint':<17}{'requests':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'MB in':>9}{'MB out':>9}{'retries':>8}  statuses")
+        with self._lock:
+            for name in sorted(self.endpoints, key=lambda n: -self.endpoints[n]['histogram'].total):
+                endpoint = self.endpoints[name]
+                histogram = endpoint['histogram']
+                statuses = ", ".join(f"{status}x{count}" for status, count in sorted(endpoint['statuses'].items()))
+                print(f"   {name:<17}{histogram.count:>9}"
+                      f"{histogram.percentile(0.50) * 1000:>9.0f}{histogram.percentile(0.95) * 1000:>9.0f}{histogram.percentile(0.99) * 1000:>9.0f}"
+                      f"{endpoint['bytes_in'] / (1024 * 1024):>9.1f}{endpoint['bytes_out'] / (1024 * 1024):>9.1f}{endpoint['retries']:>8}  {statuses}")
+
+    def close(self):
+        with self._lock:
+            if self._trace:
+                self._trace.close()
+                self._trace = None
+
+
+def instrument_session(session, trace_path=None):
+    """
+    Attaches an HttpMetrics collector to a requests session and returns it.
+    Optionally appends a JSON-lines trace of every request to `trace_path`.
+    """
+    metrics = HttpMetrics(trace_path)
+    session.hooks['response'].append(metrics.response_hook)
+    session.metrics = metrics
+    return metrics
+
+
+def record_retry(session, method, url):
+    """Counts a retry against the session's metrics, if the session is instrumented."""
+    metrics = getattr(session, 'metrics', None)
+    if metrics is not None:
+        metrics.record_retry(method, url)
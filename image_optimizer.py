@@ -0,0 +1,138 @@
+import os
+import io
+import threading
+from concurrent.futures import ProcessPoolExecutor, Future
+from progress_events import emit, emit_plan
+
+try:
+    from PIL import Image
+except ImportError:  # Optional: without Pillow every file passes through unchanged
+    Image = None
+
+OPTIMIZED_DIR_NAME = "optimized"
+LOSSLESS_FORMATS = ('PNG', 'GIF')  # Re-encoded with better compression; pixels are unchanged
+RESAMPLED_FORMATS = ('PNG', 'GIF', 'JPEG', 'WEBP')  # Formats that may also be downsampled when a max dimension is set
+JPEG_QUALITY = 90  # Only used when a JPEG/WebP is downsampled
+
+
+def _optimize_file(source_path, target_path, max_dimension=None):
+    """
+    Runs in a worker process. Re-encodes the image at source_path into target_path in the same
+    format and returns (original bytes, new bytes, note); new bytes is None when no smaller file
+    was produced, in which case target_path is not left behind.
+    """
+    original = os.path.getsize(source_path)
+    with Image.open(source_path) as image:
+        image_format = image.format
+        if image_format not in RESAMPLED_FORMATS:
+            return original, None, f"{image_format or 'unknown'} format left as is"
+        if getattr(image, 'is_animated', False):
+            return original, None, "animated image left as is"
+        resize = max_dimension and max(image.size) > max_dimension
+        if not resize and image_format not in LOSSLESS_FORMATS:
+            return original, None, "lossy format left as is (no downsampling requested)"
+
+        options = {}
+        for key in ('icc_profile', 'exif', 'dpi', 'transparency'):
+            if key in image.info:
+                options[key] = image.info[key]
+        if resize:
+            image = image.copy()
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        if image_format in ('PNG', 'GIF'):
+            options['optimize'] = True
+        if image_format == 'PNG':
+            options['compress_level'] = 9
+        else:
+            options['quality'] = JPEG_QUALITY
+            options['optimize'] = image_format == 'JPEG'
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format, **options)
+
+    if buffer.tell() >= original:
+        return original, None, "re-encoding did not make it smaller"
+    temp_path = target_path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(buffer.getbuffer())
+    os.replace(temp_path, target_path)
+    return original, buffer.tell(), "downsampled" if resize else "re-encoded losslessly"
+
+
+class ImageOptimizer:
+    """
+    Optional stage between download and re-upload that shrinks image attachments on a process
+    pool, so the CPU work neither holds the GIL nor stalls the transfer threads.
+
+    PNG and GIF files are re-encoded losslessly with maximum compression; with `max_dimension`
+    set, images larger than that (JPEG and WebP included) are also downsampled. The optimised
+    copy is written to an 'optimized' folder under the temp directory with the same file name,
+    so the downloaded original stays untouched (e.g. for the backup archive). Files that do not
+    get smaller, are not images, or fail to decode pass through unchanged.
+
+    submit() starts the work and returns a Future for the path to upload. Needs Pillow; without
+    it, or when disabled, the Future resolves straight away to the original path.
+    """
+
+    def __init__(self, enabled=False, temp_dir=None, max_dimension=None, workers=None):
+        self.enabled = enabled and Image is not None
+        if enabled and Image is None:
+            print("Image optimisation was requested but Pillow is not installed (pip install Pillow). Uploading files unchanged.")
+        self.max_dimension = max_dimension
+        self.target_dir = os.path.join(temp_dir, OPTIMIZED_DIR_NAME) if temp_dir else None
+        self._pool = None
+        self._lock = threading.Lock()
+        self.files = 0
+        self.optimized = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        if self.enabled:
+            os.makedirs(self.target_dir, exist_ok=True)
+            self._pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+
+    def plan(self, count, total_bytes=0):
+        if self.enabled:
+            emit_plan('optimize', count, total_bytes)
+
+    def submit(self, file_path, **details):
+        """Queues file_path for optimisation; the returned Future resolves to the path to upload."""
+        if not self.enabled:
+            future = Future()
+            future.set_result(file_path)
+            return future
+
+        target_path = os.path.join(self.target_dir, os.path.basename(file_path))
+        work = self._pool.submit(_optimize_file, file_path, target_path, self.max_dimension)
+        result = Future()
+
+        def done(work):
+            try:
+                original, new, note = work.result()
+            except Exception as e:
+                # Not an image Pillow can read (or a corrupt one): upload it as downloaded
+                original, new, note = os.path.getsize(file_path), None, f"not optimised ({e})"
+            with self._lock:
+                self.files += 1
+                self.bytes_before += original
+                self.bytes_after += new if new is not None else original
+                if new is not None:
+                    self.optimized += 1
+            if new is not None:
+                emit('optimize', 'ok', bytes=original - new, message=f"{note}, {original - new:,} bytes saved", **details)
+            else:
+                emit('optimize', 'skipped', message=note, **details)
+            result.set_result(target_path if new is not None else file_path)
+
+        work.add_done_callback(done)
+        return result
+
+    def close(self):
+        """Shuts the process pool down and prints the bytes saved."""
+        if self._pool is None:
+            return
+        self._pool.shutdown()
+        self._pool = None
+        saved = self.bytes_before - self.bytes_after
+        percent = 100 * saved / self.bytes_before if self.bytes_before else 0
+        print(f"\nImage optimisation: {self.optimized} of {self.files} files made smaller, "
+              f"{saved / (1024 * 1024):.2f} MB saved ({percent:.1f}% of {self.bytes_before / (1024 * 1024):.2f} MB).")
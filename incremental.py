@@ -0,0 +1,130 @@
+import os
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+from log_sink import LOG_DIR
+import progress_events
+
+STATE_PATH = os.path.join(os.path.dirname(LOG_DIR), "run_state.json")
+JAMA_DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"  # e.g. 2024-05-01T22:00:00.000+0000
+CLOCK_SKEW_MARGIN = timedelta(minutes=10)  # Overlap between runs so clock differences never hide a change
+DATE_FIELDS = ('lastActivityDate', 'modifiedDate', 'createdDate')
+
+_lock = threading.Lock()
+
+
+def format_jama_date(moment):
+    """Formats an aware datetime the way Jama's date filters expect."""
+    moment = moment.astimezone(timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.") + f"{moment.microsecond // 1000:03d}+0000"
+
+
+def parse_jama_date(text):
+    """Parses a Jama date string (or an ISO 8601 one); returns None if it can't be read."""
+    if not text:
+        return None
+    for parse in (lambda t: datetime.strptime(t, JAMA_DATE_FORMAT), datetime.fromisoformat):
+        try:
+            moment = parse(text)
+            return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+    return None
+
+
+def changed_since(record, since):
+    """
+    True if the record was created, modified or last active at or after `since`.
+    Records without any date information are kept, so a missing field never hides work.
+    """
+    if since is None:
+        return True
+    dates = [parse_jama_date(record.get(field) or record.get('fields', {}).get(field)) for field in DATE_FIELDS]
+    dates = [d for d in dates if d is not None]
+    return not dates or max(dates) >= since
+
+
+def _state_key(jama_base_url_v2, project_api_id):
+    return f"{jama_base_url_v2.rstrip('/').lower()}|{project_api_id}"
+
+
+def _read_state(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def load_project_state(jama_base_url_v2, project_api_id, path=STATE_PATH):
+    """Everything saved for this instance and project; empty if nothing was."""
+    return _read_state(path).get(_state_key(jama_base_url_v2, project_api_id)) or {}
+
+
+def update_project_state(jama_base_url_v2, project_api_id, path=STATE_PATH, **fields):
+    """Saves `fields` for this instance and project, keeping whatever else was saved for it."""
+    with _lock:
+        state = _read_state(path)
+        state.setdefault(_state_key(jama_base_url_v2, project_api_id), {}).update(fields)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, path)
+
+
+def load_high_water_mark(jama_base_url_v2, project_api_id, path=STATE_PATH):
+    """
+    The start time of the last successful run for this instance and project, minus the clock-skew
+    margin, as an aware datetime; None if the project has never completed a run.
+    """
+    mark = parse_jama_date(load_project_state(jama_base_url_v2, project_api_id, path).get('high_water_mark'))
+    return mark - CLOCK_SKEW_MARGIN if mark else None
+
+
+def save_high_water_mark(jama_base_url_v2, project_api_id, started_at, path=STATE_PATH):
+    """Records `started_at` (the start of a run that just succeeded) as the project's high-water mark."""
+    update_project_state(jama_base_url_v2, project_api_id, path,
+                         high_water_mark=started_at.astimezone(timezone.utc).isoformat(),
+                         saved_at=datetime.now(timezone.utc).isoformat())
+
+
+def run_started():
+    """The timestamp to save as the high-water mark if the run now starting succeeds."""
+    return datetime.now(timezone.utc)
+
+
+class RunWatermark:
+    """
+    Tracks one run for incremental mode: `since` is the previous high-water mark (None when
+    incremental mode is off or the project has no successful run yet), and finish() advances the
+    mark to this run's start if the run covered the whole project without any failed step.
+    """
+
+    def __init__(self, jama_base_url_v2, project_api_id, incremental=False):
+        self.jama_base_url_v2 = jama_base_url_v2
+        self.project_api_id = project_api_id
+        self.since = load_high_water_mark(jama_base_url_v2, project_api_id) if incremental else None
+        self.started_at = run_started()
+        self.errors = 0
+        self._finished = False
+        progress_events.add_listener(self._on_event)
+
+    def _on_event(self, event):
+        if event.status == 'error':
+            with _lock:
+                self.errors += 1
+
+    def finish(self, complete=True):
+        """Saves the new high-water mark when `complete` and error-free; returns True if it was saved. Safe to call twice."""
+        if self._finished:
+            return False
+        self._finished = True
+        progress_events.remove_listener(self._on_event)
+        if not complete:
+            return False
+        if self.errors:
+            print(f"{self.errors} step(s) failed, so the incremental high-water mark was not advanced.")
+            return False
+        save_high_water_mark(self.jama_base_url_v2, self.project_api_id, self.started_at)
+        return True
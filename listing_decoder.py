@@ -0,0 +1,71 @@
+import io
+import json
+from incremental import DATE_FIELDS
+
+try:
+    import orjson
+except ImportError:  # Optional: faster whole-page decoder
+    orjson = None
+
+try:
+    import ijson
+    if ijson.backend not in ('yajl2_c', 'yajl2_cffi'):
+        ijson = None  # The pure-Python parser is slower than the stdlib; only a compiled backend pays off
+except ImportError:  # Optional: streaming decoder for large listing pages
+    ijson = None
+
+STREAM_MIN_BYTES = 256 * 1024  # Without orjson, pages from this size are streamed with ijson
+
+# The only parts of a listed item/attachment the workflows read; everything else (rich-text
+# descriptions, custom fields, locations, links) is dropped while the page is decoded
+KEEP_TOP = frozenset(('id', 'itemType', 'fileSize') + DATE_FIELDS)
+KEEP_FIELDS = frozenset(('name', 'filename', 'parent', 'fileSize') + DATE_FIELDS)
+
+if orjson is not None:
+    BACKEND = "orjson"
+elif ijson is not None:
+    BACKEND = f"json, ijson ({ijson.backend}) streaming for large pages"
+else:
+    BACKEND = "json"
+
+
+def slim(record):
+    """The fields of a listed record the workflows use."""
+    kept = {key: record[key] for key in KEEP_TOP if key in record}
+    fields = record.get('fields') or {}
+    kept['fields'] = {key: fields[key] for key in KEEP_FIELDS if key in fields}
+    return kept
+
+
+def _loads(body):
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+def decode_listing(body):
+    """
+    Decodes one listing page (bytes) into {'meta': ..., 'data': [slimmed records]}.
+
+    With orjson installed the page is parsed whole and slimmed afterwards, which is the fastest
+    way and still much lighter than the stdlib. Without it, large pages go through a compiled
+    ijson backend one record at a time, so their rich-text fields are never all in memory at
+    once (at roughly the stdlib's CPU cost); small pages are cheaper to parse whole.
+    """
+    if not body:
+        return {'meta': {}, 'data': []}
+    if orjson is not None or ijson is None or len(body) < STREAM_MIN_BYTES:
+        page = _loads(body)
+        data = page.get('data')
+        page['data'] = [slim(record) for record in data] if isinstance(data, list) else data
+        return page
+    stream = io.BytesIO(body)
+    # Jama puts 'meta' first, so this pass stops after a few hundred bytes
+    meta = next(ijson.items(stream, 'meta', use_float=True), {})
+    stream.seek(0)
+    return {'meta': meta, 'data': [slim(record) for record in ijson.items(stream, 'data.item', use_float=True)]}
+
+
+def get_listing(session, url, headers, params=None):
+    """GET one listing page through a requests session and decode it with decode_listing()."""
+    response = session.get(url, headers=headers, params=params)
+    response.raise_for_status()
+    return decode_listing(response.content)
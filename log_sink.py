@@ -0,0 +1,74 @@
+import os
+import time
+import threading
+from collections import deque
+
+LOG_DIR = os.path.join(os.path.expanduser("~"), "AttachmentUpdater", "logs")  # Writable even from the frozen exe
+MAX_PENDING_CHARS = 4 * 1024 * 1024  # Cap on text held between GUI flushes; the log file keeps everything
+
+
+class BufferedLogSink:
+    """
+    A thread-safe, file-like sink for print output.
+
+    Writes are appended to an in-memory buffer and streamed to the current run's log file.
+    The GUI drains the buffer on a timer instead of repainting once per print, and only the
+    newest MAX_PENDING_CHARS are kept between drains so a very chatty run can't grow memory
+    without bound.
+    """
+
+    def __init__(self, log_dir=LOG_DIR):
+        self.log_dir = log_dir
+        self.log_path = None
+        self._file = None
+        self._pending = deque()
+        self._pending_chars = 0
+        self._dropped_chars = 0
+        self._lock = threading.Lock()
+
+    def start_file(self, prefix="run"):
+        """Begins streaming every write to a new timestamped log file and returns its path."""
+        os.makedirs(self.log_dir, exist_ok=True)
+        path = os.path.join(self.log_dir, f"{prefix}_{time.strftime('%Y%m%d_%H%M%S')}.log")
+        with self._lock:
+            if self._file:
+                self._file.close()
+            self._file = open(path, 'w', encoding='utf-8', buffering=1024 * 1024)
+            self.log_path = path
+        return path
+
+    def close_file(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def write(self, text):
+        text = str(text)
+        with self._lock:
+            if self._file:
+                self._file.write(text)
+            self._pending.append(text)
+            self._pending_chars += len(text)
+            if self._pending_chars > MAX_PENDING_CHARS:
+                # Drop the oldest pending text; it is still in the log file
+                while self._pending_chars > MAX_PENDING_CHARS // 2 and len(self._pending) > 1:
+                    dropped = self._pending.popleft()
+                    self._pending_chars -= len(dropped)
+                    self._dropped_chars += len(dropped)
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            if self._file:
+                self._file.flush()
+
+    def drain(self):
+        """Returns (and clears) the text written since the last drain, plus how many characters were skipped."""
+        with self._lock:
+            text = ''.join(self._pending)
+            dropped = self._dropped_chars
+            self._pending = deque()
+            self._pending_chars = 0
+            self._dropped_chars = 0
+        return text, dropped
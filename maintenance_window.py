@@ -0,0 +1,238 @@
+import re
+import time
+import threading
+from datetime import datetime, timedelta
+from requests.adapters import BaseAdapter
+
+DAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+PAUSE_POLL_SECONDS = 60  # How often a paused run re-checks the clock
+MINUTES_PER_DAY = 24 * 60
+
+_TIME = re.compile(r"^(\d{1,2}):(\d{2})$")
+
+
+def _parse_minutes(text):
+    match = _TIME.match(text.strip())
+    if not match or int(match.group(1)) > 24 or int(match.group(2)) > 59:
+        raise ValueError(f"Invalid time '{text}', expected HH:MM")
+    minutes = int(match.group(1)) * 60 + int(match.group(2))
+    if minutes > MINUTES_PER_DAY:
+        raise ValueError(f"Invalid time '{text}'")
+    return minutes
+
+
+def _parse_days(text):
+    """'Mon-Fri', 'Sat,Sun', 'Mon-Wed,Fri' or 'daily'/'*' -> set of weekday numbers (Monday = 0)."""
+    text = text.strip().lower()
+    if text in ('daily', '*', 'all'):
+        return set(range(7))
+    days = set()
+    for part in text.split(','):
+        bounds = [b.strip()[:3] for b in part.split('-')]
+        if any(b not in DAY_NAMES for b in bounds) or len(bounds) > 2:
+            raise ValueError(f"Invalid days '{part}', expected e.g. Mon-Fri or Sat,Sun")
+        first, last = DAY_NAMES.index(bounds[0]), DAY_NAMES.index(bounds[-1])
+        day = first
+        days.add(day)
+        while day != last:  # Ranges may wrap, e.g. Fri-Mon
+            day = (day + 1) % 7
+            days.add(day)
+    return days
+
+
+class Window:
+    """
+    One recurring maintenance window, e.g. Mon-Fri 22:00-06:00, with optional budgets.
+    A window whose end is not after its start runs past midnight into the next day;
+    start == end means the whole day.
+    """
+
+    def __init__(self, days, start, end, rps=None, mbps=None):
+        self.days = days
+        self.start = start
+        self.end = end
+        self.rps = rps
+        self.mbps = mbps
+
+    def __repr__(self):
+        days = ','.join(DAY_NAMES[d].title() for d in sorted(self.days))
+        return f"{days} {self.start // 60:02d}:{self.start % 60:02d}-{self.end // 60:02d}:{self.end % 60:02d}"
+
+    def contains(self, moment):
+        minute = moment.hour * 60 + moment.minute
+        weekday = moment.weekday()
+        if self.start < self.end:
+            return weekday in self.days and self.start <= minute < self.end
+        return (weekday in self.days and minute >= self.start) or ((weekday - 1) % 7 in self.days and minute < self.end)
+
+    def next_start(self, moment):
+        """The first time at or after `moment` that this window opens."""
+        midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        for offset in range(8):
+            day = midnight + timedelta(days=offset)
+            candidate = day + timedelta(minutes=self.start)
+            if day.weekday() in self.days and candidate >= moment:
+                return candidate
+        return None
+
+    def closes_at(self, moment):
+        """When the occurrence of this window that contains `moment` closes."""
+        midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        minute = moment.hour * 60 + moment.minute
+        if self.start < self.end or minute < self.end:
+            return midnight + timedelta(minutes=self.end)
+        return midnight + timedelta(days=1, minutes=self.end)
+
+
+def parse_window(spec):
+    """
+    Parses a window from a string such as "Mon-Fri 22:00-06:00 rps=20 mbps=10" or a dict with
+    'days', 'start', 'end' and optional 'rps'/'mbps' keys (the form used in CLI config files).
+    """
+    if isinstance(spec, dict):
+        return Window(_parse_days(spec.get('days', 'daily')), _parse_minutes(spec['start']), _parse_minutes(spec['end']),
+                      spec.get('rps'), spec.get('mbps'))
+    parts = spec.split()
+    if len(parts) < 2 or '-' not in parts[1]:
+        raise ValueError(f"Invalid window '{spec}', expected e.g. 'Mon-Fri 22:00-06:00 rps=20 mbps=10'")
+    start, end = parts[1].split('-', 1)
+    budgets = {}
+    for token in parts[2:]:
+        key, _, value = token.partition('=')
+        if key.lower() not in ('rps', 'mbps') or not value:
+            raise ValueError(f"Invalid budget '{token}', expected rps=N or mbps=N")
+        budgets[key.lower()] = float(value)
+    return Window(_parse_days(parts[0]), _parse_minutes(start), _parse_minutes(end), budgets.get('rps'), budgets.get('mbps'))
+
+
+class MaintenanceSchedule:
+    """The set of windows in which a run may talk to the server (local time)."""
+
+    def __init__(self, windows):
+        self.windows = [w if isinstance(w, Window) else parse_window(w) for w in windows]
+        if not self.windows:
+            raise ValueError("A maintenance schedule needs at least one window.")
+
+    def active(self, moment):
+        """The window open at `moment`, or None."""
+        for window in self.windows:
+            if window.contains(moment):
+                return window
+        return None
+
+    def next_opening(self, moment):
+        starts = [s for s in (w.next_start(moment) for w in self.windows) if s is not None]
+        return min(starts) if starts else None
+
+
+class RateBudget:
+    """Thread-safe token bucket allowing `rate` units per second with up to one second of burst. None = unlimited."""
+
+    def __init__(self, rate=None):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self._tokens = rate or 0.0
+        self._updated = time.monotonic()
+
+    def set_rate(self, rate):
+        with self._lock:
+            if rate != self.rate:
+                self.rate = rate
+                self._tokens = min(self._tokens, rate) if rate else 0.0
+
+    def acquire(self, amount=1):
+        with self._lock:
+            if not self.rate:
+                return
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the tokens now and sleep off any debt outside the lock, so callers queue fairly
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class WindowGate:
+    """
+    Keeps a run inside its maintenance schedule and budgets.
+
+    The workflows call checkpoint() before each unit of work (a listing page, a download, an
+    item's upload/link/delete burst, the final rename). Inside a window it returns at once; when
+    the window has closed it blocks until the next one opens, so work in flight finishes and
+    nothing new starts. Requests made through a session passed to install() are throttled to
+    the active window's rps and MB/s budgets. With no schedule every method is a no-op.
+    """
+
+    def __init__(self, schedule=None, clock=datetime.now):
+        if schedule is not None and not isinstance(schedule, MaintenanceSchedule):
+            schedule = MaintenanceSchedule(schedule)
+        self.schedule = schedule
+        self.clock = clock
+        self.requests = RateBudget()
+        self.bytes = RateBudget()
+        self._lock = threading.Lock()
+        self._paused = False
+
+    def install(self, session):
+        """Routes the session's requests through the request/byte budgets."""
+        if self.schedule is None:
+            return
+        for prefix in ('https://', 'http://'):
+            # Wraps the session's transport (see transport.py) rather than replacing it
+            session.mount(prefix, BudgetAdapter(self, session.get_adapter(prefix)))
+        session.window_gate = self
+
+    def _apply_budgets(self, window):
+        self.requests.set_rate(window.rps)
+        self.bytes.set_rate(window.mbps * 1024 * 1024 if window.mbps else None)
+
+    def checkpoint(self, stop_event=None):
+        """Returns once a window is open (or straight away without a schedule or when stop_event is set)."""
+        if self.schedule is None:
+            return
+        while True:
+            now = self.clock()
+            window = self.schedule.active(now)
+            if window is not None:
+                self._apply_budgets(window)
+                with self._lock:
+                    if self._paused:
+                        self._paused = False
+                        print(f"\n▶️ Maintenance window {window} open until {window.closes_at(now):%a %H:%M}. Resuming.")
+                return
+            if stop_event is not None and stop_event.is_set():
+                return
+            opening = self.schedule.next_opening(now)
+            with self._lock:
+                if not self._paused:
+                    self._paused = True
+                    print(f"\n⏸️ Outside the maintenance windows. Pausing until {opening:%a %Y-%m-%d %H:%M}...")
+            time.sleep(max(1.0, min(PAUSE_POLL_SECONDS, (opening - now).total_seconds())))
+
+
+class BudgetAdapter(BaseAdapter):
+    """Adapter that takes a request token (and the upload body's bytes) from the gate's budgets, then sends through `transport`."""
+
+    def __init__(self, gate, transport):
+        super().__init__()
+        self.gate = gate
+        self.transport = transport
+
+    def send(self, request, **kwargs):
+        self.gate.requests.acquire()
+        body = request.body
+        if body:
+            self.gate.bytes.acquire(len(body) if isinstance(body, (bytes, str)) else 0)
+        return self.transport.send(request, **kwargs)
+
+    def close(self):
+        self.transport.close()
+
+
+def consume_bytes(session, amount):
+    """Charges downloaded bytes to the session's byte budget, if a gate is installed."""
+    gate = getattr(session, 'window_gate', None)
+    if gate is not None:
+        gate.bytes.acquire(amount)
@@ -0,0 +1,121 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from progress_events import track
+
+DEFAULT_CREATE_AHEAD = 8  # Placeholders created ahead of the upload workers
+SLOT_POLL_SECONDS = 0.5  # How often a producer waiting for a free slot re-checks for a stop
+
+
+def create_placeholder(session, jama_base_url_v2, project_api_id, attachment, headers):
+    """POST /projects/{id}/attachments for one renamed attachment; returns the new placeholder's ID."""
+    create_attachment_url = f"{jama_base_url_v2.rstrip('/')}/projects/{project_api_id}/attachments"
+    attachment_payload = {
+        "fields": {
+            "name": attachment['new_name'],
+            "description": "Attachment renamed and re-uploaded via API script."
+        }
+    }
+    with track('create', attachment_id=attachment['original_attachment_id'], item_id=attachment['item_id'], name=attachment['new_name']):
+        response = session.post(create_attachment_url, json=attachment_payload, headers=headers)
+        response.raise_for_status()
+        try:
+            response_data = response.json()
+            return response_data['meta']['id']
+        except KeyError:
+            # Only dump the raw response when it is needed to diagnose a problem
+            print("      - Raw JSON response:", json.dumps(response_data, indent=2))
+            raise Exception("Could not find attachment ID in the server response. Please inspect the raw JSON output above.")
+
+
+class PlaceholderPool:
+    """
+    Creates the placeholder attachments for the item workflow ahead of the upload workers, so the
+    blocking POST /projects/{id}/attachments is off each file's critical path.
+
+    A producer thread walks `attachments` in the order the upload workers will need them and
+    issues the creates concurrently, never more than `ahead` placeholders beyond what has been
+    handed out. take() returns an attachment's placeholder ID, waiting only if its create is still
+    in flight. Once `stop_event` is set no further placeholders are created; close() deletes any
+    that were created but never handed out, and lists the ones it could not delete.
+    """
+
+    def __init__(self, session, jama_base_url_v2, project_api_id, attachments, headers, ahead=DEFAULT_CREATE_AHEAD,
+                 workers=4, stop_event=None, checkpoint=None):
+        self.session = session
+        self.base = jama_base_url_v2.rstrip('/')
+        self.project_api_id = project_api_id
+        self.headers = headers
+        self.stop_event = stop_event or threading.Event()
+        self.checkpoint = checkpoint
+        self._order = list(attachments)
+        self._futures = {a['original_attachment_id']: Future() for a in self._order}
+        self._taken = set()
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(max(1, ahead))
+        self._closing = threading.Event()
+        self._creators = ThreadPoolExecutor(max_workers=max(1, min(workers, ahead)), thread_name_prefix="placeholder")
+        self._producer = threading.Thread(target=self._produce, name="placeholder-producer", daemon=True)
+        self._producer.start()
+
+    def _stopped(self):
+        return self.stop_event.is_set() or self._closing.is_set()
+
+    def _produce(self):
+        for position, attachment in enumerate(self._order):
+            while not self._slots.acquire(timeout=SLOT_POLL_SECONDS):
+                if self._stopped():
+                    break
+            if self._stopped():
+                for remaining in self._order[position:]:
+                    self._futures[remaining['original_attachment_id']].cancel()
+                return
+            if self.checkpoint:
+                self.checkpoint(self.stop_event)
+            self._creators.submit(self._create, attachment)
+
+    def _create(self, attachment):
+        future = self._futures[attachment['original_attachment_id']]
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(create_placeholder(self.session, self.base, self.project_api_id, attachment, self.headers))
+        except Exception as e:
+            future.set_exception(e)
+
+    def take(self, attachment):
+        """The placeholder ID created for `attachment` (waits for its create; raises if it failed or was cancelled)."""
+        key = attachment['original_attachment_id']
+        future = self._futures[key]
+        try:
+            return future.result()
+        finally:
+            with self._lock:
+                if key not in self._taken:
+                    self._taken.add(key)
+                    self._slots.release()
+
+    def close(self):
+        """Stops producing, waits for creates in flight and deletes the placeholders nobody took."""
+        self._closing.set()
+        self._producer.join()
+        self._creators.shutdown(wait=True)
+        with self._lock:
+            leftovers = [future.result() for key, future in self._futures.items()
+                         if key not in self._taken and future.done() and not future.cancelled() and future.exception() is None]
+        if not leftovers:
+            return []
+
+        print(f"\nRemoving {len(leftovers)} unused placeholder attachment(s)...")
+        remaining = []
+        for placeholder_id in leftovers:
+            try:
+                with track('delete', attachment_id=placeholder_id, name="unused placeholder"):
+                    response = self.session.delete(f"{self.base}/items/{placeholder_id}", headers=self.headers)
+                    response.raise_for_status()
+            except Exception as e:
+                print(f"   - Failed to delete unused placeholder attachment ID {placeholder_id}. Error: {e}")
+                remaining.append(placeholder_id)
+        if remaining:
+            print(f"   - Please delete these unused placeholder attachments manually: {', '.join(map(str, remaining))}")
+        return remaining
@@ -0,0 +1,139 @@
+import time
+import threading
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QTableView, QHeaderView, QAbstractItemView
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+from progress_events import ProgressStats
+
+STAGE_ORDER = ('list', 'download', 'optimize', 'create', 'upload', 'link', 'delete', 'rename')
+
+
+class ProgressTableModel(QAbstractTableModel):
+    """
+    Table model over the run's progress events.
+    QTableView only asks for the rows on screen, so this stays fast with 100k+ events.
+    """
+    COLUMNS = ("Time", "Stage", "Status", "Attachment", "Item", "Name", "MB", "Seconds")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.events = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.events)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        event = self.events[index.row()]
+        column = index.column()
+        if column == 0:
+            return time.strftime('%H:%M:%S', time.localtime(event.timestamp))
+        if column == 1:
+            return event.stage
+        if column == 2:
+            return event.status
+        if column == 3:
+            return "" if event.attachment_id is None else str(event.attachment_id)
+        if column == 4:
+            return "" if event.item_id is None else str(event.item_id)
+        if column == 5:
+            return event.message if event.status == 'error' else (event.name or "")
+        if column == 6:
+            return f"{event.bytes / (1024 * 1024):.2f}" if event.bytes else ""
+        return f"{event.duration:.2f}" if event.duration else ""
+
+    def append_events(self, events):
+        """Adds a batch of events with a single row-insert notification."""
+        if not events:
+            return
+        first = len(self.events)
+        self.beginInsertRows(QModelIndex(), first, first + len(events) - 1)
+        self.events.extend(events)
+        self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.events = []
+        self.endResetModel()
+
+
+class ProgressDashboard(QWidget):
+    """
+    Live per-stage counters, throughput, error count and ETA above a table of every progress event.
+    Events arrive from the worker thread through event_received() and are applied in batches by refresh(),
+    which the GUI calls from its readout timer.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pending = []
+        self._lock = threading.Lock()
+        self.stats = ProgressStats()
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.summary_label = QLabel("No run in progress.")
+        self.summary_label.setTextFormat(Qt.TextFormat.PlainText)
+        layout.addWidget(self.summary_label)
+
+        self.model = ProgressTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().hide()
+        # Fixed row heights let the view skip measuring rows it never draws
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(20)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.setMinimumHeight(150)
+        layout.addWidget(self.table)
+        self.setLayout(layout)
+
+    def reset(self):
+        with self._lock:
+            self._pending = []
+        self.stats = ProgressStats()
+        self.model.clear()
+        self.summary_label.setText("Starting...")
+
+    def event_received(self, event):
+        """progress_events listener; called from the worker thread, so it only queues the event."""
+        with self._lock:
+            self._pending.append(event)
+
+    def refresh(self):
+        with self._lock:
+            events, self._pending = self._pending, []
+        if events:
+            for event in events:
+                self.stats.add(event)
+            scrollbar = self.table.verticalScrollBar()
+            at_bottom = scrollbar.value() >= scrollbar.maximum()
+            self.model.append_events([e for e in events if e.status != 'planned'])
+            if at_bottom:
+                self.table.scrollToBottom()
+        if self.stats.planned:
+            self.summary_label.setText(self.summary_text())
+
+    def summary_text(self):
+        stats = self.stats
+        stages = [s for s in STAGE_ORDER if s in stats.planned] + [s for s in stats.planned if s not in STAGE_ORDER]
+        counters = "   ".join(f"{stage}: {stats.done.get(stage, 0)}/{stats.planned[stage]}" for stage in stages)
+        steps_per_second, megabytes_per_second = stats.rates()
+        eta = stats.eta_seconds()
+        if eta is None:
+            eta_text = "--"
+        else:
+            hours, remainder = divmod(int(eta), 3600)
+            eta_text = f"{hours}:{remainder // 60:02d}:{remainder % 60:02d}"
+        return (f"{counters}\n"
+                f"{steps_per_second:.1f} requests/s   {megabytes_per_second:.2f} MB/s   "
+                f"errors: {stats.error_count()}   ETA: {eta_text}")
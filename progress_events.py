@@ -0,0 +1,149 @@
+import sys
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+RATE_WINDOW_SECONDS = 10  # Rolling window used for the live requests/sec and MB/s figures
+QUIET_STAGES = {'list', 'verify'}  # High-volume discovery and verification stages the console listener doesn't print
+
+
+@dataclass
+class ProgressEvent:
+    """
+    One structured progress update from the update functions.
+
+    status is 'planned' (count says how many of this stage are expected), 'ok', 'error' or 'skipped'.
+    """
+    stage: str
+    status: str
+    attachment_id: object = None
+    item_id: object = None
+    name: str = None
+    bytes: int = 0
+    duration: float = 0.0
+    count: int = 1
+    message: str = ''
+    timestamp: float = field(default_factory=time.time)
+
+
+def format_event(event):
+    """Formats an event as a single readout line."""
+    if event.status == 'planned':
+        size = f" ({event.bytes / (1024 * 1024):.1f} MB)" if event.bytes else ""
+        return f"   - [{event.stage}] {event.count} planned{size}"
+    target = f"'{event.name}'" if event.name else f"ID {event.attachment_id}"
+    line = f"   - [{event.stage}] {event.status} {target}"
+    if event.item_id is not None:
+        line += f" on item {event.item_id}"
+    if event.bytes:
+        line += f", {event.bytes / (1024 * 1024):.2f} MB"
+    if event.duration:
+        line += f" in {event.duration:.2f} s"
+    if event.message:
+        line += f" - {event.message}"
+    return line
+
+
+def print_event(event):
+    """Default listener: prints successful and skipped steps. Failures are printed in detail by the workflows themselves."""
+    if event.status != 'error' and (event.stage not in QUIET_STAGES or event.status == 'planned'):
+        # One write per line so output from parallel workers doesn't interleave mid-line
+        sys.stdout.write(format_event(event) + "\n")
+
+
+_listeners = [print_event]
+_listeners_lock = threading.Lock()
+
+
+def add_listener(listener):
+    with _listeners_lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+def remove_listener(listener):
+    with _listeners_lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def emit(stage, status, **details):
+    """Sends a ProgressEvent to every registered listener. Safe to call from worker threads."""
+    event = ProgressEvent(stage=stage, status=status, **details)
+    with _listeners_lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        listener(event)
+    return event
+
+
+def emit_plan(stage, count, total_bytes=0):
+    """Announces how much work a stage will do, so listeners can compute an ETA."""
+    return emit(stage, 'planned', count=count, bytes=total_bytes)
+
+
+@contextmanager
+def track(stage, **details):
+    """
+    Times the enclosed block and emits an 'ok' or 'error' event for it.
+    Set result['bytes'] inside the block to report the bytes moved.
+    """
+    result = {'bytes': 0}
+    start = time.perf_counter()
+    try:
+        yield result
+    except Exception as e:
+        emit(stage, 'error', duration=time.perf_counter() - start, message=str(e), **details)
+        raise
+    emit(stage, 'ok', duration=time.perf_counter() - start, bytes=result['bytes'], **details)
+
+
+class ProgressStats:
+    """Aggregates events into per-stage counters, live throughput and an ETA."""
+
+    def __init__(self):
+        self.planned = {}
+        self.done = {}
+        self.errors = {}
+        self.bytes_done = 0
+        self.started = time.time()
+        self._recent = deque()  # (timestamp, bytes) of completed steps inside the rate window
+
+    def add(self, event):
+        if event.status == 'planned':
+            self.planned[event.stage] = self.planned.get(event.stage, 0) + event.count
+            return
+        if event.status == 'error':
+            self.errors[event.stage] = self.errors.get(event.stage, 0) + 1
+        else:
+            self.done[event.stage] = self.done.get(event.stage, 0) + 1
+        self.bytes_done += event.bytes
+        self._recent.append((event.timestamp, event.bytes))
+
+    def _trim(self, now):
+        while self._recent and self._recent[0][0] < now - RATE_WINDOW_SECONDS:
+            self._recent.popleft()
+
+    def rates(self, now=None):
+        """Returns (steps per second, MB per second) over the rolling window."""
+        now = now or time.time()
+        self._trim(now)
+        window = min(RATE_WINDOW_SECONDS, max(now - self.started, 1e-6))
+        steps = len(self._recent) / window
+        megabytes = sum(b for _, b in self._recent) / (1024 * 1024) / window
+        return steps, megabytes
+
+    def eta_seconds(self, now=None):
+        """Seconds until every planned step is finished at the current rate, or None if unknown."""
+        remaining = sum(max(self.planned[s] - self.done.get(s, 0) - self.errors.get(s, 0), 0) for s in self.planned)
+        steps_per_second, _ = self.rates(now)
+        if remaining == 0:
+            return 0
+        if steps_per_second <= 0:
+            return None
+        return remaining / steps_per_second
+
+    def error_count(self):
+        return sum(self.errors.values())
@@ -0,0 +1,104 @@
+import os
+import re
+from verify_run import RECORD_DIR, load_record
+from scheduler import metadata_size
+from incremental import STATE_PATH, load_project_state, update_project_state
+
+# The workflows name each renamed attachment <prefix><base>_<suffix><extension>, the suffix being
+# at least five digits (_00001); the extension may be missing on project attachments
+SUFFIX_PATTERN = r'_(?P<suffix>\d{5,})(?P<ext>\.[^.]*)?$'
+
+
+def _suffix(name):
+    match = re.search(SUFFIX_PATTERN, name or '')
+    return int(match['suffix']) if match else 0
+
+
+def _recorded(record_dir, project_api_id):
+    """
+    From every run record kept for this project: {attachment ID: name given}, and {original ID:
+    entry} for the item workflow's copies, whose entries name the original they replace.
+    """
+    names, copies = {}, {}
+    if not os.path.isdir(record_dir):
+        return names, copies
+    for file_name in sorted(os.listdir(record_dir)):
+        if file_name.startswith(f"run_project{project_api_id}_") and file_name.endswith(".jsonl"):
+            try:
+                entries = load_record(os.path.join(record_dir, file_name))
+                names.update({entry['attachment_id']: entry['new_name'] for entry in entries})
+                copies.update({entry['original_attachment_id']: entry for entry in entries
+                               if entry['workflow'] == 'item' and entry.get('original_attachment_id') is not None})
+            except (OSError, ValueError, KeyError):
+                continue  # An unreadable record only means fewer attachments are recognised
+    return names, copies
+
+
+class RenameIndex:
+    """
+    The attachments earlier runs already renamed, recognised in the listing a workflow has just
+    fetched, so a re-run skips them without a single extra request.
+
+    An attachment counts as renamed when its name is `custom_prefix` + base + _NNNNN + extension
+    (the names the workflows give), or when a run record of this project (verify_run.RunRecord)
+    lists its ID with the name it still carries, which also covers runs made with another prefix.
+    With an empty prefix, an original already named like image_00001.png is taken as renamed.
+    A name alone never proves an original was copied, though: see copy_of().
+
+    New suffixes continue after the highest one among the renamed attachments listed, or saved by
+    an earlier run against this instance (run_state.json), so scoped and incremental runs that list
+    only part of the project never hand out a number again. Run records are not tied to an
+    instance, so an ID in them only counts once the listing shows it with the recorded name.
+    """
+
+    def __init__(self, jama_base_url_v2, project_api_id, custom_prefix, record_dir=RECORD_DIR, state_path=STATE_PATH):
+        self.jama_base_url_v2 = jama_base_url_v2
+        self.project_api_id = project_api_id
+        self.state_path = state_path
+        self.pattern = re.compile(re.escape(custom_prefix) + r'(?P<base>.+)' + SUFFIX_PATTERN)
+        self.recorded, self.recorded_copies = _recorded(record_dir, project_api_id)
+        self.saved = load_project_state(jama_base_url_v2, project_api_id, state_path).get('highest_suffix', 0)
+        self.highest = self.saved
+        self.renamed = set()
+        self._listed = {}  # ID -> listed record of each attachment taken as renamed
+
+    def scan(self, attachments):
+        """Indexes the renamed attachments among those just listed; returns self."""
+        for attachment in attachments:
+            name = attachment['fields'].get('name') or ''
+            match = self.pattern.match(name)
+            if match is None and self.recorded.get(attachment['id']) != name:
+                continue
+            self.renamed.add(attachment['id'])
+            self._listed[attachment['id']] = attachment
+            self.highest = max(self.highest, _suffix(name))
+        if self.renamed:
+            print(f"Skipping {len(self.renamed)} attachments already renamed by an earlier run (highest suffix in use: _{self.highest:05d}).")
+        return self
+
+    def __contains__(self, attachment_id):
+        return attachment_id in self.renamed
+
+    def next_suffix(self, start=1):
+        """The first suffix to hand out: `start`, unless an earlier run already used it."""
+        return max(start, self.highest + 1)
+
+    def copy_of(self, attachment):
+        """
+        The name of the copy an earlier run made of this item attachment (a run stopped between
+        linking the copy and deleting the original), or None. Only a run record entry linking the
+        copy's ID to this original's ID counts, and only while that copy is listed on the same item
+        with the recorded name and file size; anything less and the original is copied again.
+        """
+        entry = self.recorded_copies.get(attachment['id'])
+        copy = self._listed.get(entry['attachment_id']) if entry else None
+        if (copy is None or copy.get('parent_item_id') != attachment['parent_item_id']
+                or copy['fields'].get('name') != entry['new_name'] or metadata_size(copy) != entry['size']):
+            return None
+        return entry['new_name']
+
+    def save(self, last_suffix):
+        """Remembers the highest suffix handed out, once the names are assigned (not on dry runs)."""
+        if last_suffix > self.saved:
+            update_project_state(self.jama_base_url_v2, self.project_api_id, self.state_path, highest_suffix=last_suffix)
+            self.saved = last_suffix
@@ -0,0 +1,176 @@
+import os
+import io
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from log_sink import LOG_DIR
+import progress_events
+
+TOP_ALLOCATORS = 10  # Allocation sites listed per phase boundary
+TOP_FUNCTIONS = 30  # Functions listed from the cProfile data
+# From 3.12 cProfile runs on sys.monitoring, which allows one active profiler per interpreter
+PER_THREAD_PROFILES = sys.version_info < (3, 12)
+
+
+class RunProfiler:
+    """
+    Optional profiling for one workflow run.
+
+    When enabled it records wall and CPU time per phase, samples tracemalloc at every phase
+    boundary, sums per-stage busy time from the progress events (upload, link and delete are
+    interleaved per item, so their totals are summed across workers), and, if `cprofile` is set,
+    runs cProfile in every thread the run starts (on Python 3.12+, where only one profiler may be
+    active, in the calling thread only). write_report() saves a text report, plus a .pstats dump
+    when cProfile was used, in `report_dir` (next to the run logs by default).
+    When disabled every method is a cheap no-op.
+    """
+
+    def __init__(self, enabled=False, name="run", report_dir=LOG_DIR, cprofile=True):
+        self.enabled = enabled
+        self.name = name
+        self.report_dir = report_dir or LOG_DIR
+        self.cprofile = enabled and cprofile
+        self.phases = []
+        self._current_phase = None
+        self.memory = []
+        self.stage_busy = {}
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._previous_snapshot = None
+        self._started_tracemalloc = False
+        self._stopped = False
+        self._report_path = None
+
+    def start(self):
+        if not self.enabled:
+            return self
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._previous_snapshot = tracemalloc.take_snapshot()
+        progress_events.add_listener(self._on_event)
+        if self.cprofile:
+            try:
+                self._enable_profile()
+            except ValueError as e:  # 3.12+: a debugger or coverage tool already holds the profiler slot
+                print(f"cProfile not started: {e}")
+                self.cprofile = False
+        if self.cprofile and PER_THREAD_PROFILES:
+            # Worker threads started from now on bootstrap their own profiler on their first call
+            threading.setprofile(self._bootstrap_thread)
+        return self
+
+    def _enable_profile(self):
+        profile = cProfile.Profile()
+        profile.enable()
+        with self._lock:
+            self._profiles.append(profile)
+
+    def _bootstrap_thread(self, frame, event, arg):
+        try:
+            self._enable_profile()
+        except Exception:
+            sys.setprofile(None)  # Never fail the thread over profiling; it just goes unprofiled
+
+    def _on_event(self, event):
+        if event.duration:
+            with self._lock:
+                self.stage_busy[event.stage] = self.stage_busy.get(event.stage, 0.0) + event.duration
+
+    def mark(self, name):
+        """Ends the current phase (timing it and snapshotting memory) and starts the phase `name`."""
+        if not self.enabled:
+            return
+        self._end_phase()
+        self._current_phase = (name, time.perf_counter(), time.process_time())
+
+    def _end_phase(self):
+        if self._current_phase is None:
+            return
+        name, wall_start, cpu_start = self._current_phase
+        self._current_phase = None
+        self.phases.append((name, time.perf_counter() - wall_start, time.process_time() - cpu_start))
+        self._snapshot_memory(name)
+
+    def _snapshot_memory(self, phase_name):
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        current, peak = tracemalloc.get_traced_memory()
+        growth = snapshot.compare_to(self._previous_snapshot, 'lineno')[:TOP_ALLOCATORS] if self._previous_snapshot else []
+        self.memory.append({
+            'phase': phase_name,
+            'current': current,
+            'peak': peak,
+            'top': snapshot.statistics('lineno')[:TOP_ALLOCATORS],
+            'growth': growth,
+        })
+        self._previous_snapshot = snapshot
+
+    def stop(self):
+        if not self.enabled or self._stopped:
+            return
+        self._stopped = True
+        self._end_phase()
+        progress_events.remove_listener(self._on_event)
+        if self.cprofile:
+            threading.setprofile(None)
+            with self._lock:
+                profiles = list(self._profiles)
+            for profile in profiles:
+                profile.disable()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def write_report(self):
+        """Writes the report (and .pstats dump) once and returns the report path, or None when disabled."""
+        if not self.enabled or self._report_path:
+            return self._report_path
+        self.stop()
+        os.makedirs(self.report_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        report_path = os.path.join(self.report_dir, f"profile_{self.name}_{stamp}.txt")
+        out = io.StringIO()
+
+        out.write(f"Profile report: {self.name} ({stamp})\n\n")
+        out.write(f"{'phase':<20}{'wall s':>10}{'cpu s':>10}{'cpu %':>8}\n")
+        for name, wall, cpu in self.phases:
+            out.write(f"{name:<20}{wall:>10.2f}{cpu:>10.2f}{(cpu / wall * 100 if wall else 0):>8.0f}\n")
+
+        if self.stage_busy:
+            out.write("\nBusy time per stage, summed across workers:\n")
+            for stage, seconds in sorted(self.stage_busy.items(), key=lambda kv: -kv[1]):
+                out.write(f"   {stage:<17}{seconds:>10.2f} s\n")
+
+        for entry in self.memory:
+            out.write(f"\nMemory after '{entry['phase']}': current {entry['current'] / (1024 * 1024):.1f} MB, "
+                      f"peak {entry['peak'] / (1024 * 1024):.1f} MB\n")
+            out.write("   Top allocators:\n")
+            for stat in entry['top']:
+                out.write(f"      {stat}\n")
+            if entry['growth']:
+                out.write("   Largest changes since the previous phase:\n")
+                for stat in entry['growth']:
+                    out.write(f"      {stat}\n")
+
+        with self._lock:
+            profiles = list(self._profiles)
+        if profiles:
+            stats = pstats.Stats(profiles[0], stream=out)
+            for profile in profiles[1:]:
+                stats.add(profile)
+            pstats_path = os.path.join(self.report_dir, f"profile_{self.name}_{stamp}.pstats")
+            stats.dump_stats(pstats_path)
+            out.write(f"\ncProfile ({len(profiles)} threads, full data in {pstats_path}):\n")
+            stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+
+        with open(report_path, 'w', encoding='utf-8') as f:
+            f.write(out.getvalue())
+        print(f"Profile report written to {report_path}")
+        self._report_path = report_path
+        return report_path
@@ -0,0 +1,141 @@
+import time
+import requests
+from progress_events import emit, emit_plan
+from listing_decoder import get_listing
+
+JSON_HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+
+
+def parse_id_list(value):
+    """'12, 15,20' or [12, '15'] -> [12, 15, 20]."""
+    if value is None or value == '':
+        return []
+    if isinstance(value, (int, str)):
+        value = str(value).split(',')
+    return [int(str(v).strip()) for v in value if str(v).strip()]
+
+
+class RunScope:
+    """
+    The part of a project a run covers. With nothing set the run covers the whole project.
+
+    locations: item IDs of folders/sets/components; each is included with everything below it.
+    item_ids: individual items to include.
+    item_types: item type IDs; on their own they select every item of those types in the project,
+        combined with locations/item_ids they filter that selection.
+    """
+
+    def __init__(self, locations=None, item_types=None, item_ids=None):
+        self.locations = parse_id_list(locations)
+        self.item_types = parse_id_list(item_types)
+        self.item_ids = parse_id_list(item_ids)
+
+    @property
+    def whole_project(self):
+        return not (self.locations or self.item_types or self.item_ids)
+
+    def describe(self):
+        if self.whole_project:
+            return "the whole project"
+        parts = []
+        if self.locations:
+            parts.append(f"subtrees of {', '.join(map(str, self.locations))}")
+        if self.item_ids:
+            parts.append(f"items {', '.join(map(str, self.item_ids))}")
+        if self.item_types:
+            parts.append(f"item types {', '.join(map(str, self.item_types))}")
+        return "; ".join(parts)
+
+
+def paged(session, url, params, page_size, headers=JSON_HEADERS, checkpoint=None):
+    """Yields every record of a paged Jama listing, following nextLink like the update functions do."""
+    page = 1
+    while url:
+        if checkpoint:
+            checkpoint()
+        data = get_listing(session, url, headers, dict(params, startAt=(page - 1) * page_size, maxResults=page_size))
+        yield from data['data']
+        if 'nextLink' in data['meta']:
+            url = data['meta']['nextLink']
+            page += 1
+        else:
+            url = None
+
+
+def _fetch_item(session, base, item_id, headers, checkpoint):
+    """GET /items/{id}, or None (with a warning) if the item does not exist."""
+    if checkpoint:
+        checkpoint()
+    response = session.get(f"{base}/items/{item_id}", headers=headers)
+    if response.status_code == 404:
+        print(f"Warning: Item ID {item_id} was not found and has been left out of the run.")
+        return None
+    response.raise_for_status()
+    return response.json()['data']
+
+
+def discover_items(session, jama_base_url_v2, project_api_id, scope, page_size, headers=JSON_HEADERS, checkpoint=None):
+    """
+    Returns the items in scope, walking only the selected subtrees (/items/{id}/children) so the
+    cost follows the size of the scope rather than the project. Explicit item IDs cost nothing
+    unless item types also have to be checked.
+    """
+    base = jama_base_url_v2.rstrip('/')
+    if not scope.locations and not scope.item_ids:
+        # Item types alone: let the server filter
+        items = {}
+        for item_type in scope.item_types:
+            for item in paged(session, f"{base}/abstractitems", {"project": project_api_id, "itemType": item_type}, page_size, headers, checkpoint):
+                items[item['id']] = item
+        return list(items.values())
+
+    items = {}
+    for item_id in scope.item_ids:
+        items[item_id] = {'id': item_id}
+
+    pending = list(scope.locations)
+    while pending:
+        parent_id = pending.pop()
+        if parent_id not in items or 'itemType' not in items[parent_id]:
+            item = _fetch_item(session, base, parent_id, headers, checkpoint)
+            if item is None:
+                items.pop(parent_id, None)
+                continue
+            items[parent_id] = item
+        for child in paged(session, f"{base}/items/{parent_id}/children", {}, page_size, headers, checkpoint):
+            if child['id'] not in items or 'itemType' not in items[child['id']]:
+                items[child['id']] = child
+                pending.append(child['id'])
+
+    if scope.item_types:
+        wanted = set(scope.item_types)
+        for item_id in list(items):
+            if 'itemType' not in items[item_id]:
+                items[item_id] = _fetch_item(session, base, item_id, headers, checkpoint)
+        return [item for item in items.values() if item is not None and item['itemType'] in wanted]
+    return list(items.values())
+
+
+def list_item_attachments(session, jama_base_url_v2, items, headers=JSON_HEADERS, checkpoint=None):
+    """Fetches the attachments of each item, tagging each with 'parent_item_id'. Items without any (404) are skipped."""
+    base = jama_base_url_v2.rstrip('/')
+    attachments = []
+    emit_plan('list', len(items))
+    for item in items:
+        if checkpoint:
+            checkpoint()
+        item_id = item['id']
+        started = time.perf_counter()
+        try:
+            item_attachments = get_listing(session, f"{base}/items/{item_id}/attachments", headers).get('data', [])
+            for att in item_attachments:
+                att['parent_item_id'] = item_id
+            attachments.extend(item_attachments)
+            emit('list', 'ok', item_id=item_id, name=f"{len(item_attachments)} attachments", duration=time.perf_counter() - started)
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code != 404:
+                print(f"Failed to fetch attachments for item ID {item_id}. Error: {e}")
+                emit('list', 'error', item_id=item_id, message=str(e))
+            else:
+                emit('list', 'skipped', item_id=item_id, name="no attachments")
+    return attachments
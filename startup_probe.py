@@ -0,0 +1,42 @@
+import os
+import sys
+import json
+import time
+
+STARTUP_REPORT_ENV = "ATTACHMENT_UPDATER_STARTUP_REPORT"
+# Modules that belong to the Run button; none of them should be loaded before the window paints
+DEFERRED_MODULES = ('requests', 'aiohttp', 'PIL', 'orjson', 'ijson', 'numpy', 'pandas',
+                    'function_item', 'function_project', 'async_engine', 'autotune', 'verify_run')
+
+
+class StartupProbe:
+    """
+    Startup timing for benchmarks/bench_startup.py. It does nothing unless the environment
+    variable ATTACHMENT_UPDATER_STARTUP_REPORT names a file. In that case, when the window first
+    paints, it writes the startup marks (time.perf_counter() values, comparable with the
+    launching process's on the same machine) and the deferred modules that were already loaded,
+    then quits the app.
+    """
+
+    def __init__(self, started):
+        self.path = os.environ.get(STARTUP_REPORT_ENV)
+        self.marks = {'started': started, 'imported': time.perf_counter()}
+
+    def mark(self, name):
+        if self.path:
+            self.marks[name] = time.perf_counter()
+
+    def first_paint(self, app=None):
+        if not self.path or 'first_paint' in self.marks:
+            return
+        self.mark('first_paint')
+        report = {
+            'frozen': bool(getattr(sys, 'frozen', False)),
+            'marks': self.marks,
+            'seconds': {name: round(value - self.marks['started'], 4) for name, value in self.marks.items()},
+            'deferred_loaded': [name for name in DEFERRED_MODULES if name in sys.modules],
+        }
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        if app is not None:
+            app.quit()
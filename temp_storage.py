@@ -0,0 +1,121 @@
+import os
+import time
+import threading
+from log_sink import LOG_DIR
+
+TEMP_LOCATION = os.path.dirname(LOG_DIR)  # Writable even from the frozen exe, unlike the script directory
+TEMP_DIR_NAME = "temp_renamed_attachments"
+WAIT_POLL_SECONDS = 1.0  # How often a download waiting for space re-checks for a stop
+
+
+class TempStorage:
+    """
+    The directory the workflows download into, with an optional byte quota. It is always a
+    'temp_renamed_attachments' folder inside `location` (e.g. a tmpfs or scratch volume), so
+    cleanup() only ever removes the updater's own files.
+
+    reserve() claims space for the files about to be downloaded and blocks while that would take
+    the directory past `quota_bytes`, so downloads pause instead of filling the disk; a reservation
+    is always granted when nothing else is held, so one oversized item can't stall a run.
+    Reservations given a `turn` are granted strictly in turn order, for callers that need the space
+    in the order some other resource is handed out (see function_item's placeholder pool). With
+    `evict` set, evict() deletes a file as soon as the workflow no longer needs it (uploaded, and
+    archived when a backup is running) and frees its space. Without eviction files are kept
+    until cleanup(), so a quota can't free any space and is not enforced.
+    """
+
+    def __init__(self, location=None, quota_bytes=None, evict=False):
+        self.directory = os.path.join(location or TEMP_LOCATION, TEMP_DIR_NAME)
+        os.makedirs(self.directory, exist_ok=True)
+        self.evicting = evict or bool(quota_bytes)
+        if quota_bytes and not evict:
+            print("A temp storage quota is set, so each download is deleted as soon as it has been uploaded.")
+        self.quota = quota_bytes
+        self.used = 0
+        self.peak = 0
+        self._held = {}  # key -> bytes reserved for it
+        self._paths = {}  # key -> files written for it
+        self._condition = threading.Condition()
+        self._next_turn = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def reserve(self, sizes, stop_event=None, turn=None):
+        """
+        Reserves space for several files at once ({key: expected bytes}); returns False if
+        stop_event was set while waiting. Reserving a whole item at a time means workers never
+        hold part of a quota while waiting for the rest. With `turn` (0, 1, 2...) it also waits
+        until every earlier turn has been granted.
+        """
+        wanted = sum(size or 0 for size in sizes.values())
+        with self._condition:
+            started = None
+            while True:
+                full = self.quota and self.used and self.used + wanted > self.quota
+                if not full and (turn is None or turn == self._next_turn):
+                    break
+                if stop_event is not None and stop_event.is_set():
+                    return False
+                if full and started is None:
+                    started = time.perf_counter()
+                    self.waits += 1
+                    if self.waits == 1:
+                        # Printed once: with a tight quota, waiting becomes the normal state
+                        print(f"\n⏸️ Temp storage quota reached ({self.used / (1024 * 1024):.1f} of {self.quota / (1024 * 1024):.1f} MB). "
+                              "Downloads now wait for uploads to free space.")
+                self._condition.wait(WAIT_POLL_SECONDS)
+            if started is not None:
+                self.wait_seconds += time.perf_counter() - started
+            for key, size in sizes.items():
+                self._held[key] = self._held.get(key, 0) + (size or 0)
+            self._grow(wanted)
+            if turn is not None:
+                self._next_turn += 1
+                self._condition.notify_all()
+        return True
+
+    def _grow(self, amount):
+        self.used += amount
+        self.peak = max(self.peak, self.used)
+
+    def account(self, key, file_path, estimate=0):
+        """Records a file written for `key`, correcting its reservation by the file's real size minus `estimate`."""
+        size = os.path.getsize(file_path)
+        with self._condition:
+            self._paths.setdefault(key, []).append(file_path)
+            self._held[key] = self._held.get(key, 0) + size - (estimate or 0)
+            self._grow(size - (estimate or 0))
+
+    def evict(self, key):
+        """Deletes the files written for `key` (when evicting) and frees its space."""
+        with self._condition:
+            paths = self._paths.pop(key, [])
+            held = self._held.pop(key, 0)
+            if not self.evicting:
+                self._paths[key] = paths  # Kept for cleanup(); the space stays used
+                self._held[key] = held
+                return
+        for file_path in paths:
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"   - Could not delete temporary file {file_path}. Error: {e}")
+        with self._condition:
+            self.used -= held
+            self._condition.notify_all()
+
+    def release(self, key):
+        """Frees a reservation that was never used (e.g. a failed download) without touching any file."""
+        with self._condition:
+            self.used -= self._held.pop(key, 0)
+            self._condition.notify_all()
+
+    def report(self):
+        quota = f" of a {self.quota / (1024 * 1024):.1f} MB quota" if self.quota else ""
+        waited = f"; downloads waited for space {self.waits} time(s), {self.wait_seconds:.1f} s in total" if self.waits else ""
+        print(f"Temp storage: peak {self.peak / (1024 * 1024):.1f} MB{quota} in {self.directory}{waited}.")
@@ -0,0 +1,53 @@
+"""
+RunProfiler with cProfile on, around a short thread pool job like the workflows run. On Python
+3.12+ only one profiler may be active at a time, so worker threads must neither fail to start
+nor hang the run.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from run_profiler import RunProfiler
+
+
+def square(x):
+    return x * x
+
+
+def test_pool_job_with_profiling(tmp_path):
+    profiler = RunProfiler(True, "pool", str(tmp_path)).start()
+    try:
+        profiler.mark('pool')
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(square, x) for x in range(200)]
+            assert sum(f.result(timeout=10) for f in futures) == sum(x * x for x in range(200))
+    finally:
+        report_path = profiler.write_report()
+    assert os.path.isfile(report_path)
+    assert os.path.isfile(report_path[:-len('.txt')] + '.pstats')
+    assert sys.getprofile() is None
+
+
+def test_thread_hook_never_raises(tmp_path, monkeypatch):
+    profiler = RunProfiler(True, "hook", str(tmp_path), cprofile=False)
+
+    def refuse():
+        raise ValueError("Another profiling tool is already active")
+    monkeypatch.setattr(profiler, '_enable_profile', refuse)
+    results = []
+
+    def work():
+        sys.setprofile(profiler._bootstrap_thread)
+        results.append(square(3))  # The first call runs the hook
+        results.append(sys.getprofile())
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join(timeout=10)
+    assert results == [9, None]
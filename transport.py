@@ -0,0 +1,202 @@
+import os
+import ssl
+import importlib.util
+import time
+import threading
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter, DEFAULT_POOLSIZE
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, DEFAULT_CA_BUNDLE_PATH
+from scheduler import DEFAULT_MAX_WORKERS
+from http_metrics import record_retry
+
+try:
+    import httpx
+    if importlib.util.find_spec('h2') is None:  # httpx only speaks HTTP/2 with h2 installed
+        raise ImportError("h2")
+except ImportError:  # Optional: only the HTTP/2 transport needs it (pip install "httpx[http2]")
+    httpx = None
+
+TRANSPORTS = ('requests', 'http2')
+DEFAULT_TRANSPORT = 'requests'
+HTTP2_MAX_CONNECTIONS = 4  # Connections per host; each multiplexes many concurrent requests
+MAX_RETRIES = 5  # Throttled (429) or gateway-error responses resent per request, by both engines
+RETRY_STATUSES = (429, 502, 503, 504)
+# A gateway error can come after the server committed the request, so only these are resent on 5xx
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+MAX_RETRY_DELAY = 30  # Seconds; also caps the server's Retry-After
+# Connection-specific headers are not allowed in HTTP/2 requests
+HOP_BY_HOP_HEADERS = frozenset(('connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade'))
+
+
+def new_session(transport=DEFAULT_TRANSPORT, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    A requests.Session sending its requests over `transport`. Everything above the transport
+    (auth, hooks, metrics, the maintenance window budgets, raise_for_status, iter_content) is the
+    same whichever is chosen:
+
+    - 'requests' (default): urllib3 over HTTP/1.1, one request per connection at a time, with
+      a connection kept per worker so busy workers don't open and drop extra ones.
+    - 'http2': an httpx client multiplexing all requests over a few HTTP/2 connections (needs
+      httpx[http2]). HTTP/2 is negotiated over TLS; plain http:// URLs stay on HTTP/1.1.
+
+    Either way, throttled and gateway-error responses are resent (see should_retry and RetryAdapter).
+    """
+    if transport == 'http2':
+        adapter = Http2Adapter()
+    elif transport == 'requests':
+        adapter = HTTPAdapter(pool_maxsize=max(max_workers, DEFAULT_POOLSIZE))
+    else:
+        raise ValueError(f"Unknown transport '{transport}'. Choose one of: {', '.join(TRANSPORTS)}.")
+    session = requests.Session()
+    adapter = RetryAdapter(adapter, session)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def should_retry(method, status):
+    """
+    Whether a response may be resent: a 429 was refused before the server acted on it, so any
+    method may; a 502/503/504 only for idempotent methods, as a resent POST could create a
+    duplicate attachment or link.
+    """
+    return status == 429 or (status in RETRY_STATUSES and method.upper() in IDEMPOTENT_METHODS)
+
+
+def retry_delay(retry_after, attempt):
+    """Seconds to wait before retry number `attempt`: the server's Retry-After (in seconds) if given, else 2, 4, 8..., never more than MAX_RETRY_DELAY."""
+    if retry_after and retry_after.strip().isdigit():
+        return min(float(retry_after), MAX_RETRY_DELAY)
+    return min(2 ** attempt, MAX_RETRY_DELAY)
+
+
+class RetryAdapter(BaseAdapter):
+    """
+    Adapter that sends through `transport` and resends a request answered with 429 (or, for an
+    idempotent method, a 5xx gateway status) up to MAX_RETRIES times, waiting as Retry-After asks
+    within MAX_RETRY_DELAY. Each retry is counted in the session's HTTP metrics. The last response
+    is returned as it is, so raise_for_status() still reports a request that stayed throttled.
+    """
+
+    def __init__(self, transport, session=None):
+        super().__init__()
+        self.transport = transport
+        self.session = session
+
+    def send(self, request, **kwargs):
+        for attempt in range(1, MAX_RETRIES + 1):
+            response = self.transport.send(request, **kwargs)
+            if not should_retry(request.method, response.status_code):
+                return response
+            response.content  # Read the short error body so the connection can be reused
+            record_retry(self.session, request.method, request.url)
+            time.sleep(retry_delay(response.headers.get('Retry-After'), attempt))
+        return self.transport.send(request, **kwargs)
+
+    def close(self):
+        self.transport.close()
+
+
+def _ssl_context(verify, cert):
+    """The SSL context matching requests' verify/cert arguments."""
+    if isinstance(verify, str):
+        context = ssl.create_default_context(capath=verify) if os.path.isdir(verify) else ssl.create_default_context(cafile=verify)
+    else:
+        context = ssl.create_default_context(cafile=DEFAULT_CA_BUNDLE_PATH)
+        if verify is False:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+    if cert:
+        context.load_cert_chain(*cert) if isinstance(cert, tuple) else context.load_cert_chain(cert)
+    return context
+
+
+def _timeout(timeout):
+    """requests' timeout (None, seconds, or a (connect, read) tuple) as an httpx.Timeout."""
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+        return httpx.Timeout(read, connect=connect, pool=None)
+    return httpx.Timeout(timeout, pool=None)
+
+
+class _StreamedBody:
+    """The body of an httpx response, shaped like the urllib3 response requests expects in Response.raw."""
+
+    def __init__(self, upstream):
+        self._upstream = upstream
+        self.version = 20 if upstream.http_version == 'HTTP/2' else 11
+
+    def stream(self, amt=None, decode_content=True):
+        try:
+            yield from self._upstream.iter_bytes(chunk_size=amt)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.ConnectionError(e)
+        except httpx.TransportError as e:
+            # Raised like a dropped HTTP/1.1 body, so the download engine resumes it the same way
+            raise requests.exceptions.ChunkedEncodingError(e)
+
+    def read(self, amt=None, decode_content=True, **kwargs):
+        return b''.join(self.stream(amt))
+
+    def close(self):
+        self._upstream.close()
+
+    def release_conn(self):
+        self._upstream.close()
+
+
+class Http2Adapter(BaseAdapter):
+    """
+    requests transport adapter that sends each request through a shared httpx client with HTTP/2
+    enabled, so concurrent requests from all workers share a few multiplexed connections instead
+    of holding one connection each. Responses are returned as ordinary requests.Response objects,
+    and connection errors are raised as the matching requests exceptions.
+    """
+
+    def __init__(self, max_connections=HTTP2_MAX_CONNECTIONS):
+        if httpx is None:
+            raise RuntimeError('The HTTP/2 transport needs httpx with HTTP/2 support: pip install "httpx[http2]"')
+        super().__init__()
+        self.max_connections = max_connections
+        self._clients = {}  # One client per verify/cert setting
+        self._lock = threading.Lock()
+
+    def _client(self, verify, cert):
+        key = (verify, cert)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+                client = httpx.Client(http2=True, verify=_ssl_context(verify, cert), limits=limits, trust_env=False)
+                self._clients[key] = client
+            return client
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        client = self._client(verify, cert)
+        headers = [(name, value) for name, value in request.headers.items() if name.lower() not in HOP_BY_HOP_HEADERS]
+        body = request.body.encode('utf-8') if isinstance(request.body, str) else request.body
+        try:
+            upstream = client.send(client.build_request(request.method, request.url, headers=headers, content=body, timeout=_timeout(timeout)),
+                                   stream=True)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(e, request=request)
+
+        response = requests.Response()
+        response.status_code = upstream.status_code
+        response.headers = CaseInsensitiveDict(upstream.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.reason = upstream.reason_phrase
+        response.raw = _StreamedBody(upstream)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
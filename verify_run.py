@@ -0,0 +1,243 @@
+import os
+import json
+import math
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from log_sink import LOG_DIR
+from scheduler import DEFAULT_MAX_WORKERS, metadata_size
+from progress_events import emit, emit_plan
+
+RECORD_DIR = os.path.join(os.path.dirname(LOG_DIR), "run_records")
+DEFAULT_SAMPLE_FRACTION = 0.01  # Share of renamed attachments re-downloaded for a full hash check
+HASH_CHUNK_SIZE = 1024 * 1024
+JSON_HEADERS = {"Content-Type": "application/json", "Accept": "application/json"}
+RENAME_WAIT_SECONDS = 300  # How long to wait for a queued PATCH /v1/items rename before verifying
+RENAME_POLL_SECONDS = 2
+WORK_DONE = ('COMPLETED', 'COMPLETE', 'DONE', 'SUCCESS', 'SUCCEEDED', 'FINISHED')
+WORK_FAILED = ('FAILED', 'ERROR', 'CANCELLED', 'CANCELED')
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunRecord:
+    """
+    What a run wrote, kept so it can be checked afterwards: one JSON line per uploaded file with
+    the attachment it ended up in (and the original it replaces, for the item workflow), the item
+    it belongs to, its expected name, size and SHA-256.
+    The workflows call add() right after each successful upload/link, while the file is still on disk.
+    """
+
+    def __init__(self, project_api_id, path=None):
+        os.makedirs(RECORD_DIR, exist_ok=True)
+        self.path = path or os.path.join(RECORD_DIR, f"run_project{project_api_id}_{time.strftime('%Y%m%d_%H%M%S')}.jsonl")
+        self.entries = []
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def add(self, workflow, attachment_id, item_id, new_name, file_path, original_id=None):
+        """
+        workflow is 'item' (a new attachment linked to item_id, replacing `original_id`) or 'project'
+        (an existing attachment updated in place).
+        """
+        entry = {
+            'workflow': workflow,
+            'attachment_id': attachment_id,
+            'original_attachment_id': original_id,
+            'item_id': item_id,
+            'new_name': new_name,
+            'size': os.path.getsize(file_path),
+            'sha256': file_sha256(file_path),
+        }
+        with self._lock:
+            self.entries.append(entry)
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()  # Safe to call twice
+
+
+def load_record(path):
+    """Reads the entries of a RunRecord file written by an earlier run."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def wait_for_work(session, jama_base_url_v2, work_key, timeout=RENAME_WAIT_SECONDS, poll_interval=RENAME_POLL_SECONDS):
+    """
+    Polls the work key a PATCH /v1/items answered with (GET /v1/work/{workKey}) until Jama has
+    applied the queued change or `timeout` seconds have passed.
+
+    Returns:
+        str: 'completed', 'failed', 'pending' (still queued at the timeout) or 'unknown' (no work key,
+        or its status could not be read).
+    """
+    if not work_key:
+        return 'unknown'
+    url = f"{jama_base_url_v2.rstrip('/')}/../v1/work/{work_key}"
+    deadline = time.monotonic() + timeout
+    print(f"Waiting for the queued rename to finish (work key {work_key})...")
+    while True:
+        try:
+            response = session.get(url, headers=JSON_HEADERS)
+            response.raise_for_status()
+            status = str(response.json()['data']['status']).upper()
+        except Exception as e:
+            print(f"⚠️ Could not read the status of work key {work_key}: {e}")
+            return 'unknown'
+        if status in WORK_DONE:
+            return 'completed'
+        if status in WORK_FAILED:
+            print(f"⚠️ The queued rename ended with status {status}.")
+            return 'failed'
+        if time.monotonic() + poll_interval > deadline:
+            print(f"⚠️ The queued rename is still {status} after {timeout:g} s.")
+            return 'pending'
+        time.sleep(poll_interval)
+
+
+def _check_metadata(entry, record, linked, check_name=True):
+    """Returns the list of problems found with one renamed attachment's metadata."""
+    if record is None:
+        return ["missing"]
+    problems = []
+    if entry['workflow'] == 'item' and not linked:
+        problems.append(f"not linked to item {entry['item_id']}")
+    name = record.get('fields', {}).get('name')
+    if check_name and name != entry['new_name']:
+        problems.append(f"name is '{name}', expected '{entry['new_name']}'")
+    size = metadata_size(record)
+    if size is not None and size != entry['size']:
+        problems.append(f"size is {size}, expected {entry['size']}")
+    return problems
+
+
+def verify_run(session, jama_base_url_v2, entries, sample_fraction=DEFAULT_SAMPLE_FRACTION, max_workers=DEFAULT_MAX_WORKERS, seed=None,
+               names_pending=False):
+    """
+    Checks every attachment a run renamed, using metadata only: it exists, is linked to its item
+    (item workflow), carries the expected name and has the expected size. Attachments are looked up
+    one item at a time (GET /items/{id}/attachments), so the cost follows the number of items rather
+    than attachments; only those not found there cost a GET /attachments/{id}.
+    A random `sample_fraction` of them is then re-downloaded in parallel and compared by SHA-256,
+    streaming the bytes through the hash without writing them to disk.
+    With `names_pending` (the project workflow's queued rename had not finished, see wait_for_work),
+    a project attachment still carrying another name is counted as pending instead of failed.
+
+    Returns:
+        dict: Counts per check and a list of {'attachment_id', 'new_name', 'problems'} failures.
+    """
+    base = jama_base_url_v2.rstrip('/')
+    print(f"\nVerifying {len(entries)} renamed attachments...")
+    by_item = {}
+    for entry in entries:
+        by_item.setdefault(entry['item_id'], []).append(entry)
+    emit_plan('verify', len(entries))
+    failures = []
+    pending = []
+    failures_lock = threading.Lock()
+
+    def fail(entry, problems):
+        with failures_lock:
+            failures.append({'attachment_id': entry['attachment_id'], 'new_name': entry['new_name'], 'problems': problems})
+        emit('verify', 'error', attachment_id=entry['attachment_id'], item_id=entry['item_id'], name=entry['new_name'], message="; ".join(problems))
+
+    def check_item(item_id):
+        listed = {}
+        if item_id is not None:
+            response = session.get(f"{base}/items/{item_id}/attachments", headers=JSON_HEADERS)
+            if response.status_code != 404:
+                response.raise_for_status()
+                listed = {a['id']: a for a in response.json().get('data', [])}
+        for entry in by_item[item_id]:
+            record = listed.get(entry['attachment_id'])
+            linked = record is not None
+            if record is None:
+                response = session.get(f"{base}/attachments/{entry['attachment_id']}", headers=JSON_HEADERS)
+                if response.status_code != 404:
+                    response.raise_for_status()
+                    record = response.json().get('data')
+            name_pending = (names_pending and entry['workflow'] == 'project' and record is not None
+                            and record.get('fields', {}).get('name') != entry['new_name'])
+            problems = _check_metadata(entry, record, linked, check_name=not name_pending)
+            if problems:
+                fail(entry, problems)
+            elif name_pending:
+                with failures_lock:
+                    pending.append(entry['attachment_id'])
+                emit('verify', 'skipped', attachment_id=entry['attachment_id'], item_id=entry['item_id'], name=entry['new_name'],
+                     message="rename still queued")
+            else:
+                emit('verify', 'ok', attachment_id=entry['attachment_id'], item_id=entry['item_id'], name=entry['new_name'])
+
+    def guarded(item_id):
+        try:
+            check_item(item_id)
+        except Exception as e:
+            for entry in by_item[item_id]:
+                fail(entry, [f"could not be checked ({e})"])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(guarded, by_item))
+    metadata_failures = len(failures)
+
+    # --- Full content check on a random sample ---
+    failed_ids = {f['attachment_id'] for f in failures}
+    candidates = [e for e in entries if e['attachment_id'] not in failed_ids]
+    sample_size = min(len(candidates), math.ceil(len(candidates) * sample_fraction)) if sample_fraction > 0 else 0
+    sample = random.Random(seed).sample(candidates, sample_size)
+    sampled_bytes = sum(e['size'] for e in sample)
+    if sample:
+        print(f"Hash-checking a random sample of {len(sample)} attachments ({sampled_bytes / (1024 * 1024):.1f} MB)...")
+        emit_plan('hash check', len(sample), sampled_bytes)
+
+    def check_hash(entry):
+        started = time.perf_counter()
+        try:
+            digest = hashlib.sha256()
+            with session.get(f"{base}/attachments/{entry['attachment_id']}/file", stream=True) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(HASH_CHUNK_SIZE):
+                    digest.update(chunk)
+            if digest.hexdigest() != entry['sha256']:
+                fail(entry, ["content does not match the uploaded file (SHA-256)"])
+            else:
+                emit('hash check', 'ok', attachment_id=entry['attachment_id'], item_id=entry['item_id'], name=entry['new_name'],
+                     bytes=entry['size'], duration=time.perf_counter() - started)
+        except Exception as e:
+            fail(entry, [f"content could not be downloaded ({e})"])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(check_hash, sample))
+
+    summary = {
+        'checked': len(entries),
+        'metadata_failures': metadata_failures,
+        'hash_checked': len(sample),
+        'hash_failures': len(failures) - metadata_failures,
+        'hash_checked_bytes': sampled_bytes,
+        'names_pending': len(pending),
+        'failures': failures,
+    }
+    if pending:
+        print(f"\n⏳ {len(pending)} project attachment name(s) not applied yet (the rename is still queued); "
+              "re-check them later with --verify-only and this run's record.")
+    if failures:
+        print(f"\n⚠️ Verification found {len(failures)} problem(s):")
+        for failure in failures[:20]:
+            print(f"   - {failure['new_name']} (ID {failure['attachment_id']}): {'; '.join(failure['problems'])}")
+        if len(failures) > 20:
+            print(f"   ... and {len(failures) - 20} more.")
+    else:
+        print(f"\n✅ Verification passed: {len(entries)} attachments checked by metadata, {len(sample)} by content.")
+    return summary